@@ -0,0 +1,103 @@
+"""
+Environment driven database configuration, so the same settings file runs on a laptop
+(SQLite) and in production (PostgreSQL) without code edits.
+
+    DB_ENGINE              sqlite (default) or postgres
+    DB_CONN_MAX_AGE        seconds a connection is kept between requests (sqlite 60, postgres 600)
+
+SQLite
+    DB_NAME                database file (default <BASE_DIR>/db.sqlite3)
+    SQLITE_BUSY_TIMEOUT    milliseconds a writer waits for the lock before "database is locked" (5000)
+    SQLITE_MMAP_SIZE       bytes of the file read through mmap (128 MB)
+    SQLITE_TRANSACTION_MODE  DEFERRED, IMMEDIATE (default) or EXCLUSIVE
+
+PostgreSQL
+    DB_NAME, DB_USER, DB_PASSWORD, DB_HOST (localhost), DB_PORT (5432)
+    DB_CONNECT_TIMEOUT     seconds (5)
+    DB_SSLMODE             e.g. require (unset = driver default)
+
+Read replica (optional, adds a "replica" alias used by attendenceSettings.db_router)
+    DB_REPLICA_HOST        PostgreSQL replica host, the other DB_REPLICA_* variables work like DB_*
+    DB_REPLICA_NAME        with SQLite, a second database file standing in for the replica
+"""
+import os
+
+
+def env_int(name, default):
+    value = os.environ.get(name, '')
+    return int(value) if value.strip() else default
+
+
+def sqlite_config(base_dir):
+    busy_timeout = env_int('SQLITE_BUSY_TIMEOUT', 5000)
+    pragmas = [
+        # Readers no longer block the writer and the writer doesn't block readers
+        'PRAGMA journal_mode=WAL',
+        # Durable across application crashes, fsync only at checkpoints in WAL mode
+        'PRAGMA synchronous=NORMAL',
+        f"PRAGMA mmap_size={env_int('SQLITE_MMAP_SIZE', 128 * 1024 * 1024)}",
+        f'PRAGMA busy_timeout={busy_timeout}',
+    ]
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DB_NAME') or base_dir / 'db.sqlite3',
+        'CONN_MAX_AGE': env_int('DB_CONN_MAX_AGE', 60),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': busy_timeout / 1000,
+            # Take the write lock when a transaction starts, instead of failing on upgrade
+            'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+            'init_command': ';'.join(pragmas),
+        },
+    }
+
+
+def postgres_config(prefix='DB_'):
+    """PostgreSQL settings from <prefix>NAME, <prefix>USER, ... (the read replica uses its own prefix)"""
+    options = {'connect_timeout': env_int(f'{prefix}CONNECT_TIMEOUT', 5)}
+    if os.environ.get(f'{prefix}SSLMODE'):
+        options['sslmode'] = os.environ[f'{prefix}SSLMODE']
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get(f'{prefix}NAME', 'attendence'),
+        'USER': os.environ.get(f'{prefix}USER', ''),
+        'PASSWORD': os.environ.get(f'{prefix}PASSWORD', ''),
+        'HOST': os.environ.get(f'{prefix}HOST', 'localhost'),
+        'PORT': os.environ.get(f'{prefix}PORT', '5432'),
+        # Persistent connections, checked before reuse so a dropped connection doesn't fail a request
+        'CONN_MAX_AGE': env_int(f'{prefix}CONN_MAX_AGE', 600),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': options,
+    }
+
+
+def database_config(base_dir):
+    engine = os.environ.get('DB_ENGINE', 'sqlite').lower()
+    if engine in ('postgres', 'postgresql'):
+        return postgres_config()
+    if engine == 'sqlite':
+        return sqlite_config(base_dir)
+    raise ValueError(f"Unsupported DB_ENGINE {engine!r}, use sqlite or postgres")
+
+
+def replica_config(base_dir):
+    """Settings for the "replica" alias, or None when no replica is configured"""
+    engine = os.environ.get('DB_ENGINE', 'sqlite').lower()
+    if engine in ('postgres', 'postgresql'):
+        if not os.environ.get('DB_REPLICA_HOST'):
+            return None
+        config = postgres_config('DB_REPLICA_')
+        # Fall back to the primary's database and credentials
+        for key, name in (('NAME', 'DB_NAME'), ('USER', 'DB_USER'), ('PASSWORD', 'DB_PASSWORD')):
+            if not os.environ.get(f'DB_REPLICA_{key}'):
+                config[key] = os.environ.get(name, config[key])
+    elif engine == 'sqlite':
+        if not os.environ.get('DB_REPLICA_NAME'):
+            return None
+        config = sqlite_config(base_dir)
+        config['NAME'] = os.environ['DB_REPLICA_NAME']
+    else:
+        return None
+    # Tests read the replica through the primary's connection
+    config['TEST'] = {'MIRROR': 'default'}
+    return config
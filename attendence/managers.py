@@ -0,0 +1,30 @@
+"""
+Shared soft-delete manager for models carrying a `deleted` flag.
+
+The default manager still returns every row (admin, related lookups and the unique checks see
+deleted rows too), live rows are asked for explicitly with alive(). Models using it keep partial
+indexes on deleted=False for their common filters, so alive() scans don't grow with deleted history.
+"""
+from django.db import models
+from django.utils import timezone
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+
+    def alive(self):
+        """Rows that are not soft deleted"""
+        return self.filter(deleted=False)
+
+    def soft_delete(self):
+        """
+        Flag the matching live rows deleted with a single UPDATE (no per-row save() or signals).
+        Returns: number of rows deleted
+        """
+        values = {'deleted': True}
+        if any(field.name == 'updated_at' for field in self.model._meta.concrete_fields):
+            values['updated_at'] = timezone.now()
+        return self.alive().update(**values)
+
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    pass
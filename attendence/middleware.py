@@ -0,0 +1,222 @@
+"""
+Per-request database instrumentation.
+
+RequestMetricsMiddleware counts the queries a request runs (on every database alias), adds up
+their time and reports them with the total request time (everything below this middleware, the DB time
+included) and the response size as
+- a Server-Timing header (db and total durations), shown by browser dev tools and read by most APM agents
+- one JSON log line per request on the "attendence.requests" logger (INFO)
+- a WARNING with the recorded SQL, repeated statements first (the N+1 signature), when the request
+  runs more than REQUEST_METRICS_MAX_QUERIES queries or takes longer than REQUEST_METRICS_MAX_MS
+
+    REQUEST_METRICS_ENABLED         True
+    REQUEST_METRICS_SERVER_TIMING   add the Server-Timing header (True)
+    REQUEST_METRICS_MAX_QUERIES     query count threshold (50, None disables)
+    REQUEST_METRICS_MAX_MS          total_ms threshold in milliseconds (500, None disables)
+    REQUEST_METRICS_LOGGED_QUERIES  statements kept per request for the warning (100)
+
+The body of a streaming response (the attendance export) is produced after the middleware returns, so
+its content is wrapped to record the queries and bytes of every chunk and the request is logged once the
+body is exhausted or the response closed. Its headers are sent before that, so it gets no Server-Timing.
+
+Connections are per thread and ORM calls from async views run in sync_to_async worker threads, so the
+request's recorder is held in a context variable (copied into those threads) and every connection gets
+record_query as an execute wrapper when it is created (install_query_recorder, connected at app ready).
+"""
+import contextvars
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from inspect import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger('attendence.requests')
+
+_recorder = contextvars.ContextVar('query_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper on every connection, hands the query to the recorder of the current request (if any)"""
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    """connection_created handler - add record_query to the connection's execute wrappers once"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class QueryRecorder:
+    """Collects the count, time and (up to keep) statements of the queries of one request"""
+
+    def __init__(self, keep=100):
+        self.keep = keep
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if len(self.queries) < self.keep:
+                self.queries.append((context['connection'].alias, sql, duration))
+
+    @contextmanager
+    def recording(self):
+        """Record the queries run in this context, including the sync_to_async threads it starts"""
+        token = _recorder.set(self)
+        try:
+            yield self
+        finally:
+            _recorder.reset(token)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def request_metrics(request, response, recorder, elapsed, response_bytes=None):
+    return {
+        "method": request.method,
+        "path": request.path,
+        "status": response.status_code,
+        "queries": recorder.count,
+        "db_ms": _ms(recorder.duration),
+        "total_ms": _ms(elapsed),
+        "response_bytes": len(response.content) if response_bytes is None else response_bytes,
+    }
+
+
+def server_timing(metrics):
+    return f'db;dur={metrics["db_ms"]};desc="{metrics["queries"]} queries", total;dur={metrics["total_ms"]}'
+
+
+def over_threshold(metrics):
+    max_queries = getattr(settings, 'REQUEST_METRICS_MAX_QUERIES', 50)
+    max_ms = getattr(settings, 'REQUEST_METRICS_MAX_MS', 500)
+    return (
+        (max_queries is not None and metrics["queries"] > max_queries)
+        or (max_ms is not None and metrics["total_ms"] > max_ms)
+    )
+
+
+def log_request(metrics, recorder):
+    logger.info(json.dumps(dict(metrics, event="request")), extra={"metrics": metrics})
+    if not over_threshold(metrics):
+        return
+
+    repeated = Counter(sql for _, sql, _ in recorder.queries)
+    report = dict(
+        metrics,
+        event="request_over_threshold",
+        repeated=[{"count": count, "sql": sql} for sql, count in repeated.most_common() if count > 1],
+        sql=[{"db": alias, "ms": _ms(duration), "sql": sql} for alias, sql, duration in recorder.queries],
+        sql_truncated=recorder.count > len(recorder.queries),
+    )
+    logger.warning(json.dumps(report), extra={"metrics": metrics})
+
+
+class MeasuredContent:
+    """Streaming content wrapper, records the queries and bytes of each chunk and calls done(self) at the end"""
+
+    def __init__(self, content, recorder, done):
+        self.content = content
+        self.recorder = recorder
+        self.done = done
+        self.bytes = 0
+        self.duration = 0.0
+        self.closed = False
+
+    def _chunk(self, chunk, start, end):
+        self.duration += time.perf_counter() - start
+        if chunk is None:
+            self.close()
+            raise end
+        self.bytes += len(chunk)
+        return chunk
+
+    def close(self):
+        """Runs on exhaustion and when the server closes the response (a client that went away)"""
+        if not self.closed:
+            self.closed = True
+            self.done(self)
+
+
+class MeasuredStream(MeasuredContent):
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        with self.recorder.recording():
+            chunk = next(self.content, None)
+        return self._chunk(chunk, start, StopIteration)
+
+
+class AsyncMeasuredStream(MeasuredContent):
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        start = time.perf_counter()
+        with self.recorder.recording():
+            chunk = await anext(self.content, None)
+        return self._chunk(chunk, start, StopAsyncIteration)
+
+
+def measure_stream(request, response, recorder, elapsed):
+    """Log a streaming response once its body has been sent"""
+    def done(stream):
+        metrics = request_metrics(request, response, recorder, elapsed + stream.duration, stream.bytes)
+        log_request(metrics, recorder)
+
+    stream_class = AsyncMeasuredStream if response.is_async else MeasuredStream
+    response.streaming_content = stream_class(response.streaming_content, recorder, done)
+    return response
+
+
+def finish(request, response, recorder, elapsed):
+    if response.streaming:
+        return measure_stream(request, response, recorder, elapsed)
+    metrics = request_metrics(request, response, recorder, elapsed)
+    if getattr(settings, 'REQUEST_METRICS_SERVER_TIMING', True):
+        response.headers["Server-Timing"] = server_timing(metrics)
+    log_request(metrics, recorder)
+    return response
+
+
+@sync_and_async_middleware
+def RequestMetricsMiddleware(get_response):
+    if not getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+        raise MiddlewareNotUsed
+    keep = getattr(settings, 'REQUEST_METRICS_LOGGED_QUERIES', 100)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            recorder = QueryRecorder(keep)
+            start = time.perf_counter()
+            with recorder.recording():
+                response = await get_response(request)
+            return finish(request, response, recorder, time.perf_counter() - start)
+        return markcoroutinefunction(middleware)
+
+    def middleware(request):
+        recorder = QueryRecorder(keep)
+        start = time.perf_counter()
+        with recorder.recording():
+            response = get_response(request)
+        return finish(request, response, recorder, time.perf_counter() - start)
+    return middleware
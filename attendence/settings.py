@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .database import database_config, env_int, replica_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so the numbers cover the whole request (see attendence/middleware.py for the settings)
+    'attendence.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'attendenceSettings.db_router.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'attendence.urls'
@@ -72,12 +78,39 @@ WSGI_APPLICATION = 'attendence.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Picked from the environment (DB_ENGINE=sqlite|postgres), see attendence/database.py
 
 DATABASES = {
+    'default': database_config(BASE_DIR),
+}
+
+# Optional read replica (DB_REPLICA_HOST, or DB_REPLICA_NAME with SQLite). Views marked read_only
+# and the report services read from it, writes and reads after a write stay on the primary.
+REPLICA_DATABASE = replica_config(BASE_DIR)
+if REPLICA_DATABASE:
+    DATABASES['replica'] = REPLICA_DATABASE
+
+DATABASE_ROUTERS = ['attendenceSettings.db_router.ReadReplicaRouter']
+
+
+# Caches
+# "attendance_status" holds the per-employee today status, swap it for a shared backend
+# (e.g. django.core.cache.backends.redis.RedisCache) when running several processes.
+# "default" holds the version counters of the process-local reference data, shift index, working
+# day and archive boundary caches (attendenceSettings.cache). It must be shared too for a change to
+# reach every worker at once, with local memory the other workers only reload after
+# REFERENCE_CACHE_TTL seconds (0 keeps the local copies until the version changes).
+
+REFERENCE_CACHE_TTL = env_int('REFERENCE_CACHE_TTL', 60)
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'attendance_status': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'attendance-status',
+    },
 }
 
 
@@ -121,3 +154,29 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Logging
+# "attendence.requests" gets one JSON line per request (query count, DB and total time, response size)
+# and a warning with the SQL of requests over REQUEST_METRICS_MAX_QUERIES / REQUEST_METRICS_MAX_MS
+
+REQUEST_METRICS_MAX_QUERIES = env_int('REQUEST_METRICS_MAX_QUERIES', 50)
+REQUEST_METRICS_MAX_MS = env_int('REQUEST_METRICS_MAX_MS', 500)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'requests': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+    },
+    'loggers': {
+        'attendence.requests': {
+            'handlers': ['requests'],
+            'level': os.environ.get('REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -81,10 +81,10 @@ class LeaveRequestAdmin(admin.ModelAdmin):
 @admin.register(LeaveBalance)
 class LeaveBalanceAdmin(admin.ModelAdmin):
     list_display = (
-        'id', 'employee', 'leave_type', 'year',
+        'id', 'employee', 'attendance_type', 'year',
         'total_days', 'used_days', 'remaining_days', 'deleted'
     )
-    list_filter = ('year', 'leave_type', 'deleted')
+    list_filter = ('year', 'attendance_type', 'deleted')
     search_fields = ('employee',)
     ordering = ('-year', 'employee')
 
@@ -102,10 +102,10 @@ class LeaveTypeAdmin(admin.ModelAdmin):
 @admin.register(LeaveSetting)
 class LeaveSettingAdmin(admin.ModelAdmin):
     list_display = (
-        'id', 'employee', 'company', 'leave_type', 
+        'id', 'employee', 'company', 'attendance_type', 
         'financial_year_start', 'financial_year_end', 'allotted_days', 'deleted'
     )
-    list_filter = ('company', 'leave_type', 'financial_year_start', 'deleted')
+    list_filter = ('company', 'attendance_type', 'financial_year_start', 'deleted')
     search_fields = ('employee', 'company')
     ordering = ('-financial_year_start', 'employee')
 
@@ -126,4 +126,86 @@ class StatusAdmin(admin.ModelAdmin):
     list_display=(
         'code','label'
 
-    )
\ No newline at end of file
+    )
+
+@admin.register(PunchIdempotencyKey)
+class PunchIdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('id', 'employee', 'key', 'created_at')
+    search_fields = ('employee', 'key')
+    readonly_fields = ('created_at',)
+
+
+@admin.register(PunchQueueItem)
+class PunchQueueItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'ticket', 'employee', 'action_type', 'punch_time', 'status', 'attempts', 'created_at', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('employee', 'ticket')
+    readonly_fields = ('ticket', 'created_at', 'claimed_at', 'processed_at')
+
+
+@admin.register(DailyAttendanceSummary)
+class DailyAttendanceSummaryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'employee', 'company', 'date', 'attendance_type', 'is_present', 'is_late', 'is_absent', 'is_leave', 'working_hour', 'overtime_minutes')
+    list_filter = ('date', 'is_present', 'is_absent', 'is_leave')
+    search_fields = ('employee',)
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(Holiday)
+class HolidayAdmin(admin.ModelAdmin):
+    list_display = ('id', 'date', 'title', 'company', 'deleted')
+    list_filter = ('company', 'deleted')
+    search_fields = ('title',)
+    ordering = ('-date',)
+
+
+@admin.register(WeeklyOff)
+class WeeklyOffAdmin(admin.ModelAdmin):
+    list_display = ('id', 'company', 'shift', 'weekday', 'week_of_month', 'deleted')
+    list_filter = ('company', 'weekday', 'deleted')
+
+
+@admin.register(LeaveLedgerEntry)
+class LeaveLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'employee', 'attendance_type', 'year', 'entry_type', 'days', 'leave_request', 'created_by', 'created_at')
+    list_filter = ('entry_type', 'year')
+    search_fields = ('employee',)
+
+    # Append-only, entries are written by LeaveLedgerService
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AttendanceArchive)
+class AttendanceArchiveAdmin(admin.ModelAdmin):
+    list_display = ('id', 'employee', 'company', 'attendance_date', 'date_check_in', 'date_check_out', 'working_hour', 'deleted')
+    list_filter = ('deleted',)
+    search_fields = ('employee',)
+    date_hierarchy = 'attendance_date'
+
+    # Moved here by archive_attendance, read-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedPeriod)
+class ArchivedPeriodAdmin(admin.ModelAdmin):
+    list_display = ('period', 'rows', 'archived_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AttendencesettingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'attendenceSettings'
+
+    def ready(self):
+        # Connect cache invalidation signals
+        from . import signals
@@ -0,0 +1,419 @@
+import calendar
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from datetime import date, timedelta
+from itertools import accumulate
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.db.models import Q
+from shiftSetting.models import Shift, SubShift
+from .models import Action, Source, AttendanceType, Status, Holiday, WeeklyOff, ArchivedPeriod
+from .db_router import primary
+
+
+class VersionedCache:
+    """
+    Base class for process-local caches that are invalidated through a version counter.
+    Every process keeps its own copy of the data and compares its version with the one stored
+    in the "default" cache. Bumping the version only reaches the other processes when that cache
+    is shared (Redis/Memcached), so local copies are also dropped after REFERENCE_CACHE_TTL seconds,
+    which bounds how stale another worker can be with the per-process local memory cache.
+    """
+    version_key = None
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._version = None
+        self._synced_at = 0.0
+        self._entries = {}
+
+    def _current_version(self):
+        return cache.get(self.version_key, 0)
+
+    def _expired(self):
+        ttl = getattr(settings, 'REFERENCE_CACHE_TTL', 60)
+        return bool(ttl) and time.monotonic() - self._synced_at >= ttl
+
+    def _sync_version(self, version):
+        if version != self._version or self._expired():
+            with self._lock:
+                if version != self._version or self._expired():
+                    self._entries = {}
+                    self._version = version
+                    self._synced_at = time.monotonic()
+
+    def _entry(self, key, loader):
+        """Return the cached entry for key, rebuilding it with loader() when missing or stale"""
+        self._sync_version(self._current_version())
+
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    # Fill from the primary, a lagging replica would be cached until the next version bump
+                    with primary():
+                        entry = loader()
+                    self._entries[key] = entry
+        return entry
+
+    async def _aentry(self, key, aloader):
+        """Async variant of _entry for ASGI views, aloader() is awaited outside the lock"""
+        self._sync_version(await cache.aget(self.version_key, 0))
+
+        entry = self._entries.get(key)
+        if entry is None:
+            with primary():
+                entry = await aloader()
+            with self._lock:
+                entry = self._entries.setdefault(key, entry)
+        return entry
+
+    def invalidate(self):
+        """Drop the local copy and bump the version so other processes sharing the cache reload too"""
+        cache.add(self.version_key, 0, None)
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, 1, None)
+        with self._lock:
+            self._entries = {}
+            self._version = None
+
+    def invalidate_on_commit(self, *args, **kwargs):
+        """Signal handler - invalidate once the surrounding transaction (if any) commits"""
+        transaction.on_commit(self.invalidate)
+
+
+class ReferenceDataCache(VersionedCache):
+    """
+    Cache of the small lookup tables used on every punch (Action, Source, AttendanceType, Status),
+    keyed by id and by code. Cached instances are shared, treat them as read-only.
+    """
+    version_key = 'attendence:reference-data:version'
+
+    querysets = {
+        'action': lambda: Action.objects.filter(deleted=False),
+        'source': lambda: Source.objects.filter(deleted=False),
+        'attendance_type': lambda: AttendanceType.objects.filter(deleted=False),
+        'status': lambda: Status.objects.filter(is_active=True, deleted=False),
+    }
+
+    @staticmethod
+    def _index(rows):
+        return {
+            "by_id": {row.id: row for row in rows},
+            "by_code": {row.code: row for row in rows if row.code},
+        }
+
+    def _table(self, kind):
+        return self._entry(kind, lambda: self._index(list(self.querysets[kind]())))
+
+    async def _atable(self, kind):
+        async def load():
+            return self._index([row async for row in self.querysets[kind]()])
+        return await self._aentry(kind, load)
+
+    @staticmethod
+    def _pk(pk):
+        try:
+            return int(pk)
+        except (TypeError, ValueError):
+            return None
+
+    def get_by_id(self, kind, pk):
+        """Get a reference row by primary key, None if missing or deleted"""
+        pk = self._pk(pk)
+        if pk is None:
+            return None
+        return self._table(kind)["by_id"].get(pk)
+
+    def get_by_code(self, kind, code):
+        """Get a reference row by its unique code, None if missing or deleted"""
+        return self._table(kind)["by_code"].get(code)
+
+    async def aget_by_id(self, kind, pk):
+        pk = self._pk(pk)
+        if pk is None:
+            return None
+        return (await self._atable(kind))["by_id"].get(pk)
+
+    async def aget_by_code(self, kind, code):
+        return (await self._atable(kind))["by_code"].get(code)
+
+
+reference_data = ReferenceDataCache()
+
+
+MICROSECONDS_PER_DAY = 24 * 60 * 60 * 1000000
+
+
+def _time_to_microseconds(value):
+    return ((value.hour * 60 + value.minute) * 60 + value.second) * 1000000 + value.microsecond
+
+
+class ShiftIntervalIndex(VersionedCache):
+    """
+    Per-company index of active SubShift windows for O(log n) "which shift is running at"
+    lookups. Overlapping windows are flattened into elementary segments that keep the
+    winner by (shift id, sub-shift id), matching the order the old nested loops used.
+    Night shifts that wrap midnight are split into two segments.
+    """
+    version_key = 'attendence:shift-index:version'
+
+    @staticmethod
+    def _shifts(company_id):
+        return Shift.objects.alive().filter(company=company_id).order_by('id')
+
+    @staticmethod
+    def _sub_shifts(shifts):
+        return SubShift.objects.alive().filter(
+            shift__in=[shift.id for shift in shifts],
+            active=True
+        ).order_by('shift_id', 'id')
+
+    def _build(self, company_id):
+        shifts = list(self._shifts(company_id))
+        return self._index(shifts, list(self._sub_shifts(shifts)))
+
+    async def _abuild(self, company_id):
+        shifts = [shift async for shift in self._shifts(company_id)]
+        return self._index(shifts, [sub_shift async for sub_shift in self._sub_shifts(shifts)])
+
+    @staticmethod
+    def _index(shifts, sub_shifts):
+        shifts_by_id = {shift.id: shift for shift in shifts}
+
+        # Fallback used when no window matches: first shift with its first active sub-shift
+        default = (None, None)
+        if shifts:
+            first_shift = shifts[0]
+            first_sub_shift = next((sub for sub in sub_shifts if sub.shift_id == first_shift.id), None)
+            default = (first_shift, first_sub_shift)
+
+        # Inclusive windows become half-open [start, end + 1us) intervals
+        intervals = []
+        for priority, sub_shift in enumerate(sub_shifts):
+            if not sub_shift.time_start or not sub_shift.time_end:
+                continue
+            pair = (shifts_by_id[sub_shift.shift_id], sub_shift)
+            start = _time_to_microseconds(sub_shift.time_start)
+            end = _time_to_microseconds(sub_shift.time_end) + 1
+            if start < end:
+                intervals.append((start, end, priority, pair))
+            else:
+                # Night shift (e.g. 22:00 - 06:00)
+                intervals.append((start, MICROSECONDS_PER_DAY, priority, pair))
+                intervals.append((0, end, priority, pair))
+
+        boundaries = sorted({point for start, end, _, _ in intervals for point in (start, end)})
+        starts = []
+        winners = []
+        for segment_start, segment_end in zip(boundaries, boundaries[1:]):
+            covering = [
+                (priority, pair) for start, end, priority, pair in intervals
+                if start <= segment_start and segment_end <= end
+            ]
+            winner = min(covering, key=lambda item: item[0])[1] if covering else None
+            # Merge neighbouring segments with the same winner
+            if winners and winners[-1] is winner:
+                continue
+            starts.append(segment_start)
+            winners.append(winner)
+        if winners and winners[-1] is not None:
+            starts.append(boundaries[-1])
+            winners.append(None)
+
+        return {"starts": starts, "winners": winners, "default": default}
+
+    def _company(self, company_id):
+        return self._entry(company_id, lambda: self._build(company_id))
+
+    async def _acompany(self, company_id):
+        return await self._aentry(company_id, lambda: self._abuild(company_id))
+
+    @staticmethod
+    def _lookup(index, check_in_time):
+        position = bisect_right(index["starts"], _time_to_microseconds(check_in_time.time())) - 1
+        if position >= 0 and index["winners"][position] is not None:
+            return index["winners"][position]
+        return index["default"]
+
+    def lookup(self, company_id, check_in_time):
+        """Return (shift, sub_shift) running at check_in_time, falling back to the company default"""
+        return self._lookup(self._company(company_id), check_in_time)
+
+    async def alookup(self, company_id, check_in_time):
+        return self._lookup(await self._acompany(company_id), check_in_time)
+
+    def default_for(self, company_id):
+        """Return the company's default (shift, sub_shift) pair"""
+        return self._company(company_id)["default"]
+
+
+shift_index = ShiftIntervalIndex()
+
+
+class WorkingDayCalendar(VersionedCache):
+    """
+    Working-day calendar per (company, shift, year) for leave day counts. A year is computed
+    once from the weekly offs and holidays into a day bitmap (1 = working day) and its prefix
+    sums, so the working days in any range are two lookups per calendar year it touches.
+    With nothing configured every day is a working day.
+    """
+    version_key = 'attendence:working-days:version'
+
+    @staticmethod
+    def _weekly_offs(company_id, shift_id):
+        offs = WeeklyOff.objects.filter(company=company_id, deleted=False)
+        rules = set(offs.filter(shift=shift_id).values_list('weekday', 'week_of_month')) if shift_id else set()
+        # A shift without its own weekly offs follows the company's
+        return rules or set(offs.filter(shift__isnull=True).values_list('weekday', 'week_of_month'))
+
+    @staticmethod
+    def _holidays(company_id, year):
+        return Holiday.objects.filter(
+            Q(company=company_id) | Q(company__isnull=True),
+            date__year=year,
+            deleted=False
+        ).values_list('date', flat=True)
+
+    def _build(self, company_id, shift_id, year):
+        first_day = date(year, 1, 1)
+        rules = self._weekly_offs(company_id, shift_id)
+        bitmap = bytearray(366 if calendar.isleap(year) else 365)
+        for offset in range(len(bitmap)):
+            day = first_day + timedelta(days=offset)
+            weekday, week_of_month = day.weekday(), (day.day - 1) // 7 + 1
+            bitmap[offset] = (weekday, None) not in rules and (weekday, week_of_month) not in rules
+        for holiday in self._holidays(company_id, year):
+            bitmap[(holiday - first_day).days] = 0
+
+        prefix = array('H', [0])
+        prefix.extend(accumulate(bitmap))
+        return {"first_day": first_day, "bitmap": bytes(bitmap), "prefix": prefix}
+
+    def _year(self, company_id, shift_id, year):
+        return self._entry((company_id, shift_id, year), lambda: self._build(company_id, shift_id, year))
+
+    @staticmethod
+    def _shift_id(shift):
+        return getattr(shift, 'id', shift)
+
+    def count(self, company_id, start_date, end_date, shift=None):
+        """Number of working days from start_date to end_date, both inclusive"""
+        shift_id = self._shift_id(shift)
+        total = 0
+        for year in range(start_date.year, end_date.year + 1):
+            entry = self._year(company_id, shift_id, year)
+            first = (max(start_date, date(year, 1, 1)) - entry["first_day"]).days
+            last = (min(end_date, date(year, 12, 31)) - entry["first_day"]).days
+            if first <= last:
+                total += entry["prefix"][last + 1] - entry["prefix"][first]
+        return total
+
+    def is_working_day(self, company_id, day, shift=None):
+        entry = self._year(company_id, self._shift_id(shift), day.year)
+        return bool(entry["bitmap"][(day - entry["first_day"]).days])
+
+
+working_days = WorkingDayCalendar()
+
+
+class ArchiveBoundary(VersionedCache):
+    """
+    First business date still kept only in the hot Attendance table - everything before it has
+    been moved to AttendanceArchive (None when nothing is archived). Checked by every history
+    and report read to decide whether the archive has to be read as well.
+    """
+    version_key = 'attendence:archive-boundary:version'
+
+    @staticmethod
+    def _boundary(latest):
+        # Kept in a tuple, _entry() treats None as a missing entry
+        if latest is None:
+            return (None,)
+        return (date(latest.year + latest.month // 12, latest.month % 12 + 1, 1),)
+
+    @staticmethod
+    def _periods():
+        return ArchivedPeriod.objects.order_by('-period').values_list('period', flat=True)
+
+    def _load(self):
+        return self._boundary(self._periods().first())
+
+    async def _aload(self):
+        return self._boundary(await self._periods().afirst())
+
+    def get(self):
+        return self._entry('boundary', self._load)[0]
+
+    async def aget(self):
+        return (await self._aentry('boundary', self._aload))[0]
+
+    def covers(self, date_from):
+        """True when a range starting at date_from (None = open) reaches into the archive"""
+        boundary = self.get()
+        return boundary is not None and (date_from is None or date_from < boundary)
+
+    async def acovers(self, date_from):
+        boundary = await self.aget()
+        return boundary is not None and (date_from is None or date_from < boundary)
+
+
+archive_boundary = ArchiveBoundary()
+
+
+class AttendanceStatusCache:
+    """
+    Write-through cache of each employee's status response for a business date, kept in the
+    ATTENDANCE_STATUS_CACHE alias (local memory by default, point it at Redis/Memcached to share
+    it between processes). Punches write the fresh status, other saves/deletes drop it.
+    """
+    key_prefix = 'attendence:today-status'
+
+    @property
+    def backend(self):
+        alias = getattr(settings, 'ATTENDANCE_STATUS_CACHE', 'attendance_status')
+        return caches[alias if alias in settings.CACHES else 'default']
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'ATTENDANCE_STATUS_CACHE_TIMEOUT', 24 * 60 * 60)
+
+    def key(self, employee_id, attendance_date):
+        return f"{self.key_prefix}:{employee_id}:{attendance_date.isoformat()}"
+
+    def get(self, employee_id, attendance_date):
+        return self.backend.get(self.key(employee_id, attendance_date))
+
+    async def aget(self, employee_id, attendance_date):
+        return await self.backend.aget(self.key(employee_id, attendance_date))
+
+    def set(self, employee_id, attendance_date, status):
+        self.backend.set(self.key(employee_id, attendance_date), status, self.timeout)
+
+    def add(self, employee_id, attendance_date, status):
+        self.backend.add(self.key(employee_id, attendance_date), status, self.timeout)
+
+    async def aset(self, employee_id, attendance_date, status):
+        await self.backend.aset(self.key(employee_id, attendance_date), status, self.timeout)
+
+    async def aadd(self, employee_id, attendance_date, status):
+        await self.backend.aadd(self.key(employee_id, attendance_date), status, self.timeout)
+
+    def delete(self, employee_id, attendance_date):
+        self.backend.delete(self.key(employee_id, attendance_date))
+
+    def invalidate_on_commit(self, sender, instance, **kwargs):
+        """Signal handler - drop the cached status of a saved/deleted attendance record"""
+        if instance.employee is None or instance.attendance_date is None:
+            return
+        employee_id, attendance_date = instance.employee, instance.attendance_date
+        transaction.on_commit(lambda: self.delete(employee_id, attendance_date))
+
+
+attendance_status = AttendanceStatusCache()
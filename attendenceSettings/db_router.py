@@ -0,0 +1,127 @@
+"""
+Read-replica routing.
+
+Reads only go to the replica when the code asked for it - a view decorated with read_only,
+a read_replica() block, or a report service using read_alias(). Everything else, anything
+inside transaction.atomic and any read after a write in the same request stays on the primary,
+so a request never reads back an older copy of what it just wrote.
+Without a "replica" entry in DATABASES everything goes to the primary.
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from inspect import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+REPLICA_DB_ALIAS = 'replica'
+
+_read_intent = contextvars.ContextVar('read_intent', default=False)
+_pinned_to_primary = contextvars.ContextVar('pinned_to_primary', default=False)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def replica_allowed():
+    """The replica can serve a read: configured, no write yet in this request and not inside atomic"""
+    return (
+        replica_configured()
+        and not _pinned_to_primary.get()
+        and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+    )
+
+
+def read_alias():
+    """Database alias for a read-only report query (use with queryset.using())"""
+    return REPLICA_DB_ALIAS if replica_allowed() else DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def read_replica():
+    """Route the reads inside the block to the replica"""
+    token = _read_intent.set(True)
+    try:
+        yield
+    finally:
+        _read_intent.reset(token)
+
+
+@contextmanager
+def primary():
+    """Route the reads inside the block to the primary, e.g. to fill a cache that outlives the request"""
+    token = _read_intent.set(False)
+    try:
+        yield
+    finally:
+        _read_intent.reset(token)
+
+
+def read_only(view_method):
+    """Mark a view method (sync or async) as read-only so its queries can use the replica"""
+    if iscoroutinefunction(view_method):
+        @wraps(view_method)
+        async def async_wrapper(*args, **kwargs):
+            with read_replica():
+                return await view_method(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(view_method)
+    def wrapper(*args, **kwargs):
+        with read_replica():
+            return view_method(*args, **kwargs)
+    return wrapper
+
+
+def pin_to_primary():
+    _pinned_to_primary.set(True)
+
+
+@contextmanager
+def request_scope():
+    """Fresh routing state for a request (worker threads are reused, so context variables are too)"""
+    intent_token = _read_intent.set(False)
+    pin_token = _pinned_to_primary.set(False)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(pin_token)
+        _read_intent.reset(intent_token)
+
+
+@sync_and_async_middleware
+def ReplicaRoutingMiddleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with request_scope():
+                return await get_response(request)
+        return markcoroutinefunction(middleware)
+
+    def middleware(request):
+        with request_scope():
+            return get_response(request)
+    return middleware
+
+
+class ReadReplicaRouter:
+    """Sends marked reads to the replica, writes (and the reads after them) to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if _read_intent.get() and replica_allowed():
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is populated by replication, never migrated directly
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,33 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from attendenceSettings.service import AttendanceArchiveService
+
+
+class Command(BaseCommand):
+    help = "Move closed months of attendance from the hot table to the archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before', type=date.fromisoformat,
+            help="Archive the months before this date (YYYY-MM-DD, rounded down to the month), "
+                 "default keeps ATTENDANCE_HOT_MONTHS (3) full months hot"
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Only list the months that would be archived")
+
+    def handle(self, *args, **options):
+        cutoff = options['before'] or AttendanceArchiveService.default_cutoff()
+        cutoff = AttendanceArchiveService.month_start(cutoff)
+        try:
+            AttendanceArchiveService.check_cutoff(cutoff)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['dry_run']:
+            for period in AttendanceArchiveService.pending_periods(cutoff):
+                self.stdout.write(f"{period:%Y-%m}")
+            return
+
+        archived = AttendanceArchiveService.archive_before(cutoff)
+        for period, moved in archived:
+            self.stdout.write(f"{period:%Y-%m}: {moved} records archived")
+        self.stdout.write(self.style.SUCCESS(f"Archived {len(archived)} months before {cutoff}"))
@@ -0,0 +1,29 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from attendenceSettings.utils import auto_mark_absent
+
+
+class Command(BaseCommand):
+    help = "Mark employees without an attendance record as absent (or on leave) for a range of business dates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, action='append', help="Company to process, can be repeated (default 1)")
+        parser.add_argument('--date-from', type=date.fromisoformat, help="First business date (YYYY-MM-DD), default yesterday")
+        parser.add_argument('--date-to', type=date.fromisoformat, help="Last business date (YYYY-MM-DD), default --date-from")
+        parser.add_argument('--batch-size', type=int, default=500, help="Records inserted per batch")
+
+    def handle(self, *args, **options):
+        date_from = options['date_from'] or timezone.localdate() - timedelta(days=1)
+        date_to = options['date_to'] or date_from
+        if date_from > date_to:
+            raise CommandError("--date-to cannot be before --date-from")
+
+        for company_id in options['company'] or [1]:
+            day = date_from
+            while day <= date_to:
+                marked = auto_mark_absent(day, company_id=company_id, batch_size=options['batch_size'])
+                self.stdout.write(f"Company {company_id}, {day}: marked {marked} employees")
+                day += timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from attendenceSettings.service import PunchQueueService
+
+
+class Command(BaseCommand):
+    help = "Process attendance punches accepted in queued mode (ATTENDANCE_PUNCH_QUEUE_ENABLED)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Punches claimed per batch")
+        parser.add_argument('--max-attempts', type=int, default=5, help="Attempts before a punch is marked failed")
+        parser.add_argument('--loop', action='store_true', help="Keep polling the queue instead of exiting when it is empty")
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds to wait between polls when the queue is empty")
+        parser.add_argument('--reclaim-after', type=int, default=10, help="Minutes after which punches claimed by a dead worker are retried")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            PunchQueueService.reclaim_stale(options['reclaim_after'])
+            try:
+                processed = PunchQueueService.process_batch(options['batch_size'], options['max_attempts'])
+            except Exception as e:
+                self.stderr.write(f"Error processing punch batch: {e}")
+                processed = 0
+            total += processed
+
+            if processed:
+                self.stdout.write(f"Processed {processed} punches")
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} queued punches"))
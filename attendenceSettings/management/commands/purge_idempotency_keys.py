@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from attendenceSettings.service import AttendanceService
+
+
+class Command(BaseCommand):
+    help = "Delete attendance punch idempotency keys older than ATTENDANCE_IDEMPOTENCY_TTL_HOURS"
+
+    def handle(self, *args, **options):
+        deleted = AttendanceService.purge_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys"))
@@ -0,0 +1,23 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from attendenceSettings.service import DailySummaryService
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily attendance summary for a date range from the live attendance records"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', type=date.fromisoformat, help="First business date (YYYY-MM-DD), default today")
+        parser.add_argument('--date-to', type=date.fromisoformat, help="Last business date (YYYY-MM-DD), default --date-from")
+        parser.add_argument('--company', type=int, help="Only rebuild this company")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows read and written per batch")
+
+    def handle(self, *args, **options):
+        date_from = options['date_from'] or timezone.localdate()
+        date_to = options['date_to'] or date_from
+        if date_from > date_to:
+            raise CommandError("--date-to cannot be before --date-from")
+
+        written = DailySummaryService.rebuild(date_from, date_to, options['company'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} summary rows from {date_from} to {date_to}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from attendenceSettings.service import LeaveLedgerService
+
+
+class Command(BaseCommand):
+    help = "Recompute leave balances from the leave ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employee', type=int, help="Only rebuild this employee's balances")
+        parser.add_argument('--year', type=int, help="Only rebuild balances of this year")
+
+    def handle(self, *args, **options):
+        written = LeaveLedgerService.rebuild(options['employee'], options['year'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} leave balances"))
@@ -0,0 +1,27 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from attendenceSettings.service import LeaveSettingService
+
+
+class Command(BaseCommand):
+    help = "Upsert a company's leave settings for a financial year from an allocation CSV (employee,<attendance type>,...)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help="CSV path, header: employee followed by attendance type ids or codes")
+        parser.add_argument('--company', type=int, required=True)
+        parser.add_argument('--financial-year-start', type=date.fromisoformat, required=True, help="YYYY-MM-DD")
+        parser.add_argument('--financial-year-end', type=date.fromisoformat, required=True, help="YYYY-MM-DD")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows written per upsert")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['csv_file'], newline='', encoding='utf-8-sig') as lines:
+                matrix = LeaveSettingService.parse_csv(lines)
+            written = LeaveSettingService.rollout(
+                matrix, options['company'], options['financial_year_start'], options['financial_year_end'], options['batch_size']
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} leave settings for company {options['company']} from {options['financial_year_start']}"
+        ))
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_attendance_date(apps, schema_editor):
+    """Set the shift-aware business date on existing attendance records"""
+    Attendance = apps.get_model('attendenceSettings', 'Attendance')
+    batch = []
+    records = (
+        Attendance.objects.filter(date_check_in__isnull=False)
+        .select_related('sub_shift')
+        .only('id', 'date_check_in', 'sub_shift__time_start', 'sub_shift__time_end')
+        .iterator(chunk_size=2000)
+    )
+    for attendance in records:
+        check_in = attendance.date_check_in
+        if timezone.is_aware(check_in):
+            check_in = timezone.localtime(check_in)
+        business_date = check_in.date()
+        sub_shift = attendance.sub_shift
+        if (
+            sub_shift and sub_shift.time_start and sub_shift.time_end
+            and sub_shift.time_end < sub_shift.time_start
+            and check_in.time() <= sub_shift.time_end
+        ):
+            business_date -= timedelta(days=1)
+        attendance.attendance_date = business_date
+        batch.append(attendance)
+        if len(batch) >= 2000:
+            Attendance.objects.bulk_update(batch, ['attendance_date'])
+            batch = []
+    if batch:
+        Attendance.objects.bulk_update(batch, ['attendance_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendenceSettings', '0009_leavesetting_delete_leavebalancemapping'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='attendance_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_attendance_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['employee', 'attendance_date'], name='att_emp_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['employee', 'attendance_date'], name='att_emp_date_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['attendance_date'], name='att_date_alive_idx'),
+        ),
+    ]
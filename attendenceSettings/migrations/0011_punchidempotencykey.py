@@ -0,0 +1,25 @@
+import rest_framework.utils.encoders
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendenceSettings', '0010_attendance_attendance_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PunchIdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employee', models.IntegerField(blank=True, null=True)),
+                ('key', models.CharField(max_length=100)),
+                ('response', models.JSONField(blank=True, encoder=rest_framework.utils.encoders.JSONEncoder, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'unique_together': {('employee', 'key')},
+            },
+        ),
+    ]
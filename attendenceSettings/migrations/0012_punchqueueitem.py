@@ -0,0 +1,34 @@
+import rest_framework.utils.encoders
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendenceSettings', '0011_punchidempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PunchQueueItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticket', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('employee', models.IntegerField(blank=True, null=True)),
+                ('action_type', models.IntegerField(blank=True, null=True)),
+                ('source_id', models.IntegerField(blank=True, null=True)),
+                ('remarks', models.TextField(blank=True, null=True)),
+                ('punch_time', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('result', models.JSONField(blank=True, encoder=rest_framework.utils.encoders.JSONEncoder, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='punch_queue_status_idx')],
+            },
+        ),
+    ]
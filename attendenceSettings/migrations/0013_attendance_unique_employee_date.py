@@ -0,0 +1,55 @@
+import logging
+from django.db import migrations, models
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+
+def soft_delete_duplicate_attendance(apps, schema_editor):
+    """
+    Keep one live record per employee and business date and soft delete the rest.
+    The kept record is the one with the most punches (a check-out, then a check-in), so a real
+    check-in wins over an auto-absent row, ties keep the lowest id. The removed ids are logged.
+    """
+    Attendance = apps.get_model('attendenceSettings', 'Attendance')
+    duplicates = (
+        Attendance.objects.filter(deleted=False, employee__isnull=False, attendance_date__isnull=False)
+        .values('employee', 'attendance_date')
+        .annotate(records=Count('id'))
+        .filter(records__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        records = sorted(
+            Attendance.objects.filter(
+                employee=duplicate['employee'],
+                attendance_date=duplicate['attendance_date'],
+                deleted=False
+            ).values_list('id', 'date_check_in', 'date_check_out'),
+            key=lambda record: (record[2] is None, record[1] is None, record[0])
+        )
+        keep_id = records[0][0]
+        removed_ids = [record[0] for record in records[1:]]
+        Attendance.objects.filter(id__in=removed_ids).update(deleted=True)
+        logger.warning(
+            "Duplicate attendance of employee %s on %s: kept id %s, soft deleted ids %s",
+            duplicate['employee'], duplicate['attendance_date'], keep_id, removed_ids
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendenceSettings', '0012_punchqueueitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(soft_delete_duplicate_attendance, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='attendance',
+            name='att_emp_date_alive_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted', False)), fields=('employee', 'attendance_date'), name='uniq_att_emp_date_alive'),
+        ),
+    ]
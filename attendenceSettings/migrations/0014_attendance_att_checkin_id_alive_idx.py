@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendenceSettings', '0013_attendance_unique_employee_date'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['-date_check_in', '-id'], name='att_checkin_id_alive_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendenceSettings', '0014_attendance_att_checkin_id_alive_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employee', models.IntegerField()),
+                ('company', models.IntegerField(blank=True, null=True)),
+                ('date', models.DateField()),
+                ('is_present', models.BooleanField(default=False)),
+                ('is_late', models.BooleanField(default=False)),
+                ('is_absent', models.BooleanField(default=False)),
+                ('is_leave', models.BooleanField(default=False)),
+                ('check_in', models.DateTimeField(blank=True, null=True)),
+                ('check_out', models.DateTimeField(blank=True, null=True)),
+                ('working_hour', models.FloatField(blank=True, null=True)),
+                ('late_by_minutes', models.PositiveIntegerField(blank=True, null=True)),
+                ('overtime_minutes', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('attendance', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_summary', to='attendenceSettings.attendance')),
+                ('attendance_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='attendenceSettings.attendancetype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='summary_date_idx'), models.Index(fields=['company', 'date'], name='summary_company_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('employee', 'date'), name='uniq_summary_emp_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """AttendanceType leave fields that were added to the model without a migration"""
+
+    dependencies = [
+        ('attendenceSettings', '0015_dailyattendancesummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancetype',
+            name='default_allotted_days',
+            field=models.PositiveIntegerField(default=0, help_text='Default allotted days for this leave type'),
+        ),
+        migrations.AddField(
+            model_name='attendancetype',
+            name='max_allotted_days',
+            field=models.PositiveIntegerField(default=365, help_text='Maximum allotted days allowed'),
+        ),
+        migrations.AddField(
+            model_name='attendancetype',
+            name='is_paid_leave',
+            field=models.BooleanField(default=True, help_text='Whether this is a paid leave'),
+        ),
+        migrations.AddField(
+            model_name='attendancetype',
+            name='is_medical_leave',
+            field=models.BooleanField(default=False, help_text='Whether this is a medical leave'),
+        ),
+        migrations.AddField(
+            model_name='attendancetype',
+            name='requires_approval',
+            field=models.BooleanField(default=True, help_text='Whether approval is required'),
+        ),
+        migrations.AddField(
+            model_name='attendancetype',
+            name='requires_attachment',
+            field=models.BooleanField(default=False, help_text='Whether attachment is required'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def opening_entries(apps, schema_editor):
+    """Existing balances become the first ledger entries, so rebuilding gives the same totals"""
+    LeaveBalance = apps.get_model('attendenceSettings', 'LeaveBalance')
+    LeaveLedgerEntry = apps.get_model('attendenceSettings', 'LeaveLedgerEntry')
+    entries = []
+    balances = LeaveBalance.objects.filter(
+        employee__isnull=False, attendance_type__isnull=False, year__isnull=False
+    ).iterator(chunk_size=1000)
+    for balance in balances:
+        for entry_type, days in (('grant', balance.total_days), ('adjust', balance.used_days)):
+            if days:
+                entries.append(LeaveLedgerEntry(
+                    employee=balance.employee,
+                    attendance_type_id=balance.attendance_type_id,
+                    year=balance.year,
+                    entry_type=entry_type,
+                    days=days,
+                    remarks='Opening balance',
+                ))
+    LeaveLedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendenceSettings', '0017_holiday_weeklyoff'),
+    ]
+
+    operations = [
+        # LeaveBalance.leave_type was renamed in the model without a migration
+        migrations.RenameField(
+            model_name='leavebalance',
+            old_name='leave_type',
+            new_name='attendance_type',
+        ),
+        migrations.AlterModelOptions(
+            name='leavebalance',
+            options={'ordering': ['-year', 'attendance_type__title']},
+        ),
+        migrations.CreateModel(
+            name='LeaveLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employee', models.IntegerField()),
+                ('company', models.IntegerField(blank=True, null=True)),
+                ('year', models.PositiveIntegerField()),
+                ('entry_type', models.CharField(choices=[('grant', 'Grant'), ('consume', 'Consume'), ('cancel', 'Cancel'), ('adjust', 'Adjust')], max_length=10)),
+                ('days', models.IntegerField()),
+                ('remarks', models.TextField(blank=True, null=True)),
+                ('created_by', models.IntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('attendance_type', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='attendenceSettings.attendancetype')),
+                ('leave_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='attendenceSettings.leaverequest')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['employee', 'attendance_type', 'year'], name='ledger_emp_type_year_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('leave_request__isnull', False)), fields=('leave_request', 'entry_type'), name='uniq_ledger_request_entry_type')],
+            },
+        ),
+        migrations.RunPython(opening_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,133 @@
+import datetime
+import logging
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+# Old company-wide columns and the attendance type codes/titles their days move to
+OLD_LEAVE_COLUMNS = [
+    ('annual_leave_days', ['AL', 'EL'], 'Annual Leave'),
+    ('sick_leave_days', ['SL'], 'Sick Leave'),
+    ('casual_leave_days', ['CL'], 'Casual Leave'),
+    ('maternity_leave_days', ['ML'], 'Maternity Leave'),
+    ('paternity_leave_days', ['PL'], 'Paternity Leave'),
+]
+
+
+def split_company_settings(apps, schema_editor):
+    """
+    Carry the old company-wide days over as one company-level row (employee empty) per leave
+    attendance type and financial year (April to March). Columns without a matching attendance
+    type are logged as warnings, allow_carry_forward and require_approval have no place in the new shape.
+    """
+    LeaveSetting = apps.get_model('attendenceSettings', 'LeaveSetting')
+    AttendanceType = apps.get_model('attendenceSettings', 'AttendanceType')
+
+    type_ids = {}
+    for column, codes, title in OLD_LEAVE_COLUMNS:
+        attendance_type = (
+            AttendanceType.objects.filter(Q(code__in=codes) | Q(title__iexact=title), is_leave=True, deleted=False)
+            .order_by('id').first()
+        )
+        if attendance_type:
+            type_ids[column] = attendance_type.id
+
+    old_settings = list(LeaveSetting.objects.filter(attendance_type__isnull=True, employee__isnull=True))
+    new_settings = []
+    for old in old_settings:
+        start = datetime.date(old.financial_year, 4, 1)
+        for column, codes, title in OLD_LEAVE_COLUMNS:
+            if column not in type_ids:
+                logger.warning(
+                    "LeaveSetting %s (company %s, FY %s): no leave attendance type for %s, %s days not carried over",
+                    old.id, old.company, old.financial_year, title, getattr(old, column)
+                )
+                continue
+            new_settings.append(LeaveSetting(
+                company=old.company,
+                attendance_type_id=type_ids[column],
+                financial_year_start=start,
+                financial_year_end=datetime.date(old.financial_year + 1, 3, 31),
+                allotted_days=getattr(old, column),
+                deleted=old.deleted or not old.is_active,
+            ))
+    LeaveSetting.objects.bulk_create(new_settings, batch_size=1000)
+    LeaveSetting.objects.filter(id__in=[old.id for old in old_settings]).delete()
+
+    if schema_editor.connection.vendor == 'postgresql':
+        # Check the new foreign keys now, PostgreSQL won't alter a table with pending trigger events
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+    """
+    LeaveSetting was reshaped in the model (one row per employee, attendance type and financial
+    year) without a migration, this brings the table in line. The days of the old company-wide
+    columns are carried over (split_company_settings) before the columns are dropped.
+    """
+
+    dependencies = [
+        ('attendenceSettings', '0018_leaveledgerentry'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='leavesetting',
+            unique_together=set(),
+        ),
+        migrations.AlterModelOptions(
+            name='leavesetting',
+            options={'verbose_name': 'Leave Setting', 'verbose_name_plural': 'Leave Settings'},
+        ),
+        migrations.AddField(
+            model_name='leavesetting',
+            name='employee',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='leavesetting',
+            name='attendance_type',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='attendenceSettings.attendancetype'),
+        ),
+        migrations.AddField(
+            model_name='leavesetting',
+            name='financial_year_start',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='leavesetting',
+            name='financial_year_end',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='leavesetting',
+            name='allotted_days',
+            field=models.PositiveIntegerField(blank=True, default=0, null=True),
+        ),
+        migrations.AlterField(
+            model_name='leavesetting',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='leavesetting',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.RunPython(split_company_settings, migrations.RunPython.noop),
+        migrations.RemoveField(model_name='leavesetting', name='financial_year'),
+        migrations.RemoveField(model_name='leavesetting', name='annual_leave_days'),
+        migrations.RemoveField(model_name='leavesetting', name='sick_leave_days'),
+        migrations.RemoveField(model_name='leavesetting', name='casual_leave_days'),
+        migrations.RemoveField(model_name='leavesetting', name='maternity_leave_days'),
+        migrations.RemoveField(model_name='leavesetting', name='paternity_leave_days'),
+        migrations.RemoveField(model_name='leavesetting', name='allow_carry_forward'),
+        migrations.RemoveField(model_name='leavesetting', name='require_approval'),
+        migrations.RemoveField(model_name='leavesetting', name='is_active'),
+        migrations.AlterUniqueTogether(
+            name='leavesetting',
+            unique_together={('employee', 'company', 'attendance_type', 'financial_year_start')},
+        ),
+    ]
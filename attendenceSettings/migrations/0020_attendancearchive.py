@@ -0,0 +1,75 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def partition_archive(apps, schema_editor):
+    """
+    On PostgreSQL recreate the archive as a table partitioned by month on attendance_date
+    (partitions are added by archive_attendance). The primary key has to include the partition key.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    AttendanceArchive = apps.get_model('attendenceSettings', 'AttendanceArchive')
+    table = AttendanceArchive._meta.db_table
+    quote = schema_editor.quote_name
+    schema_editor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(table + '_plain')}")
+    schema_editor.execute(
+        f"CREATE TABLE {quote(table)} (LIKE {quote(table + '_plain')} INCLUDING DEFAULTS) "
+        f"PARTITION BY RANGE ({quote('attendance_date')})"
+    )
+    schema_editor.execute(f"DROP TABLE {quote(table + '_plain')}")
+    schema_editor.execute(f"ALTER TABLE {quote(table)} ADD PRIMARY KEY ({quote('id')}, {quote('attendance_date')})")
+    for index in AttendanceArchive._meta.indexes:
+        schema_editor.add_index(AttendanceArchive, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendenceSettings', '0019_leavesetting_per_employee'),
+        ('shiftSetting', '0002_alter_shift_shift_head_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(unique=True)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['period'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AttendanceArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('employee', models.IntegerField(blank=True, null=True)),
+                ('company', models.IntegerField(blank=True, null=True)),
+                ('date_check_in', models.DateTimeField(blank=True, null=True)),
+                ('date_check_out', models.DateTimeField(blank=True, null=True)),
+                ('attendance_date', models.DateField()),
+                ('remarks', models.TextField(blank=True, null=True)),
+                ('is_late', models.BooleanField(default=False)),
+                ('late_by_minutes', models.PositiveIntegerField(blank=True, null=True)),
+                ('overtime_minutes', models.FloatField(blank=True, null=True)),
+                ('working_hour', models.FloatField(blank=True, null=True)),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('action', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='attendenceSettings.action')),
+                ('attendance_type', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='attendenceSettings.attendancetype')),
+                ('shift', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shiftSetting.shift')),
+                ('source', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='attendenceSettings.source')),
+                ('sub_shift', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='shiftSetting.subshift')),
+            ],
+            options={
+                'ordering': ['-date_check_in'],
+                'indexes': [models.Index(fields=['employee', 'attendance_date'], name='att_arch_emp_date_idx'), models.Index(fields=['attendance_date'], name='att_arch_date_idx'), models.Index(fields=['-date_check_in', '-id'], name='att_arch_checkin_id_idx')],
+            },
+        ),
+        migrations.RunPython(partition_archive, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # LeaveAllocation and LeaveDetail aren't migrated yet, their partial indexes come with the
+    # migration that creates them
+
+    dependencies = [
+        ('attendenceSettings', '0020_attendancearchive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['company', 'attendance_date'], name='att_company_date_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leavebalance',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['employee', 'year'], name='balance_emp_year_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['-created_at'], name='leave_created_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['employee', 'start_date'], name='leave_emp_start_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['status', 'start_date'], name='leave_status_start_alive_idx'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendenceSettings', '0021_alive_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='leavebalance',
+            name='remaining_days',
+            field=models.IntegerField(blank=True, default=0, null=True),
+        ),
+    ]
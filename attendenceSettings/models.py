@@ -1,5 +1,9 @@
-from django.db import models
+import uuid
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+from attendence.managers import SoftDeleteManager, SoftDeleteQuerySet
 from shiftSetting.models import *
 
 class Action(models.Model):
@@ -76,17 +80,41 @@ class AttendanceType(models.Model):
             year = timezone.now().year
         
         try:
-            leave_allocation = LeaveAllocation.objects.get(
+            leave_allocation = LeaveAllocation.objects.alive().get(
                 employee=employee_id,
                 attendance_type=self,
-                financial_year=year,
-                deleted=False
+                financial_year=year
             )
             return leave_allocation.allotted_days
         except LeaveAllocation.DoesNotExist:
             return self.default_allotted_days
 
 
+class AttendanceQuerySet(SoftDeleteQuerySet):
+
+    def soft_delete(self):
+        """
+        Single UPDATE like the base queryset, the daily summary rows of the records are dropped
+        with one DELETE and today's cached statuses are invalidated (save() signals don't run)
+        """
+        from .cache import attendance_status
+        records = self.alive()
+        today = timezone.localdate()
+        stale = list(records.filter(attendance_date=today).values_list('employee', flat=True))
+        DailyAttendanceSummary.objects.filter(attendance__in=records.values('pk')).delete()
+        deleted = super().soft_delete()
+
+        def invalidate():
+            for employee in stale:
+                attendance_status.delete(employee, today)
+        transaction.on_commit(invalidate)
+        return deleted
+
+
+class AttendanceManager(models.Manager.from_queryset(AttendanceQuerySet)):
+    pass
+
+
 class Attendance(models.Model):
     """
     Main attendance model for check-in and check-out records
@@ -101,6 +129,7 @@ class Attendance(models.Model):
     action = models.ForeignKey('Action', on_delete=models.DO_NOTHING, null=True, blank=True)
     date_check_in = models.DateTimeField(null=True, blank=True) 
     date_check_out = models.DateTimeField(null=True, blank=True)  
+    attendance_date = models.DateField(null=True, blank=True)  # Shift-aware business date of the check-in
 
     source = models.ForeignKey(Source, on_delete=models.DO_NOTHING, null=True, blank=True)
     remarks = models.TextField(null=True, blank=True)
@@ -114,8 +143,21 @@ class Attendance(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AttendanceManager()
+
     class Meta:
         ordering = ['-date_check_in']
+        indexes = [
+            models.Index(fields=['employee', 'attendance_date'], name='att_emp_date_idx'),
+            models.Index(fields=['company', 'attendance_date'], condition=models.Q(deleted=False), name='att_company_date_alive_idx'),
+            models.Index(fields=['attendance_date'], condition=models.Q(deleted=False), name='att_date_alive_idx'),
+            # Keyset pagination order of the attendance list
+            models.Index(fields=['-date_check_in', '-id'], condition=models.Q(deleted=False), name='att_checkin_id_alive_idx'),
+        ]
+        constraints = [
+            # One live attendance record per employee and business date
+            models.UniqueConstraint(fields=['employee', 'attendance_date'], condition=models.Q(deleted=False), name='uniq_att_emp_date_alive'),
+        ]
 
     def __str__(self):
         try:
@@ -125,6 +167,213 @@ class Attendance(models.Model):
         except Exception:
             return f"{self.employee} - Unknown Action"
 
+    def save(self, *args, **kwargs):
+        # Keep the business date in sync with the check-in time
+        if self.date_check_in:
+            from .utils import get_business_date
+            self.attendance_date = get_business_date(self.date_check_in, self.sub_shift)
+        super().save(*args, **kwargs)
+
+
+class AttendanceArchive(models.Model):
+    """
+    Archive tier of Attendance - closed months moved out of the hot table by
+    `python manage.py archive_attendance`. Rows keep their original id and columns. On PostgreSQL
+    the table is natively partitioned by month on attendance_date (one partition per archived month).
+    History and report reads add it only when the requested range starts before the archive boundary.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    employee = models.IntegerField(null=True, blank=True)
+    company = models.IntegerField(null=True, blank=True)
+
+    # No database constraints, partitions can't carry them cheaply and the rows are read-only
+    attendance_type = models.ForeignKey('AttendanceType', on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+')
+    shift = models.ForeignKey('shiftSetting.Shift', on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+')
+    sub_shift = models.ForeignKey('shiftSetting.SubShift', on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+')
+
+    action = models.ForeignKey('Action', on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+')
+    date_check_in = models.DateTimeField(null=True, blank=True)
+    date_check_out = models.DateTimeField(null=True, blank=True)
+    attendance_date = models.DateField()  # Partition key
+
+    source = models.ForeignKey(Source, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+')
+    remarks = models.TextField(null=True, blank=True)
+
+    is_late = models.BooleanField(default=False)
+    late_by_minutes = models.PositiveIntegerField(null=True, blank=True)
+    overtime_minutes = models.FloatField(null=True, blank=True)
+    working_hour = models.FloatField(null=True, blank=True)
+
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    objects = SoftDeleteManager()
+
+    class Meta:
+        ordering = ['-date_check_in']
+        indexes = [
+            models.Index(fields=['employee', 'attendance_date'], name='att_arch_emp_date_idx'),
+            models.Index(fields=['attendance_date'], name='att_arch_date_idx'),
+            models.Index(fields=['-date_check_in', '-id'], name='att_arch_checkin_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee} - {self.attendance_date} (archived)"
+
+
+class ArchivedPeriod(models.Model):
+    """A month moved to AttendanceArchive, the latest one sets the archive boundary"""
+    period = models.DateField(unique=True)  # First day of the month
+    rows = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['period']
+
+    def __str__(self):
+        return f"{self.period:%Y-%m} ({self.rows} rows)"
+
+
+class PunchIdempotencyKey(models.Model):
+    """
+    Stored result of an attendance punch for a client supplied idempotency key,
+    so retried requests get the original response back
+    """
+    employee = models.IntegerField(null=True, blank=True)
+    key = models.CharField(max_length=100)
+    response = models.JSONField(encoder=JSONEncoder, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ('employee', 'key')
+
+    def __str__(self):
+        return f"{self.employee} - {self.key}"
+
+
+class PunchQueueItem(models.Model):
+    """
+    Attendance punch accepted in queued mode, waiting for the process_punch_queue worker
+    """
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    ticket = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    employee = models.IntegerField(null=True, blank=True)
+    action_type = models.IntegerField(null=True, blank=True)  # Action ID
+    source_id = models.IntegerField(null=True, blank=True)
+    remarks = models.TextField(null=True, blank=True)
+    punch_time = models.DateTimeField(null=True, blank=True)  # Time the punch was accepted (or custom timestamp)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    result = models.JSONField(encoder=JSONEncoder, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='punch_queue_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ticket} - {self.employee} ({self.status})"
+
+
+class DailyAttendanceSummary(models.Model):
+    """
+    Per-employee, per-business-date rollup of the live Attendance record, so reports read one
+    row per employee-day. Refreshed by DailySummaryService whenever a day's record changes,
+    rebuild a date range with `python manage.py rebuild_attendance_summary`.
+    """
+    employee = models.IntegerField()
+    company = models.IntegerField(null=True, blank=True)
+    date = models.DateField()  # Business date (Attendance.attendance_date)
+    attendance = models.ForeignKey(Attendance, on_delete=models.CASCADE, related_name='daily_summary', null=True, blank=True)
+    attendance_type = models.ForeignKey(AttendanceType, on_delete=models.DO_NOTHING, null=True, blank=True)
+
+    is_present = models.BooleanField(default=False)
+    is_late = models.BooleanField(default=False)
+    is_absent = models.BooleanField(default=False)
+    is_leave = models.BooleanField(default=False)
+
+    check_in = models.DateTimeField(null=True, blank=True)
+    check_out = models.DateTimeField(null=True, blank=True)
+    working_hour = models.FloatField(null=True, blank=True)
+    late_by_minutes = models.PositiveIntegerField(null=True, blank=True)
+    overtime_minutes = models.FloatField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'date'], name='uniq_summary_emp_date'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='summary_date_idx'),
+            models.Index(fields=['company', 'date'], name='summary_company_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee} - {self.date}"
+
+
+class Holiday(models.Model):
+    """
+    Company holiday calendar, holidays are not charged as leave days.
+    A holiday without a company applies to every company.
+    """
+    company = models.IntegerField(null=True, blank=True)
+    date = models.DateField()
+    title = models.CharField(max_length=100, null=True, blank=True)  # e.g., Independence Day
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
+
+    class Meta:
+        ordering = ['date']
+        indexes = [
+            models.Index(fields=['company', 'date'], name='holiday_company_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.title or 'Holiday'}"
+
+
+class WeeklyOff(models.Model):
+    """
+    Weekly off days of a company, or of one shift when its pattern differs from the company's
+    (a shift with its own rows ignores the company rows). week_of_month limits the off day to
+    the Nth occurrence in the month (e.g. 2nd and 4th Saturday), empty means every week.
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'),
+        (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday'),
+    ]
+
+    company = models.IntegerField(null=True, blank=True)
+    shift = models.ForeignKey('shiftSetting.Shift', on_delete=models.DO_NOTHING, null=True, blank=True, related_name='weekly_offs')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    week_of_month = models.PositiveSmallIntegerField(null=True, blank=True)  # 1-5, empty = every week
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
+
+    def __str__(self):
+        week = f" (week {self.week_of_month})" if self.week_of_month else ""
+        return f"{self.get_weekday_display()}{week}"
+
 
 class Status(models.Model):
     """
@@ -155,8 +404,13 @@ class LeaveAllocation(models.Model):
     updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
     deleted = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+
     class Meta:
         unique_together = ('employee', 'company', 'attendance_type', 'financial_year')
+        indexes = [
+            models.Index(fields=['employee', 'financial_year'], condition=models.Q(deleted=False), name='alloc_emp_year_alive_idx'),
+        ]
         verbose_name = "Leave Allocation"
         verbose_name_plural = "Leave Allocations"
 
@@ -188,8 +442,16 @@ class LeaveRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
 
+    objects = SoftDeleteManager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], condition=models.Q(deleted=False), name='leave_created_alive_idx'),
+            models.Index(fields=['employee', 'start_date'], condition=models.Q(deleted=False), name='leave_emp_start_alive_idx'),
+            # Approved leave overlapping a period (muster roll, balance checks)
+            models.Index(fields=['status', 'start_date'], condition=models.Q(deleted=False), name='leave_status_start_alive_idx'),
+        ]
 
     def __str__(self):
         try:
@@ -199,11 +461,10 @@ class LeaveRequest(models.Model):
             return f"{self.employee} - Unknown Type - {self.start_date} to {self.end_date}"
 
     def save(self, *args, **kwargs):
-        # Calculate total days if not set
+        # Calculate total days if not set, weekly offs and holidays are not charged
         if not self.total_days and self.start_date and self.end_date:
-            from datetime import date
-            delta = self.end_date - self.start_date
-            self.total_days = delta.days + 1  # Include both start and end dates
+            from .cache import working_days
+            self.total_days = working_days.count(self.company, self.start_date, self.end_date)
         super().save(*args, **kwargs)
 
 
@@ -216,14 +477,19 @@ class LeaveBalance(models.Model):
     year = models.PositiveIntegerField(null=True, blank=True)  # Financial year for which balance is tracked
     total_days = models.PositiveIntegerField(null=True, blank=True)  # Total days allocated
     used_days = models.PositiveIntegerField(default=0, null=True, blank=True)  # Days used
-    remaining_days = models.PositiveIntegerField(default=0, null=True, blank=True)  # Days remaining
+    remaining_days = models.IntegerField(default=0, null=True, blank=True)  # Days remaining, negative when overdrawn (e.g. LOP)
     deleted = models.BooleanField(default=False, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
 
+    objects = SoftDeleteManager()
+
     class Meta:
         unique_together = ['employee', 'attendance_type', 'year']
         ordering = ['-year', 'attendance_type__title']
+        indexes = [
+            models.Index(fields=['employee', 'year'], condition=models.Q(deleted=False), name='balance_emp_year_alive_idx'),
+        ]
 
     def __str__(self):
         try:
@@ -239,6 +505,62 @@ class LeaveBalance(models.Model):
         super().save(*args, **kwargs) 
 
 
+class LeaveLedgerEntry(models.Model):
+    """
+    Append-only record of every change to a leave balance. LeaveBalance rows are the running
+    totals of these entries and can be rebuilt from them (LeaveLedgerService.rebuild).
+    GRANT changes total_days (negative to take days back), CONSUME/CANCEL add/give back used
+    days of a leave request, ADJUST is a manual change of used_days. Neither total can go below
+    zero, remaining_days can (days used beyond the grant).
+    """
+    GRANT = 'grant'
+    CONSUME = 'consume'
+    CANCEL = 'cancel'
+    ADJUST = 'adjust'
+    ENTRY_TYPE_CHOICES = [
+        (GRANT, 'Grant'),
+        (CONSUME, 'Consume'),
+        (CANCEL, 'Cancel'),
+        (ADJUST, 'Adjust'),
+    ]
+
+    employee = models.IntegerField()
+    company = models.IntegerField(null=True, blank=True)
+    attendance_type = models.ForeignKey(AttendanceType, on_delete=models.DO_NOTHING, related_name='ledger_entries')
+    year = models.PositiveIntegerField()
+    entry_type = models.CharField(max_length=10, choices=ENTRY_TYPE_CHOICES)
+    days = models.IntegerField()
+    leave_request = models.ForeignKey('LeaveRequest', on_delete=models.DO_NOTHING, null=True, blank=True, related_name='ledger_entries')
+    remarks = models.TextField(blank=True, null=True)
+    created_by = models.IntegerField(null=True, blank=True)  # Employee ID of whoever made the change
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            # A leave request is consumed (and cancelled) at most once, even with concurrent approvals
+            models.UniqueConstraint(
+                fields=['leave_request', 'entry_type'],
+                condition=models.Q(leave_request__isnull=False),
+                name='uniq_ledger_request_entry_type',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['employee', 'attendance_type', 'year'], name='ledger_emp_type_year_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee} - {self.entry_type} {self.days} - {self.year}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Leave ledger entries can't be changed, add a new entry instead")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Leave ledger entries can't be deleted, add a new entry instead")
+
+
 class LeaveType(models.Model):
     """
     Model to manage leave types and their allocated days
@@ -281,9 +603,10 @@ class LeaveType(models.Model):
             year = timezone.now().year
         
         try:
+            # LeaveSetting refers to the attendance type carrying this leave type's code
             leave_setting = LeaveSetting.objects.get(
                 employee=employee_id,
-                leave_type=self,
+                attendance_type__code=self.code,
                 financial_year_start__year=year,
                 deleted=False
             )
@@ -298,7 +621,7 @@ class LeaveSetting(models.Model):
     """
     employee = models.IntegerField(null=True, blank=True)  # FK to Employee
     company = models.IntegerField(null=True, blank=True)   # FK to Company
-    leave_type = models.ForeignKey(LeaveType, on_delete=models.DO_NOTHING, null=True, blank=True)
+    attendance_type = models.ForeignKey(AttendanceType, on_delete=models.DO_NOTHING, null=True, blank=True)
     
     financial_year_start = models.DateField(null=True, blank=True)  # e.g., 2025-04-01
     financial_year_end = models.DateField(null=True, blank=True)    # e.g., 2026-03-31
@@ -309,12 +632,12 @@ class LeaveSetting(models.Model):
     deleted = models.BooleanField(default=False)
 
     class Meta:
-        unique_together = ('employee', 'company', 'leave_type', 'financial_year_start')
+        unique_together = ('employee', 'company', 'attendance_type', 'financial_year_start')
         verbose_name = "Leave Setting"
         verbose_name_plural = "Leave Settings"
 
     def __str__(self):
-        return f"{self.employee} - {self.leave_type} - FY {self.financial_year_start.year if self.financial_year_start else 'N/A'}"
+        return f"{self.employee} - {self.attendance_type} - FY {self.financial_year_start.year if self.financial_year_start else 'N/A'}"
 
 
 class LeaveDetail(models.Model):
@@ -331,9 +654,14 @@ class LeaveDetail(models.Model):
     updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
     deleted = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+
     class Meta:
         unique_together = ('employee', 'company', 'attendance_type', 'financial_year_start')
         db_table = 'leaveDetail'
+        indexes = [
+            models.Index(fields=['company', 'financial_year_start'], condition=models.Q(deleted=False), name='detail_company_fy_alive_idx'),
+        ]
 
     def __str__(self):
         try:
@@ -0,0 +1,82 @@
+import base64
+import heapq
+import json
+from itertools import islice
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class AttendanceKeysetPagination:
+    """
+    Keyset (seek) pagination for attendance lists, newest first on (date_check_in, id).
+    Each page continues from the last row of the previous one with a WHERE clause instead
+    of an OFFSET, so deep pages cost the same as the first. Rows without a check-in time
+    have no business date either and are left out. The cursor is an opaque url-safe token
+    holding the last row's key.
+    An archive queryset can be passed along, its page is merged with the hot table's page on
+    the same key (archived rows keep their original ids).
+    """
+    ordering = ('-date_check_in', '-id')
+
+    @staticmethod
+    def encode_cursor(attendance):
+        position = {"t": attendance.date_check_in.isoformat(), "id": attendance.id}
+        return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Return (date_check_in, id) from a cursor token, raises InvalidCursor"""
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            date_check_in = parse_datetime(position["t"])
+            if date_check_in is None:
+                raise ValueError
+            return date_check_in, int(position["id"])
+        except (ValueError, TypeError, KeyError, AttributeError):
+            raise InvalidCursor("Invalid cursor")
+
+    def after(self, queryset, cursor):
+        """Rows that come after the cursor position"""
+        date_check_in, pk = self.decode_cursor(cursor)
+        return queryset.filter(Q(date_check_in__lt=date_check_in) | Q(date_check_in=date_check_in, id__lt=pk))
+
+    def page_queryset(self, queryset, cursor, page_size):
+        """One extra row is fetched to know whether there is a next page"""
+        queryset = queryset.filter(date_check_in__isnull=False)
+        if cursor:
+            queryset = self.after(queryset, cursor)
+        return queryset.order_by(*self.ordering)[:page_size + 1]
+
+    def _page(self, rows, page_size):
+        next_cursor = self.encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+        return rows[:page_size], next_cursor
+
+    @staticmethod
+    def _reaches(rows, page_size, archive_before):
+        """
+        Whether archived rows can still belong on the page - the hot page isn't full, or its last
+        row checked in before archive_before (no archived row checked in after that)
+        """
+        return len(rows) <= page_size or archive_before is None or rows[-1].date_check_in < archive_before
+
+    def _merge(self, rows, archived_rows, page_size):
+        key = lambda row: (row.date_check_in, row.id)
+        return list(islice(heapq.merge(rows, archived_rows, key=key, reverse=True), page_size + 1))
+
+    def paginate(self, queryset, cursor=None, page_size=100, archive=None, archive_before=None):
+        """Returns: (rows, next_cursor) - next_cursor is None on the last page"""
+        rows = list(self.page_queryset(queryset, cursor, page_size))
+        if archive is not None and self._reaches(rows, page_size, archive_before):
+            rows = self._merge(rows, list(self.page_queryset(archive, cursor, page_size)), page_size)
+        return self._page(rows, page_size)
+
+    async def apaginate(self, queryset, cursor=None, page_size=100, archive=None, archive_before=None):
+        rows = [row async for row in self.page_queryset(queryset, cursor, page_size)]
+        if archive is not None and self._reaches(rows, page_size, archive_before):
+            archived_rows = [row async for row in self.page_queryset(archive, cursor, page_size)]
+            rows = self._merge(rows, archived_rows, page_size)
+        return self._page(rows, page_size)
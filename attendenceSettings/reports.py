@@ -0,0 +1,290 @@
+import calendar
+from datetime import date
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractDay
+from .models import Attendance, AttendanceArchive, DailyAttendanceSummary, LeaveRequest
+from .cache import reference_data, archive_boundary
+from .db_router import read_alias
+from .service import DailySummaryService
+from .utils import get_employee_ids
+
+try:
+    import numpy as np
+except ImportError:  # reports are optional, the rest of the app works without NumPy
+    np = None
+
+
+class ReportDependencyError(Exception):
+    pass
+
+
+def _require_numpy():
+    if np is None:
+        raise ReportDependencyError("NumPy is required for attendance reports (pip install numpy)")
+
+
+def _column(values, dtype):
+    """NumPy array from a column of query values, None becomes 0"""
+    return np.fromiter((value or 0 for value in values), dtype=dtype, count=len(values))
+
+
+class MusterRollService:
+    """
+    Monthly muster roll: employees x days of month with an attendance code per cell, plus
+    per-employee totals. A month of attendance and approved leave is read in two queries (one
+    more for an archived month, from the read replica when there is one) and the matrix is filled and totalled with vectorized NumPy operations.
+    """
+    TOTALS = ["present", "late", "leave", "absent", "overtime_minutes"]
+
+    @staticmethod
+    def load(year, month, company=None, employee_ids=None):
+        """Read the month: (attendance rows, approved leave rows)"""
+        first_day = date(year, month, 1)
+        last_day = date(year, month, calendar.monthrange(year, month)[1])
+
+        db = read_alias()
+        # An archived month is read from the archive plus any record added to the hot table since
+        # (read last, so it wins a day both hold)
+        attendance_models = [AttendanceArchive, Attendance] if archive_boundary.covers(first_day) else [Attendance]
+        approved_status = reference_data.get_by_code('status', 'approved')
+        leaves = LeaveRequest.objects.using(db).alive().filter(
+            status=approved_status,
+            start_date__lte=last_day,
+            end_date__gte=first_day,
+            employee__isnull=False,
+            attendance_type__isnull=False
+        )
+        if approved_status is None:
+            leaves = leaves.none()
+        if company is not None:
+            leaves = leaves.filter(company=company)
+        if employee_ids:
+            leaves = leaves.filter(employee__in=employee_ids)
+
+        attendance_rows = []
+        for model in attendance_models:
+            attendances = model.objects.using(db).alive().filter(
+                attendance_date__range=(first_day, last_day),
+                employee__isnull=False
+            )
+            if company is not None:
+                attendances = attendances.filter(company=company)
+            if employee_ids:
+                attendances = attendances.filter(employee__in=employee_ids)
+            attendance_rows.extend(attendances.order_by().values_list(
+                'employee', ExtractDay('attendance_date'), 'attendance_type_id', 'is_late', 'overtime_minutes'
+            ))
+        leave_rows = list(leaves.order_by('id').values_list('employee', 'attendance_type_id', 'start_date', 'end_date'))
+        return attendance_rows, leave_rows
+
+    @staticmethod
+    def build(year, month, attendance_rows, leave_rows, employee_ids=()):
+        """
+        Build the muster from loaded rows.
+        Returns: dict with employees (array), days, codes (attendance codes, index 0 = no record),
+        cells (employees x days index into codes), late (bool matrix) and totals (arrays)
+        """
+        _require_numpy()
+        days = calendar.monthrange(year, month)[1]
+        first_day = date(year, month, 1)
+
+        attendance_columns = list(zip(*attendance_rows)) or [()] * 5
+        leave_columns = list(zip(*leave_rows)) or [()] * 4
+        att_employee = _column(attendance_columns[0], np.int64)
+        att_day = _column(attendance_columns[1], np.int64) - 1
+        att_type = _column(attendance_columns[2], np.int64)
+        att_late = _column(attendance_columns[3], np.bool_)
+        att_overtime = _column(attendance_columns[4], np.float64)
+        leave_employee = _column(leave_columns[0], np.int64)
+        leave_type = _column(leave_columns[1], np.int64)
+        # Clip leave ranges to the month as 0-based day offsets
+        leave_start = np.fromiter(((max(start, first_day) - first_day).days for start in leave_columns[2]), np.int64, len(leave_rows))
+        leave_end = np.fromiter(((min(end, date(year, month, days)) - first_day).days for end in leave_columns[3]), np.int64, len(leave_rows))
+
+        employees = np.unique(np.concatenate([
+            np.asarray(list(employee_ids), dtype=np.int64), att_employee, leave_employee
+        ]))
+        # Attendance type ids become dense category numbers, 0 means no record
+        type_ids = np.concatenate([[0], np.unique(np.concatenate([att_type[att_type > 0], leave_type]))])
+
+        cells = np.zeros((len(employees), days), dtype=np.int32)
+        late = np.zeros((len(employees), days), dtype=np.bool_)
+
+        row = np.searchsorted(employees, att_employee)
+        # One record per (employee, day): the last one loaded, so a hot-table record wins over the
+        # archived record of the same day for the cell and overtime alike
+        _, last = np.unique((row * days + att_day)[::-1], return_index=True)
+        keep = len(row) - 1 - last
+        row, att_day, att_type, att_late, att_overtime = (
+            row[keep], att_day[keep], att_type[keep], att_late[keep], att_overtime[keep]
+        )
+        cells[row, att_day] = np.searchsorted(type_ids, att_type)
+        late[row, att_day] = att_late
+
+        # Expand approved leaves to one (employee, day) pair per day, they only fill empty cells
+        # (a day processed by auto_mark_absent already holds the leave type)
+        lengths = np.maximum(leave_end - leave_start + 1, 0)
+        if lengths.sum():
+            leave_row = np.repeat(np.searchsorted(employees, leave_employee), lengths)
+            leave_day = np.repeat(leave_start - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            leave_category = np.repeat(np.searchsorted(type_ids, leave_type), lengths)
+            empty = cells[leave_row, leave_day] == 0
+            # First approved leave wins when requests overlap
+            flat = leave_row[empty] * days + leave_day[empty]
+            _, first = np.unique(flat, return_index=True)
+            cells[leave_row[empty][first], leave_day[empty][first]] = leave_category[empty][first]
+
+        # Per-category flags, looked up for every cell at once
+        attendance_types = [reference_data.get_by_id('attendance_type', type_id) for type_id in type_ids[1:]]
+        codes = [(attendance_type.code if attendance_type else "") or "" for attendance_type in attendance_types]
+        is_present = np.array([False] + [code in DailySummaryService.PRESENT_CODES for code in codes])
+        is_absent = np.array([False] + [code == DailySummaryService.ABSENT_CODE for code in codes])
+        is_leave = np.array([False] + [bool(attendance_type and attendance_type.is_leave) for attendance_type in attendance_types])
+
+        overtime = np.bincount(row * days + att_day, weights=att_overtime, minlength=len(employees) * days)
+        totals = {
+            "present": is_present[cells].sum(axis=1),
+            "late": late.sum(axis=1),
+            "leave": is_leave[cells].sum(axis=1),
+            "absent": is_absent[cells].sum(axis=1),
+            "overtime_minutes": overtime.reshape(len(employees), days).sum(axis=1),
+        }
+        return {
+            "employees": employees,
+            "days": days,
+            "codes": np.array([""] + codes, dtype=object),
+            "cells": cells,
+            "late": late,
+            "totals": totals,
+        }
+
+    @staticmethod
+    def get_muster(year, month, company=None, employee_ids=None):
+        """Load and build the muster for a month (the roster is included when no employees are given)"""
+        _require_numpy()
+        attendance_rows, leave_rows = MusterRollService.load(year, month, company, employee_ids)
+        roster = employee_ids or get_employee_ids(company)
+        return MusterRollService.build(year, month, attendance_rows, leave_rows, roster)
+
+    @staticmethod
+    def to_rows(muster):
+        """One dict per employee: employee, day columns "1".."31" with the cell code, then totals"""
+        code_matrix = muster["codes"][muster["cells"]].tolist()
+        totals = {name: values.tolist() for name, values in muster["totals"].items()}
+        day_columns = [str(day) for day in range(1, muster["days"] + 1)]
+        for index, employee in enumerate(muster["employees"].tolist()):
+            row = {"employee": employee}
+            row.update(zip(day_columns, code_matrix[index]))
+            row.update((name, totals[name][index]) for name in MusterRollService.TOTALS)
+            yield row
+
+    @staticmethod
+    def fields(muster):
+        return ["employee"] + [str(day) for day in range(1, muster["days"] + 1)] + MusterRollService.TOTALS
+
+    @staticmethod
+    def to_json(year, month, muster):
+        code_matrix = muster["codes"][muster["cells"]].tolist()
+        totals = {name: values.tolist() for name, values in muster["totals"].items()}
+        return {
+            "year": year,
+            "month": month,
+            "days": muster["days"],
+            "employees": [
+                {
+                    "employee": employee,
+                    "codes": code_matrix[index],
+                    "totals": {name: totals[name][index] for name in MusterRollService.TOTALS},
+                }
+                for index, employee in enumerate(muster["employees"].tolist())
+            ],
+        }
+
+
+class PayrollService:
+    """
+    Payroll input for a pay period: per-employee present, paid leave, unpaid leave, absent
+    and loss-of-pay days, late count and OT minutes. Everything comes from one grouped
+    aggregate over DailyAttendanceSummary, read from the replica when there is one (rebuild it first for periods recorded before the
+    rollup existed), and LOP deductions are computed for all employees at once.
+    """
+    COUNTS = ["present_days", "paid_leave_days", "unpaid_leave_days", "absent_days", "late_count"]
+    FIELDS = [
+        "employee", "period_days", "recorded_days", "unmarked_days", "present_days", "paid_leave_days",
+        "unpaid_leave_days", "absent_days", "lop_days", "late_count", "late_minutes", "overtime_minutes",
+        "gross_salary", "per_day_rate", "lop_deduction", "net_salary"
+    ]
+
+    @staticmethod
+    def aggregate(date_from, date_to, company=None, employee_ids=None):
+        """Grouped per-employee counts for the period, one query"""
+        summaries = DailyAttendanceSummary.objects.using(read_alias()).filter(date__range=(date_from, date_to))
+        if company is not None:
+            summaries = summaries.filter(company=company)
+        if employee_ids:
+            summaries = summaries.filter(employee__in=employee_ids)
+
+        paid_leave = Q(is_leave=True, attendance_type__is_paid_leave=True)
+        return list(summaries.order_by().values("employee").annotate(
+            recorded_days=Count("id"),
+            present_days=Count("id", filter=Q(is_present=True)),
+            paid_leave_days=Count("id", filter=paid_leave),
+            unpaid_leave_days=Count("id", filter=Q(is_leave=True) & ~paid_leave),
+            absent_days=Count("id", filter=Q(is_absent=True)),
+            late_count=Count("id", filter=Q(is_late=True)),
+            late_minutes=Sum("late_by_minutes"),
+            overtime_minutes=Sum("overtime_minutes"),
+        ))
+
+    @staticmethod
+    def build(date_from, date_to, rows, employee_ids=(), salaries=None):
+        """
+        Vectorized feed from aggregated rows. LOP days are absent plus unpaid leave days,
+        the deduction is gross / period days * LOP days (only for employees with a salary).
+        Returns: list of dicts in FIELDS order
+        """
+        _require_numpy()
+        salaries = salaries or {}
+        period_days = (date_to - date_from).days + 1
+        by_employee = {row["employee"]: row for row in rows}
+        employees = sorted(set(employee_ids) | set(by_employee) | set(salaries))
+        values = [by_employee.get(employee, {}) for employee in employees]
+
+        def column(name, dtype=np.int64):
+            return _column([row.get(name) for row in values], dtype)
+
+        recorded = column("recorded_days")
+        counts = {name: column(name) for name in PayrollService.COUNTS}
+        late_minutes = column("late_minutes")
+        overtime = column("overtime_minutes", np.float64)
+        lop_days = counts["absent_days"] + counts["unpaid_leave_days"]
+
+        has_salary = np.array([employee in salaries for employee in employees], dtype=np.bool_)
+        gross = _column([salaries.get(employee) for employee in employees], np.float64)
+        per_day = np.round(gross / period_days, 2)
+        deduction = np.round(np.minimum(gross / period_days * lop_days, gross), 2)
+        net = np.round(gross - deduction, 2)
+
+        columns = {
+            "employee": employees,
+            "period_days": [period_days] * len(employees),
+            "recorded_days": recorded.tolist(),
+            "unmarked_days": np.maximum(period_days - recorded, 0).tolist(),
+            "lop_days": lop_days.tolist(),
+            "late_minutes": late_minutes.tolist(),
+            "overtime_minutes": np.round(overtime, 2).tolist(),
+        }
+        columns.update((name, values.tolist()) for name, values in counts.items())
+        for name, amounts in (("gross_salary", gross), ("per_day_rate", per_day), ("lop_deduction", deduction), ("net_salary", net)):
+            columns[name] = [amount if paid else None for amount, paid in zip(amounts.tolist(), has_salary.tolist())]
+        return [dict(zip(PayrollService.FIELDS, row)) for row in zip(*(columns[name] for name in PayrollService.FIELDS))]
+
+    @staticmethod
+    def get_feed(date_from, date_to, company=None, employee_ids=None, salaries=None):
+        """Payroll feed for a period (the roster is included when no employees are given)"""
+        _require_numpy()
+        rows = PayrollService.aggregate(date_from, date_to, company, employee_ids)
+        roster = employee_ids or get_employee_ids(company)
+        if employee_ids and salaries:
+            salaries = {employee: gross for employee, gross in salaries.items() if employee in employee_ids}
+        return PayrollService.build(date_from, date_to, rows, roster, salaries)
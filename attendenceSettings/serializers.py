@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import *
 
@@ -19,7 +20,7 @@ class LeaveRequestSerializer(serializers.ModelSerializer):
 
 
 class LeaveBalanceSerializer(serializers.ModelSerializer):
-    leave_type_name = serializers.CharField(source='leave_type.title', read_only=True)
+    attendance_type_name = serializers.CharField(source='attendance_type.title', read_only=True)
     
     class Meta:
         model = LeaveBalance
@@ -34,6 +35,26 @@ class LeaveSettingSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
+class LeaveSettingRolloutSerializer(serializers.Serializer):
+    """
+    Company-wide leave settings for a financial year, either as a matrix (attendance_types plus
+    rows of [employee, days, days, ...]) or as an uploaded CSV file with the same layout
+    """
+    company = serializers.IntegerField()
+    financial_year_start = serializers.DateField()
+    financial_year_end = serializers.DateField()
+    attendance_types = serializers.ListField(child=serializers.CharField(), required=False)
+    rows = serializers.ListField(child=serializers.ListField(), required=False)
+    file = serializers.FileField(required=False)
+
+    def validate(self, data):
+        if data['financial_year_start'] > data['financial_year_end']:
+            raise serializers.ValidationError("financial_year_end cannot be before financial_year_start")
+        if not data.get('file') and not (data.get('attendance_types') and data.get('rows')):
+            raise serializers.ValidationError("Send attendance_types and rows, or a CSV file")
+        return data
+
+
 
 
 
@@ -55,6 +76,7 @@ class AttendanceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Attendance
         fields = '__all__'
+        read_only_fields = ['attendance_date']
 
 
 class AttendancePunchSerializer(serializers.Serializer):
@@ -66,6 +88,7 @@ class AttendancePunchSerializer(serializers.Serializer):
     source_id = serializers.IntegerField(required=False, help_text="Source ID (optional)")
     remarks = serializers.CharField(required=False, help_text="Additional remarks")
     custom_timestamp = serializers.DateTimeField(required=False, help_text="Custom timestamp for testing (optional)")
+    idempotency_key = serializers.CharField(required=False, max_length=100, help_text="Client generated key to make retries safe (optional, also accepted as Idempotency-Key header)")
     
     def validate_employee(self, value):
         if value <= 0:
@@ -78,6 +101,96 @@ class AttendancePunchSerializer(serializers.Serializer):
             raise serializers.ValidationError(f"Invalid action ID. Must be one of: {valid_action_ids} (1=Check In, 2=Check Out)")
         return value
 
+class AttendanceBulkPunchSerializer(serializers.Serializer):
+    """
+    Serializer for bulk punch uploads - each row is validated separately with AttendancePunchSerializer
+    """
+    punches = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        help_text="List of punches with the same fields as a single attendance punch"
+    )
+
+    def validate_punches(self, value):
+        max_rows = getattr(settings, 'ATTENDANCE_BULK_PUNCH_MAX_ROWS', 5000)
+        if len(value) > max_rows:
+            raise serializers.ValidationError(f"A batch can contain at most {max_rows} punches")
+        return value
+
+class AttendanceListQuerySerializer(serializers.Serializer):
+    """
+    Query parameters for the paginated attendance list
+    """
+    employee = serializers.IntegerField(required=False)
+    company = serializers.IntegerField(required=False)
+    date_from = serializers.DateField(required=False, help_text="Business date (attendance_date) from, inclusive")
+    date_to = serializers.DateField(required=False, help_text="Business date (attendance_date) to, inclusive")
+    attendance_type = serializers.IntegerField(required=False)
+    shift = serializers.IntegerField(required=False)
+    cursor = serializers.CharField(required=False, help_text="next_cursor of the previous page")
+    page_size = serializers.IntegerField(required=False, min_value=1)
+
+    def validate_page_size(self, value):
+        return min(value, getattr(settings, 'ATTENDANCE_LIST_MAX_PAGE_SIZE', 500))
+
+    def validate(self, data):
+        if data.get('date_from') and data.get('date_to') and data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_to cannot be before date_from")
+        return data
+
+class AttendanceExportQuerySerializer(serializers.Serializer):
+    """
+    Query parameters for the streaming attendance export (?employee= can be repeated)
+    """
+    OUTPUT_CHOICES = ['ndjson', 'csv']
+
+    company = serializers.IntegerField(required=False)
+    employee = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=True)
+    date_from = serializers.DateField(required=False, help_text="Business date (attendance_date) from, inclusive")
+    date_to = serializers.DateField(required=False, help_text="Business date (attendance_date) to, inclusive")
+    # "format" is taken by DRF's format suffix handling
+    output = serializers.ChoiceField(choices=OUTPUT_CHOICES, default='ndjson')
+
+    def validate(self, data):
+        if data.get('date_from') and data.get('date_to') and data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_to cannot be before date_from")
+        return data
+
+class MusterRollQuerySerializer(serializers.Serializer):
+    """
+    Query parameters for the monthly muster roll (?employee= can be repeated)
+    """
+    year = serializers.IntegerField(min_value=2000, max_value=2100)
+    month = serializers.IntegerField(min_value=1, max_value=12)
+    company = serializers.IntegerField(required=False)
+    employee = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=True)
+    output = serializers.ChoiceField(choices=['json', 'csv'], default='json')
+
+class PayrollFeedSerializer(serializers.Serializer):
+    """
+    Payroll feed request - salaries maps employee id to gross salary for the period and is
+    optional, deductions are only computed for employees listed there
+    """
+    company = serializers.IntegerField()
+    date_from = serializers.DateField(help_text="Pay period start, inclusive")
+    date_to = serializers.DateField(help_text="Pay period end, inclusive")
+    employee = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=True)
+    salaries = serializers.DictField(child=serializers.FloatField(min_value=0), required=False)
+    output = serializers.ChoiceField(choices=['json', 'csv'], default='json')
+
+    def validate_salaries(self, value):
+        try:
+            return {int(employee): gross for employee, gross in value.items()}
+        except (TypeError, ValueError):
+            raise serializers.ValidationError("Salary keys must be employee ids")
+
+    def validate(self, data):
+        if data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_to cannot be before date_from")
+        if (data['date_to'] - data['date_from']).days > 62:
+            raise serializers.ValidationError("Pay period cannot be longer than 62 days")
+        return data
+
 class LeaveBalanceSummarySerializer(serializers.Serializer):
     """
     Serializer for leave balance summary
@@ -112,6 +225,54 @@ class StatusSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class LeaveBulkActionSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+    action = serializers.ChoiceField(choices=['approve', 'reject'])
+    approved_by = serializers.IntegerField(required=False, allow_null=True)
+    remarks = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class LeaveLedgerEntrySerializer(serializers.ModelSerializer):
+    attendance_type_name = serializers.CharField(source='attendance_type.title', read_only=True)
+
+    class Meta:
+        model = LeaveLedgerEntry
+        fields = '__all__'
+
+
+class HolidaySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Holiday
+        fields = '__all__'
+        read_only_fields = ['created_at', 'updated_at']
+
+
+class WeeklyOffSerializer(serializers.ModelSerializer):
+    weekday_name = serializers.CharField(source='get_weekday_display', read_only=True)
+
+    class Meta:
+        model = WeeklyOff
+        fields = '__all__'
+        read_only_fields = ['created_at', 'updated_at']
+
+    def validate_week_of_month(self, value):
+        if value is not None and not 1 <= value <= 5:
+            raise serializers.ValidationError("Week of month must be between 1 and 5")
+        return value
+
+
+class WorkingDaysQuerySerializer(serializers.Serializer):
+    company = serializers.IntegerField(required=False)
+    shift = serializers.IntegerField(required=False)
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+
+    def validate(self, data):
+        if data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_to cannot be before date_from")
+        return data
+
+
 class LeaveAllocationSerializer(serializers.ModelSerializer):
     attendance_type_name = serializers.CharField(source='attendance_type.title', read_only=True)
     
@@ -1,7 +1,19 @@
-from datetime import datetime, timedelta
+import csv
+import heapq
+from datetime import date, datetime, time, timedelta
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
-from .models import Action, AttendanceType, Source, Attendance
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from asgiref.sync import sync_to_async
+from .models import (
+    Action, AttendanceType, Source, Attendance, Status, LeaveRequest, LeaveBalance,
+    PunchIdempotencyKey, PunchQueueItem, DailyAttendanceSummary, LeaveLedgerEntry, LeaveSetting,
+    AttendanceArchive, ArchivedPeriod
+)
+from .cache import reference_data, attendance_status, working_days, archive_boundary
+from .db_router import read_alias
 
 
 # Business Logic Services
@@ -9,234 +21,298 @@ class AttendanceService:
     """Service class for attendance business logic - Check In and Check Out only"""
     
     @staticmethod
-    @transaction.atomic
+    def _punch_time(custom_timestamp=None):
+        """Return (now_time, today) for a punch, honouring a custom timestamp if provided"""
+        if custom_timestamp:
+            return custom_timestamp, custom_timestamp.date()
+        return timezone.localtime(), timezone.localdate()
+    
+    @staticmethod
+    def _build_check_in(employee_id, action, source, remarks, now_time, present_type, late_type, shift_pair=None):
+        """
+        Build an unsaved check-in record with shift, late and attendance type resolved.
+        shift_pair can be passed in when the (shift, sub_shift) was already looked up.
+        Returns: (attendance, minutes_early, error)
+        """
+        from .utils import get_shift_by_time, validate_check_in_time, calculate_late_minutes, get_business_date
+        
+        # Get employee's shift and sub-shift
+        shift, sub_shift = shift_pair or get_shift_by_time(employee_id, now_time)
+        
+        # Validate check-in time against shift
+        minutes_early = 0
+        if shift and sub_shift:
+            is_valid_check_in, check_in_message, minutes_early = validate_check_in_time(
+                sub_shift, now_time, allow_early_check_in=True, early_buffer_minutes=30
+            )
+            
+            if not is_valid_check_in:
+                return None, 0, {"error": check_in_message, "status": "400"}
+        
+        # Calculate late minutes if shift exists
+        late_minutes = 0
+        is_late = False
+        if shift and sub_shift:
+            late_minutes = calculate_late_minutes(
+                type('obj', (object,), {'sub_shift': sub_shift})(), 
+                now_time,
+                grace_period_minutes=15
+            )
+            is_late = late_minutes > 0
+        
+        # Determine attendance type based on late status
+        attendance_type = late_type if is_late else present_type
+        
+        attendance = Attendance(
+            employee=employee_id,
+            attendance_type=attendance_type,
+            action=action,
+            date_check_in=now_time,
+            attendance_date=get_business_date(now_time, sub_shift),
+            source=source,
+            remarks=remarks,
+            shift=shift,
+            sub_shift=sub_shift,
+            is_late=is_late,
+            late_by_minutes=late_minutes if is_late else None,
+            deleted=False
+        )
+        return attendance, minutes_early, None
+    
+    @staticmethod
+    def _apply_check_out(attendance, now_time):
+        """
+        Validate a check-out against the record's shift and apply it in memory.
+        Returns: (error, early_exit_minutes, overtime_minutes)
+        """
+        early_exit_minutes = 0
+        overtime_minutes = 0
+        
+        if attendance.sub_shift:
+            from .utils import validate_check_out_time
+            is_valid_check_out, check_out_message, early_exit_minutes, overtime_minutes = validate_check_out_time(
+                attendance.sub_shift, now_time, attendance.date_check_in
+            )
+            
+            if not is_valid_check_out:
+                return {"error": check_out_message, "status": "400"}, 0, 0
+        
+        attendance.date_check_out = now_time
+        
+        # Calculate working hours
+        if attendance.date_check_in:
+            time_diff = now_time - attendance.date_check_in
+            working_hours = time_diff.total_seconds() / 3600  # Convert to hours
+            attendance.working_hour = round(working_hours, 2)
+        
+        # Set overtime minutes
+        attendance.overtime_minutes = overtime_minutes
+        return None, early_exit_minutes, overtime_minutes
+    
+    @staticmethod
+    def _shift_response(attendance, response_data):
+        """Add shift and sub-shift information to a response"""
+        if attendance.shift:
+            response_data["shift"] = {
+                "id": attendance.shift.id,
+                "name": attendance.shift.shift_head,
+                "description": attendance.shift.description
+            }
+        if attendance.sub_shift:
+            response_data["sub_shift"] = {
+                "id": attendance.sub_shift.id,
+                "title": attendance.sub_shift.title,
+                "time_start": attendance.sub_shift.time_start.strftime("%H:%M") if attendance.sub_shift.time_start else None,
+                "time_end": attendance.sub_shift.time_end.strftime("%H:%M") if attendance.sub_shift.time_end else None
+            }
+        return response_data
+    
+    @staticmethod
+    def _check_in_response(attendance, minutes_early=0):
+        """Build the response for a successful check-in"""
+        response_data = {
+            "message": "Check-in successful",
+            "employee": attendance.employee,
+            "check_in_time": attendance.date_check_in,
+            "attendance_id": attendance.id,
+            "status": "checked_in",
+            "attendance_type": {
+                "id": attendance.attendance_type.id,
+                "code": attendance.attendance_type.code,
+                "title": attendance.attendance_type.title
+            }
+        }
+        
+        # Add remarks if provided
+        if attendance.remarks:
+            response_data["remarks"] = attendance.remarks
+        
+        # Add shift information to response
+        AttendanceService._shift_response(attendance, response_data)
+        if attendance.is_late:
+            response_data["late_minutes"] = attendance.late_by_minutes
+            response_data["is_late"] = True
+        elif minutes_early > 0:
+            response_data["minutes_early"] = minutes_early
+            response_data["is_early_check_in"] = True
+        
+        return response_data
+    
+    @staticmethod
+    def _check_out_response(attendance, early_exit_minutes=0, overtime_minutes=0):
+        """Build the response for a successful check-out"""
+        response_data = {
+            "message": "Check-out successful",
+            "employee": attendance.employee,
+            "check_in_time": attendance.date_check_in,
+            "check_out_time": attendance.date_check_out,
+            "working_hours": attendance.working_hour,
+            "attendance_id": attendance.id,
+            "status": "checked_out",
+            "attendance_type": {
+                "id": attendance.attendance_type.id,
+                "code": attendance.attendance_type.code,
+                "title": attendance.attendance_type.title
+            }
+        }
+        
+        # Add remarks if available
+        if attendance.remarks:
+            response_data["remarks"] = attendance.remarks
+        
+        # Add shift information to response
+        AttendanceService._shift_response(attendance, response_data)
+        if attendance.is_late:
+            response_data["late_minutes"] = attendance.late_by_minutes
+            response_data["is_late"] = True
+        if early_exit_minutes > 0:
+            response_data["early_exit_minutes"] = early_exit_minutes
+            response_data["early_exit_hours"] = round(early_exit_minutes / 60, 2)
+            response_data["is_early_exit"] = True
+        if overtime_minutes > 0:
+            response_data["overtime_minutes"] = overtime_minutes
+            response_data["overtime_hours"] = round(overtime_minutes / 60, 2)
+            response_data["is_overtime"] = True
+        
+        return response_data
+    
+    @staticmethod
+    def _insert_check_in(attendance):
+        """
+        Insert a check-in record, relying on the unique (employee, attendance_date) constraint
+        instead of locks. Returns: (attendance, created) - the existing record if one won the race
+        """
+        try:
+            with transaction.atomic():
+                attendance.save()
+            return attendance, True
+        except IntegrityError:
+            existing_attendance = Attendance.objects.alive().filter(
+                employee=attendance.employee,
+                attendance_date=attendance.attendance_date
+            ).first()
+            if existing_attendance is None:
+                raise
+            return existing_attendance, False
+    
+    @staticmethod
+    def _save_check_out(attendance):
+        """
+        Write a check-out only if the record is still open (compare-and-set, no row lock).
+        Returns: True if this call checked the record out
+        """
+        attendance.updated_at = timezone.now()
+        updated = Attendance.objects.alive().filter(
+            pk=attendance.pk,
+            date_check_out__isnull=True
+        ).update(
+            date_check_out=attendance.date_check_out,
+            working_hour=attendance.working_hour,
+            overtime_minutes=attendance.overtime_minutes,
+            updated_at=attendance.updated_at
+        )
+        return updated == 1
+    
+    @staticmethod
     def process_attendance_punch(employee_id, action_type_id, source_id=None, remarks="", custom_timestamp=None):
         """Simplified attendance punch service for check-in and check-out only with shift integration"""
         try:
             # Use custom timestamp if provided, otherwise use current time
-            if custom_timestamp:
-                now_time = custom_timestamp
-                today = now_time.date()
-            else:
-                today = timezone.localdate()
-                now_time = timezone.localtime()
+            now_time, today = AttendanceService._punch_time(custom_timestamp)
             
-            # Get attendance types
-            try:
-                present_type = AttendanceType.objects.get(code="P", deleted=False)
-                late_type = AttendanceType.objects.get(code="L", deleted=False)
-            except AttendanceType.DoesNotExist:
+            # Get attendance types (served from the reference data cache)
+            present_type = reference_data.get_by_code('attendance_type', "P")
+            late_type = reference_data.get_by_code('attendance_type', "L")
+            if not present_type or not late_type:
                 return {"error": "Required attendance types (P or L) not found", "status": "400"}
             
             # Get Action object by ID
-            try:
-                action = Action.objects.get(id=action_type_id, deleted=False)
-            except Action.DoesNotExist:
+            action = reference_data.get_by_id('action', action_type_id)
+            if not action:
                 return {"error": f"Action with ID {action_type_id} not found", "status": "400"}
             
             # Get source if provided
             source = None
             if source_id:
-                try:
-                    source = Source.objects.get(id=source_id, deleted=False)
-                except Source.DoesNotExist:
+                source = reference_data.get_by_id('source', source_id)
+                if not source:
                     return {"error": f"Source with ID {source_id} not found", "status": "400"}
             
             # Process check-in
             if action.code == "check_in":
-                # Check if employee is already checked in today
-                existing_attendance = Attendance.objects.filter(
-                    employee=employee_id,
-                    date_check_in__date=today,
-                    deleted=False
-                ).first()
-                
-                if existing_attendance:
-                    return {"error": "Employee is already checked in today", "status": "400"}
-                
-                # Get employee's shift and sub-shift
-                from .utils import get_shift_by_time, validate_check_in_time
-                shift, sub_shift = get_shift_by_time(employee_id, now_time)
-                
-                # Validate check-in time against shift
-                is_valid_check_in = True
-                check_in_message = ""
-                minutes_early = 0
-                
-                if shift and sub_shift:
-                    is_valid_check_in, check_in_message, minutes_early = validate_check_in_time(
-                        sub_shift, now_time, allow_early_check_in=True, early_buffer_minutes=30
-                    )
-                    
-                    if not is_valid_check_in:
-                        return {"error": check_in_message, "status": "400"}
-                
-                # Calculate late minutes if shift exists
-                late_minutes = 0
-                is_late = False
-                if shift and sub_shift:
-                    from .utils import calculate_late_minutes
-                    late_minutes = calculate_late_minutes(
-                        type('obj', (object,), {'sub_shift': sub_shift})(), 
-                        now_time,
-                        grace_period_minutes=15
-                    )
-                    is_late = late_minutes > 0
-                    
-                    
+                attendance, minutes_early, error = AttendanceService._build_check_in(
+                    employee_id, action, source, remarks, now_time, present_type, late_type
+                )
                 
-                # Determine attendance type based on late status
-                attendance_type = late_type if is_late else present_type
+                if error:
+                    # A duplicate check-in is still reported as such
+                    if Attendance.objects.alive().filter(employee=employee_id, attendance_date=today).exists():
+                        return {"error": "Employee is already checked in today", "status": "400"}
+                    return error
                 
-                # Create check-in record
+                # Create check-in record, or find the one that already exists for this business date
                 try:
-                    attendance = Attendance.objects.create(
-                        employee=employee_id,
-                        attendance_type=attendance_type,
-                        action=action,
-                        date_check_in=now_time,
-                        source=source,
-                        remarks=remarks,
-                        shift=shift,
-                        sub_shift=sub_shift,
-                        is_late=is_late,
-                        late_by_minutes=late_minutes if is_late else None,
-                        deleted=False
-                    )
+                    attendance, created = AttendanceService._insert_check_in(attendance)
                 except Exception as create_error:
                     return {"error": f"Error creating attendance record: {str(create_error)}", "status": "400"}
                 
-                response_data = {
-                    "message": "Check-in successful",
-                    "employee": employee_id,
-                    "check_in_time": now_time,
-                    "attendance_id": attendance.id,
-                    "status": "checked_in",
-                    "attendance_type": {
-                        "id": attendance_type.id,
-                        "code": attendance_type.code,
-                        "title": attendance_type.title
-                    }
-                }
-                
-                # Add remarks if provided
-                if remarks:
-                    response_data["remarks"] = remarks
-                
-                # Add shift information to response
-                if shift:
-                    response_data["shift"] = {
-                        "id": shift.id,
-                        "name": shift.shift_head,
-                        "description": shift.description
-                    }
-                if sub_shift:
-                    response_data["sub_shift"] = {
-                        "id": sub_shift.id,
-                        "title": sub_shift.title,
-                        "time_start": sub_shift.time_start.strftime("%H:%M") if sub_shift.time_start else None,
-                        "time_end": sub_shift.time_end.strftime("%H:%M") if sub_shift.time_end else None
-                    }
-                if is_late:
-                    response_data["late_minutes"] = late_minutes
-                    response_data["is_late"] = True
-                elif minutes_early > 0:
-                    response_data["minutes_early"] = minutes_early
-                    response_data["is_early_check_in"] = True
+                if not created:
+                    return {"error": "Employee is already checked in today", "status": "400", "attendance_id": attendance.id}
                 
-                return response_data
+                AttendanceService._cache_status(attendance)
+                return AttendanceService._check_in_response(attendance, minutes_early)
             
             # Process check-out
             elif action.code == "check_out":
-                # Find today's check-in record
-                attendance = Attendance.objects.filter(
+                # Find today's check-in record (or a night shift that started yesterday)
+                from .utils import is_open_for_check_out
+                attendance = Attendance.objects.alive().filter(
                     employee=employee_id,
-                    date_check_in__date=today,
-                    date_check_out__isnull=True,
-                    deleted=False
-                ).first()
+                    attendance_date__range=(today - timedelta(days=1), today),
+                    date_check_out__isnull=True
+                ).select_related('attendance_type', 'shift', 'sub_shift').order_by('-attendance_date', '-date_check_in').first()
                 
-                if not attendance:
+                if not attendance or not is_open_for_check_out(attendance, now_time, today):
                     return {"error": "No check-in record found for today", "status": "400"}
                 
                 # Validate check-out time against shift
-                is_valid_check_out = True
-                check_out_message = ""
-                early_exit_minutes = 0
-                overtime_minutes = 0
-                
-                if attendance.sub_shift:
-                    from .utils import validate_check_out_time
-                    is_valid_check_out, check_out_message, early_exit_minutes, overtime_minutes = validate_check_out_time(
-                        attendance.sub_shift, now_time, attendance.date_check_in
-                    )
-                    
-                    if not is_valid_check_out:
-                        return {"error": check_out_message, "status": "400"}
+                error, early_exit_minutes, overtime_minutes = AttendanceService._apply_check_out(attendance, now_time)
+                if error:
+                    return error
                 
                 # Update check-out time
                 try:
-                    attendance.date_check_out = now_time
-                    
-                    # Calculate working hours
-                    if attendance.date_check_in:
-                        time_diff = now_time - attendance.date_check_in
-                        working_hours = time_diff.total_seconds() / 3600  # Convert to hours
-                        attendance.working_hour = round(working_hours, 2)
-                    
-                    # Set overtime minutes
-                    attendance.overtime_minutes = overtime_minutes
-                    
-                    attendance.save()
+                    checked_out = AttendanceService._save_check_out(attendance)
                 except Exception as save_error:
                     return {"error": f"Error updating attendance record: {str(save_error)}", "status": "400"}
                 
-                response_data = {
-                    "message": "Check-out successful",
-                    "employee": employee_id,
-                    "check_in_time": attendance.date_check_in,
-                    "check_out_time": now_time,
-                    "working_hours": attendance.working_hour,
-                    "attendance_id": attendance.id,
-                    "status": "checked_out",
-                    "attendance_type": {
-                        "id": attendance.attendance_type.id,
-                        "code": attendance.attendance_type.code,
-                        "title": attendance.attendance_type.title
-                    }
-                }
-                
-                # Add remarks if available
-                if attendance.remarks:
-                    response_data["remarks"] = attendance.remarks
-                
-                # Add shift information to response
-                if attendance.shift:
-                    response_data["shift"] = {
-                        "id": attendance.shift.id,
-                        "name": attendance.shift.shift_head,
-                        "description": attendance.shift.description
-                    }
-                if attendance.sub_shift:
-                    response_data["sub_shift"] = {
-                        "id": attendance.sub_shift.id,
-                        "title": attendance.sub_shift.title,
-                        "time_start": attendance.sub_shift.time_start.strftime("%H:%M") if attendance.sub_shift.time_start else None,
-                        "time_end": attendance.sub_shift.time_end.strftime("%H:%M") if attendance.sub_shift.time_end else None
-                    }
-                if attendance.is_late:
-                    response_data["late_minutes"] = attendance.late_by_minutes
-                    response_data["is_late"] = True
-                if early_exit_minutes > 0:
-                    response_data["early_exit_minutes"] = early_exit_minutes
-                    response_data["early_exit_hours"] = round(early_exit_minutes / 60, 2)
-                    response_data["is_early_exit"] = True
-                if overtime_minutes > 0:
-                    response_data["overtime_minutes"] = overtime_minutes
-                    response_data["overtime_hours"] = round(overtime_minutes / 60, 2)
-                    response_data["is_overtime"] = True
+                if not checked_out:
+                    # A concurrent request checked the record out first
+                    return {"error": "No check-in record found for today", "status": "400"}
                 
-                return response_data
+                DailySummaryService.refresh_records([attendance])
+                AttendanceService._cache_status(attendance)
+                return AttendanceService._check_out_response(attendance, early_exit_minutes, overtime_minutes)
             
             else:
                 return {"error": "Invalid action type. Only check_in and check_out actions are supported", "status": "400"}
@@ -247,100 +323,1159 @@ class AttendanceService:
             return {"error": f"Error processing attendance punch: {str(e)}", "details": error_details, "status": "500"}
     
     @staticmethod
-    def get_employee_attendance_status(employee_id):
-        """Get employee's current attendance status for today"""
+    async def aprocess_attendance_punch(employee_id, action_type_id, source_id=None, remarks="", custom_timestamp=None):
+        """
+        Async variant of process_attendance_punch for the ASGI views, same rules and responses.
+        Needs no transaction - check-in relies on the unique constraint, check-out is a conditional update.
+        """
+        from .utils import aget_shift_by_time, is_open_for_check_out
         try:
-            today = timezone.localdate()
+            now_time, today = AttendanceService._punch_time(custom_timestamp)
             
-            # Get today's attendance record
-            attendance = Attendance.objects.filter(
-                employee=employee_id,
-                date_check_in__date=today,
-                deleted=False
-            ).first()
+            present_type = await reference_data.aget_by_code('attendance_type', "P")
+            late_type = await reference_data.aget_by_code('attendance_type', "L")
+            if not present_type or not late_type:
+                return {"error": "Required attendance types (P or L) not found", "status": "400"}
             
-            if not attendance:
-                return {
-                    "employee": employee_id,
-                    "status": "not_checked_in",
-                    "message": "Employee not checked in today"
-                }
+            action = await reference_data.aget_by_id('action', action_type_id)
+            if not action:
+                return {"error": f"Action with ID {action_type_id} not found", "status": "400"}
             
-            # Base response data
-            response_data = {
-                "employee": employee_id,
-                "check_in_time": attendance.date_check_in,
-                "attendance_type": {
-                    "id": attendance.attendance_type.id,
-                    "code": attendance.attendance_type.code,
-                    "title": attendance.attendance_type.title
-                }
-            }
+            source = None
+            if source_id:
+                source = await reference_data.aget_by_id('source', source_id)
+                if not source:
+                    return {"error": f"Source with ID {source_id} not found", "status": "400"}
             
-            # Add remarks if available
-            if attendance.remarks:
-                response_data["remarks"] = attendance.remarks
+            if action.code == "check_in":
+                shift_pair = await aget_shift_by_time(employee_id, now_time)
+                attendance, minutes_early, error = AttendanceService._build_check_in(
+                    employee_id, action, source, remarks, now_time, present_type, late_type, shift_pair=shift_pair
+                )
+                
+                if error:
+                    if await Attendance.objects.alive().filter(employee=employee_id, attendance_date=today).aexists():
+                        return {"error": "Employee is already checked in today", "status": "400"}
+                    return error
+                
+                # Model.asave() is a sync_to_async wrapper too, this keeps the savepoint around the insert
+                try:
+                    attendance, created = await sync_to_async(AttendanceService._insert_check_in)(attendance)
+                except Exception as create_error:
+                    return {"error": f"Error creating attendance record: {str(create_error)}", "status": "400"}
+                
+                if not created:
+                    return {"error": "Employee is already checked in today", "status": "400", "attendance_id": attendance.id}
+                
+                await attendance_status.aset(employee_id, attendance.attendance_date, AttendanceService._status_response(employee_id, attendance))
+                return AttendanceService._check_in_response(attendance, minutes_early)
             
-            # Add shift information if available
-            if attendance.shift:
-                response_data["shift"] = {
-                    "id": attendance.shift.id,
-                    "name": attendance.shift.shift_head,
-                    "description": attendance.shift.description
-                }
-            if attendance.sub_shift:
-                response_data["sub_shift"] = {
-                    "id": attendance.sub_shift.id,
-                    "title": attendance.sub_shift.title,
-                    "time_start": attendance.sub_shift.time_start.strftime("%H:%M") if attendance.sub_shift.time_start else None,
-                    "time_end": attendance.sub_shift.time_end.strftime("%H:%M") if attendance.sub_shift.time_end else None
-                }
-            if attendance.is_late:
-                response_data["late_minutes"] = attendance.late_by_minutes
-                response_data["is_late"] = True
-            
-            # Check if checked out
-            if attendance.date_check_out:
-                response_data.update({
-                    "status": "checked_out",
-                    "check_out_time": attendance.date_check_out,
-                    "working_hours": attendance.working_hour,
-                    "message": "Employee checked out for the day"
-                })
+            elif action.code == "check_out":
+                attendance = await Attendance.objects.alive().filter(
+                    employee=employee_id,
+                    attendance_date__range=(today - timedelta(days=1), today),
+                    date_check_out__isnull=True
+                ).select_related('attendance_type', 'shift', 'sub_shift').order_by('-attendance_date', '-date_check_in').afirst()
                 
-                # Add overtime information
-                if attendance.overtime_minutes and attendance.overtime_minutes > 0:
-                    response_data["overtime_minutes"] = attendance.overtime_minutes
-                    response_data["overtime_hours"] = round(attendance.overtime_minutes / 60, 2)
-                    response_data["is_overtime"] = True
+                if not attendance or not is_open_for_check_out(attendance, now_time, today):
+                    return {"error": "No check-in record found for today", "status": "400"}
+                
+                error, early_exit_minutes, overtime_minutes = AttendanceService._apply_check_out(attendance, now_time)
+                if error:
+                    return error
                 
-                # Calculate early exit if applicable
-                if attendance.sub_shift and attendance.sub_shift.time_end:
-                    from .utils import validate_check_out_time
-                    _, _, early_exit_minutes, _ = validate_check_out_time(
-                        attendance.sub_shift, attendance.date_check_out, attendance.date_check_in
+                try:
+                    attendance.updated_at = timezone.now()
+                    updated = await Attendance.objects.alive().filter(
+                        pk=attendance.pk,
+                        date_check_out__isnull=True
+                    ).aupdate(
+                        date_check_out=attendance.date_check_out,
+                        working_hour=attendance.working_hour,
+                        overtime_minutes=attendance.overtime_minutes,
+                        updated_at=attendance.updated_at
                     )
-                    if early_exit_minutes > 0:
-                        response_data["early_exit_minutes"] = early_exit_minutes
-                        response_data["early_exit_hours"] = round(early_exit_minutes / 60, 2)
-                        response_data["is_early_exit"] = True
+                except Exception as save_error:
+                    return {"error": f"Error updating attendance record: {str(save_error)}", "status": "400"}
+                
+                if not updated:
+                    return {"error": "No check-in record found for today", "status": "400"}
+                
+                await sync_to_async(DailySummaryService.refresh_records)([attendance])
+                await attendance_status.aset(employee_id, attendance.attendance_date, AttendanceService._status_response(employee_id, attendance))
+                return AttendanceService._check_out_response(attendance, early_exit_minutes, overtime_minutes)
+            
+            else:
+                return {"error": "Invalid action type. Only check_in and check_out actions are supported", "status": "400"}
+                
+        except Exception as e:
+            return {"error": f"Error processing attendance punch: {str(e)}", "status": "500"}
+    
+    @staticmethod
+    def process_bulk_punches(punches):
+        """
+        Process a batch of punches (e.g. uploaded by a biometric device) in one pass.
+        Punches are ordered per employee by time, check-in/check-out pairing is resolved
+        in memory and all changes are written with bulk_create/bulk_update.
+        Each punch is a dict with the AttendancePunchSerializer fields.
+        Returns: list of per-row results in input order
+        """
+        results = [None] * len(punches)
+        
+        present_type = reference_data.get_by_code('attendance_type', "P")
+        late_type = reference_data.get_by_code('attendance_type', "L")
+        if not present_type or not late_type:
+            return [
+                {"index": index, "error": "Required attendance types (P or L) not found", "status": "400"}
+                for index in range(len(punches))
+            ]
+        
+        # Resolve punch times and order rows per employee, oldest first
+        rows = []
+        for index, punch in enumerate(punches):
+            now_time, today = AttendanceService._punch_time(punch.get("custom_timestamp"))
+            rows.append((punch["employee"], now_time, index, today, punch))
+        rows.sort(key=lambda row: (row[0], row[1], row[2]))
+        
+        if not rows:
+            return results
+        
+        # Load every existing record the batch can touch in one query
+        from .utils import is_open_for_check_out
+        dates = [row[3] for row in rows]
+        records = {}
+        existing = Attendance.objects.alive().filter(
+            employee__in={row[0] for row in rows},
+            attendance_date__range=(min(dates) - timedelta(days=1), max(dates))
+        ).select_related('attendance_type', 'shift', 'sub_shift').order_by('date_check_in', 'id')
+        for attendance in existing:
+            records.setdefault((attendance.employee, attendance.attendance_date), []).append(attendance)
+        
+        to_create = []
+        to_update = {}
+        outcomes = []
+        for employee_id, now_time, index, today, punch in rows:
+            action = reference_data.get_by_id('action', punch["action_type"])
+            if not action:
+                results[index] = {"index": index, "error": f"Action with ID {punch['action_type']} not found", "status": "400"}
+                continue
+            
+            source = None
+            source_id = punch.get("source_id")
+            if source_id:
+                source = reference_data.get_by_id('source', source_id)
+                if not source:
+                    results[index] = {"index": index, "error": f"Source with ID {source_id} not found", "status": "400"}
+                    continue
+            
+            if action.code == "check_in":
+                attendance, minutes_early, error = AttendanceService._build_check_in(
+                    employee_id, action, source, punch.get("remarks", ""), now_time, present_type, late_type
+                )
+                day_records = records.setdefault((employee_id, attendance.attendance_date if attendance else today), [])
+                if day_records:
+                    results[index] = {"index": index, "error": "Employee is already checked in today", "status": "400"}
+                    continue
+                if error:
+                    results[index] = dict(error, index=index)
+                    continue
+                
+                day_records.append(attendance)
+                to_create.append(attendance)
+                outcomes.append((index, "check_in", attendance, (minutes_early,)))
+            
+            elif action.code == "check_out":
+                candidates = records.get((employee_id, today - timedelta(days=1)), []) + records.get((employee_id, today), [])
+                attendance = next((
+                    record for record in reversed(candidates)
+                    if not record.date_check_out and is_open_for_check_out(record, now_time, today)
+                ), None)
+                if not attendance:
+                    results[index] = {"index": index, "error": "No check-in record found for today", "status": "400"}
+                    continue
+                
+                error, early_exit_minutes, overtime_minutes = AttendanceService._apply_check_out(attendance, now_time)
+                if error:
+                    results[index] = dict(error, index=index)
+                    continue
+                
+                if attendance.pk:
+                    to_update[attendance.pk] = attendance
+                outcomes.append((index, "check_out", attendance, (early_exit_minutes, overtime_minutes)))
+            
+            else:
+                results[index] = {
+                    "index": index,
+                    "error": "Invalid action type. Only check_in and check_out actions are supported",
+                    "status": "400"
+                }
+        
+        # Write the whole batch
+        conflicts = set()
+        lost_check_outs = set()
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    Attendance.objects.bulk_create(to_create, batch_size=500)
+            except IntegrityError:
+                # Another writer checked some of these employees in meanwhile - insert one by one
+                for attendance in to_create:
+                    attendance.pk = None
+                    inserted, created = AttendanceService._insert_check_in(attendance)
+                    if not created:
+                        conflicts.add(id(attendance))
+            # Same compare-and-set as a single check-out, a concurrent check-out keeps its record
+            for attendance in to_update.values():
+                if not AttendanceService._save_check_out(attendance):
+                    lost_check_outs.add(id(attendance))
+            DailySummaryService.refresh_records(
+                [attendance for attendance in to_create if id(attendance) not in conflicts]
+                + [attendance for attendance in to_update.values() if id(attendance) not in lost_check_outs]
+            )
+        
+        touched = {}
+        for index, kind, attendance, extra in outcomes:
+            if id(attendance) in conflicts:
+                results[index] = {"index": index, "error": "Employee is already checked in today", "status": "400"}
+                continue
+            if id(attendance) in lost_check_outs:
+                # Checked out by a concurrent request first
+                results[index] = {"index": index, "error": "No check-in record found for today", "status": "400"}
+                continue
+            if kind == "check_in":
+                data = AttendanceService._check_in_response(attendance, *extra)
             else:
-                response_data.update({
-                    "status": "checked_in",
-                    "message": "Employee is currently checked in"
-                })
+                data = AttendanceService._check_out_response(attendance, *extra)
+            results[index] = {"index": index, "data": data, "status": "200"}
+            touched[id(attendance)] = attendance
+        
+        # Only the final state of each record matters for the status cache
+        for attendance in touched.values():
+            AttendanceService._cache_status(attendance)
+        
+        return results
+    
+    @staticmethod
+    def _idempotency_cutoff():
+        ttl_hours = getattr(settings, 'ATTENDANCE_IDEMPOTENCY_TTL_HOURS', 24)
+        return timezone.now() - timedelta(hours=ttl_hours)
+    
+    @staticmethod
+    def get_idempotent_response(employee_id, idempotency_key):
+        """Get the stored response of an earlier punch with the same idempotency key, None if there is none"""
+        stored = PunchIdempotencyKey.objects.filter(employee=employee_id, key=idempotency_key).first()
+        if not stored:
+            return None
+        if stored.created_at < AttendanceService._idempotency_cutoff():
+            # Expired - allow the key to be reused
+            stored.delete()
+            return None
+        return stored.response
+    
+    @staticmethod
+    def save_idempotent_response(employee_id, idempotency_key, response_data):
+        """Store the response of a successful punch under its idempotency key"""
+        return PunchIdempotencyKey.objects.create(
+            employee=employee_id,
+            key=idempotency_key,
+            response=response_data
+        )
+    
+    @staticmethod
+    def process_idempotent_punch(punch_service, employee_id, idempotency_key, **punch):
+        """
+        Run punch_service and store its successful response under the idempotency key in one transaction.
+        The punch itself needs no transaction - check-in relies on a unique constraint and check-out
+        is a conditional update - so the transaction only pairs it with the key write.
+        Returns: (result, replayed) - replayed is True when a concurrent request with the same key won
+        """
+        try:
+            with transaction.atomic():
+                result = punch_service(employee_id=employee_id, **punch)
+                # Only successful punches are stored, failed ones can simply be retried
+                if "error" not in result:
+                    AttendanceService.save_idempotent_response(employee_id, idempotency_key, result)
+                return result, False
+        except IntegrityError:
+            stored_response = AttendanceService.get_idempotent_response(employee_id, idempotency_key)
+            if stored_response is None:
+                raise
+            return stored_response, True
+    
+    @staticmethod
+    def purge_idempotency_keys():
+        """Delete idempotency keys older than ATTENDANCE_IDEMPOTENCY_TTL_HOURS"""
+        deleted, _ = PunchIdempotencyKey.objects.filter(created_at__lt=AttendanceService._idempotency_cutoff()).delete()
+        return deleted
+    
+    @staticmethod
+    def filter_attendance(filters, model=Attendance):
+        """
+        Live attendance records matching the list filters (AttendanceListQuerySerializer data),
+        model=AttendanceArchive filters the archive tier the same way
+        """
+        attendance_records = model.objects.alive().select_related('attendance_type')
+        if filters.get("employee") is not None:
+            attendance_records = attendance_records.filter(employee=filters["employee"])
+        if filters.get("company") is not None:
+            attendance_records = attendance_records.filter(company=filters["company"])
+        if filters.get("date_from"):
+            attendance_records = attendance_records.filter(attendance_date__gte=filters["date_from"])
+        if filters.get("date_to"):
+            attendance_records = attendance_records.filter(attendance_date__lte=filters["date_to"])
+        if filters.get("attendance_type") is not None:
+            attendance_records = attendance_records.filter(attendance_type=filters["attendance_type"])
+        if filters.get("shift") is not None:
+            attendance_records = attendance_records.filter(shift=filters["shift"])
+        return attendance_records
+    
+    EXPORT_FIELDS = {
+        "id": "id",
+        "employee": "employee",
+        "company": "company",
+        "attendance_date": "attendance_date",
+        "date_check_in": "date_check_in",
+        "date_check_out": "date_check_out",
+        "attendance_type_code": "attendance_type__code",
+        "attendance_type_title": "attendance_type__title",
+        "shift": "shift",
+        "sub_shift": "sub_shift",
+        "is_late": "is_late",
+        "late_by_minutes": "late_by_minutes",
+        "working_hour": "working_hour",
+        "overtime_minutes": "overtime_minutes",
+        "remarks": "remarks",
+    }
+    
+    @staticmethod
+    def export_attendance(filters, chunk_size=None):
+        """
+        Stream live attendance rows as dicts (keys are EXPORT_FIELDS) for the export endpoint.
+        Uses a values() projection and iterator() so memory stays flat however many rows match.
+        The alias is picked here because the rows are only read once the response streams.
+        Archived months are merged in (same order) when date_from reaches before the archive boundary.
+        """
+        chunk_size = chunk_size or getattr(settings, 'ATTENDANCE_EXPORT_CHUNK_SIZE', 2000)
+        rows = AttendanceService._export_rows(Attendance, filters).iterator(chunk_size=chunk_size)
+        if not archive_boundary.covers(filters.get("date_from")):
+            return rows
+        archived_rows = AttendanceService._export_rows(AttendanceArchive, filters).iterator(chunk_size=chunk_size)
+        return heapq.merge(archived_rows, rows, key=AttendanceService._export_key)
+    
+    @staticmethod
+    def _export_key(row):
+        """Sort key matching the export order (nulls last)"""
+        return (row["attendance_date"] is None, row["attendance_date"] or date.min, row["employee"] is None, row["employee"] or 0, row["id"])
+    
+    @staticmethod
+    def _export_rows(model, filters):
+        rows = model.objects.using(read_alias()).alive()
+        if filters.get("company") is not None:
+            rows = rows.filter(company=filters["company"])
+        if filters.get("employee"):
+            rows = rows.filter(employee__in=filters["employee"])
+        if filters.get("date_from"):
+            rows = rows.filter(attendance_date__gte=filters["date_from"])
+        if filters.get("date_to"):
+            rows = rows.filter(attendance_date__lte=filters["date_to"])
+        
+        columns = {name: F(path) for name, path in AttendanceService.EXPORT_FIELDS.items() if name != path}
+        rows = rows.values(
+            *[name for name, path in AttendanceService.EXPORT_FIELDS.items() if name == path], **columns
+        ).order_by(F('attendance_date').asc(nulls_last=True), F('employee').asc(nulls_last=True), 'id')
+        return rows
+    
+    @staticmethod
+    def _status_response(employee_id, attendance):
+        """Build the status response for an attendance record (None means not checked in)"""
+        if not attendance:
+            return {
+                "employee": employee_id,
+                "status": "not_checked_in",
+                "message": "Employee not checked in today"
+            }
+        
+        # Base response data
+        response_data = {
+            "employee": employee_id,
+            "check_in_time": attendance.date_check_in,
+            "attendance_type": {
+                "id": attendance.attendance_type.id,
+                "code": attendance.attendance_type.code,
+                "title": attendance.attendance_type.title
+            }
+        }
+        
+        # Add remarks if available
+        if attendance.remarks:
+            response_data["remarks"] = attendance.remarks
+        
+        # Add shift information if available
+        if attendance.shift:
+            response_data["shift"] = {
+                "id": attendance.shift.id,
+                "name": attendance.shift.shift_head,
+                "description": attendance.shift.description
+            }
+        if attendance.sub_shift:
+            response_data["sub_shift"] = {
+                "id": attendance.sub_shift.id,
+                "title": attendance.sub_shift.title,
+                "time_start": attendance.sub_shift.time_start.strftime("%H:%M") if attendance.sub_shift.time_start else None,
+                "time_end": attendance.sub_shift.time_end.strftime("%H:%M") if attendance.sub_shift.time_end else None
+            }
+        if attendance.is_late:
+            response_data["late_minutes"] = attendance.late_by_minutes
+            response_data["is_late"] = True
+        
+        # Check if checked out
+        if attendance.date_check_out:
+            response_data.update({
+                "status": "checked_out",
+                "check_out_time": attendance.date_check_out,
+                "working_hours": attendance.working_hour,
+                "message": "Employee checked out for the day"
+            })
+            
+            # Add overtime information
+            if attendance.overtime_minutes and attendance.overtime_minutes > 0:
+                response_data["overtime_minutes"] = attendance.overtime_minutes
+                response_data["overtime_hours"] = round(attendance.overtime_minutes / 60, 2)
+                response_data["is_overtime"] = True
+            
+            # Calculate early exit if applicable
+            if attendance.sub_shift and attendance.sub_shift.time_end:
+                from .utils import validate_check_out_time
+                _, _, early_exit_minutes, _ = validate_check_out_time(
+                    attendance.sub_shift, attendance.date_check_out, attendance.date_check_in
+                )
+                if early_exit_minutes > 0:
+                    response_data["early_exit_minutes"] = early_exit_minutes
+                    response_data["early_exit_hours"] = round(early_exit_minutes / 60, 2)
+                    response_data["is_early_exit"] = True
+        else:
+            response_data.update({
+                "status": "checked_in",
+                "message": "Employee is currently checked in"
+            })
+        
+        return response_data
+    
+    @staticmethod
+    def _cache_status(attendance):
+        """Write the record's status through to the today status cache once the punch commits"""
+        status = AttendanceService._status_response(attendance.employee, attendance)
+        employee_id, attendance_date = attendance.employee, attendance.attendance_date
+        transaction.on_commit(lambda: attendance_status.set(employee_id, attendance_date, status))
+    
+    @staticmethod
+    def get_employee_attendance_status(employee_id):
+        """Get employee's current attendance status for today, served from the status cache"""
+        try:
+            today = timezone.localdate()
+            
+            response_data = attendance_status.get(employee_id, today)
+            if response_data is not None:
+                return response_data
             
+            # Get today's attendance record
+            attendance = Attendance.objects.alive().filter(
+                employee=employee_id,
+                attendance_date=today
+            ).select_related('attendance_type', 'shift', 'sub_shift').first()
+            
+            response_data = AttendanceService._status_response(employee_id, attendance)
+            # add() so a punch that committed meanwhile keeps its written-through status
+            attendance_status.add(employee_id, today, response_data)
             return response_data
                 
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
             return {"error": f"Error getting employee status: {str(e)}", "details": error_details, "status": "500"}
+    
+    @staticmethod
+    async def aget_employee_attendance_status(employee_id):
+        """Async variant of get_employee_attendance_status for the ASGI views"""
+        try:
+            today = timezone.localdate()
+            
+            response_data = await attendance_status.aget(employee_id, today)
+            if response_data is not None:
+                return response_data
+            
+            attendance = await Attendance.objects.alive().filter(
+                employee=employee_id,
+                attendance_date=today
+            ).select_related('attendance_type', 'shift', 'sub_shift').afirst()
+            
+            response_data = AttendanceService._status_response(employee_id, attendance)
+            await attendance_status.aadd(employee_id, today, response_data)
+            return response_data
+                
+        except Exception as e:
+            return {"error": f"Error getting employee status: {str(e)}", "status": "500"}
+
+
+class PunchQueueService:
+    """Service class for the accept-then-process (queued) punch mode"""
+    
+    @staticmethod
+    def is_enabled():
+        return getattr(settings, 'ATTENDANCE_PUNCH_QUEUE_ENABLED', False)
+    
+    @staticmethod
+    def enqueue(employee_id, action_type_id, source_id=None, remarks="", custom_timestamp=None):
+        """Cheap validation against cached reference data, then append the punch to the queue"""
+        if not reference_data.get_by_id('action', action_type_id):
+            return {"error": f"Action with ID {action_type_id} not found", "status": "400"}
+        if source_id and not reference_data.get_by_id('source', source_id):
+            return {"error": f"Source with ID {source_id} not found", "status": "400"}
+        
+        now_time, _ = AttendanceService._punch_time(custom_timestamp)
+        item = PunchQueueItem.objects.create(
+            employee=employee_id,
+            action_type=action_type_id,
+            source_id=source_id,
+            remarks=remarks,
+            punch_time=now_time
+        )
+        return {
+            "message": "Punch accepted for processing",
+            "employee": employee_id,
+            "ticket": str(item.ticket),
+            "punch_time": now_time,
+            "status": "queued"
+        }
+    
+    @staticmethod
+    async def aenqueue(employee_id, action_type_id, source_id=None, remarks="", custom_timestamp=None):
+        """Async variant of enqueue for the ASGI views"""
+        if not await reference_data.aget_by_id('action', action_type_id):
+            return {"error": f"Action with ID {action_type_id} not found", "status": "400"}
+        if source_id and not await reference_data.aget_by_id('source', source_id):
+            return {"error": f"Source with ID {source_id} not found", "status": "400"}
+        
+        now_time, _ = AttendanceService._punch_time(custom_timestamp)
+        item = await PunchQueueItem.objects.acreate(
+            employee=employee_id,
+            action_type=action_type_id,
+            source_id=source_id,
+            remarks=remarks,
+            punch_time=now_time
+        )
+        return {
+            "message": "Punch accepted for processing",
+            "employee": employee_id,
+            "ticket": str(item.ticket),
+            "punch_time": now_time,
+            "status": "queued"
+        }
+    
+    @staticmethod
+    def get_ticket_status(ticket):
+        """Get the processing status of a queued punch"""
+        try:
+            item = PunchQueueItem.objects.get(ticket=ticket)
+        except PunchQueueItem.DoesNotExist:
+            return {"error": "Ticket not found", "status": "400"}
+        
+        response_data = {
+            "ticket": str(item.ticket),
+            "employee": item.employee,
+            "punch_time": item.punch_time,
+            "status": item.status,
+            "created_at": item.created_at,
+            "processed_at": item.processed_at
+        }
+        if item.status in (PunchQueueItem.DONE, PunchQueueItem.FAILED):
+            response_data["result"] = item.result
+        return response_data
+    
+    @staticmethod
+    def reclaim_stale(minutes=10):
+        """Put items claimed by a worker that died back into the queue"""
+        return PunchQueueItem.objects.filter(
+            status=PunchQueueItem.PROCESSING,
+            claimed_at__lt=timezone.now() - timedelta(minutes=minutes)
+        ).update(status=PunchQueueItem.PENDING, claimed_at=None)
+    
+    @staticmethod
+    def claim_batch(batch_size=500):
+        """Claim the oldest pending items for this worker"""
+        with transaction.atomic():
+            items = list(
+                PunchQueueItem.objects.select_for_update(skip_locked=True)
+                .filter(status=PunchQueueItem.PENDING)
+                .order_by('id')[:batch_size]
+            )
+            if items:
+                PunchQueueItem.objects.filter(id__in=[item.id for item in items]).update(
+                    status=PunchQueueItem.PROCESSING,
+                    claimed_at=timezone.now(),
+                    attempts=F('attempts') + 1
+                )
+        return items
+    
+    @staticmethod
+    def process_batch(batch_size=500, max_attempts=5):
+        """
+        Claim and process one batch of queued punches through the bulk punch logic.
+        Returns: number of items processed
+        """
+        items = PunchQueueService.claim_batch(batch_size)
+        if not items:
+            return 0
+        
+        punches = [
+            {
+                "employee": item.employee,
+                "action_type": item.action_type,
+                "source_id": item.source_id,
+                "remarks": item.remarks or "",
+                "custom_timestamp": timezone.localtime(item.punch_time)
+            }
+            for item in items
+        ]
+        
+        try:
+            results = AttendanceService.process_bulk_punches(punches)
+        except Exception as e:
+            # Leave the batch for another attempt unless it keeps failing
+            for item in items:
+                item.attempts += 1
+                if item.attempts >= max_attempts:
+                    item.status = PunchQueueItem.FAILED
+                    item.result = {"error": f"Error processing attendance punch: {str(e)}"}
+                    item.processed_at = timezone.now()
+                else:
+                    item.status = PunchQueueItem.PENDING
+                item.claimed_at = None
+            PunchQueueItem.objects.bulk_update(items, ["status", "result", "processed_at", "claimed_at"])
+            raise
+        
+        processed_at = timezone.now()
+        for item, result in zip(items, results):
+            if result["status"] == "200":
+                item.status = PunchQueueItem.DONE
+                item.result = result["data"]
+            else:
+                item.status = PunchQueueItem.FAILED
+                item.result = {"error": result["error"]}
+            item.processed_at = processed_at
+        PunchQueueItem.objects.bulk_update(items, ["status", "result", "processed_at"], batch_size=500)
+        return len(items)
+
+
+class DailySummaryService:
+    """Service class for the DailyAttendanceSummary rollup (one row per employee and business date)"""
+    
+    PRESENT_CODES = ("P", "L")
+    ABSENT_CODE = "A"
+    UPDATE_FIELDS = [
+        "company", "attendance", "attendance_type", "is_present", "is_late", "is_absent", "is_leave",
+        "check_in", "check_out", "working_hour", "late_by_minutes", "overtime_minutes", "updated_at"
+    ]
+    
+    @staticmethod
+    def build(attendance):
+        """Unsaved summary row for a live attendance record (attendance_type should be loaded), archived records aren't linked"""
+        attendance_type = attendance.attendance_type
+        code = attendance_type.code if attendance_type else None
+        is_leave = bool(attendance_type and attendance_type.is_leave)
+        return DailyAttendanceSummary(
+            employee=attendance.employee,
+            company=attendance.company,
+            date=attendance.attendance_date,
+            attendance=attendance if isinstance(attendance, Attendance) else None,
+            attendance_type=attendance_type,
+            is_present=code in DailySummaryService.PRESENT_CODES,
+            is_late=bool(attendance.is_late),
+            is_absent=code == DailySummaryService.ABSENT_CODE,
+            is_leave=is_leave,
+            check_in=attendance.date_check_in,
+            check_out=attendance.date_check_out,
+            working_hour=attendance.working_hour,
+            late_by_minutes=attendance.late_by_minutes,
+            overtime_minutes=attendance.overtime_minutes
+        )
+    
+    @staticmethod
+    def upsert(summaries, batch_size=1000):
+        """Insert or overwrite summary rows on (employee, date)"""
+        return DailyAttendanceSummary.objects.bulk_create(
+            summaries,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["employee", "date"],
+            update_fields=DailySummaryService.UPDATE_FIELDS
+        )
+    
+    @staticmethod
+    def refresh_records(attendances, moved=False):
+        """
+        Bring the summary in line with changed attendance records: live records are upserted,
+        soft-deleted ones drop their row. With moved=True rows left behind by a record whose
+        employee or business date changed are removed as well.
+        """
+        live = [a for a in attendances if not a.deleted and a.employee is not None and a.attendance_date]
+        gone = [a.pk for a in attendances if a.deleted and a.pk]
+        
+        if live:
+            DailySummaryService.upsert([DailySummaryService.build(attendance) for attendance in live])
+        if gone:
+            DailyAttendanceSummary.objects.filter(attendance__in=gone).delete()
+        if moved and live:
+            DailyAttendanceSummary.objects.filter(attendance__in=[a.pk for a in live]).exclude(
+                employee=F("attendance__employee"),
+                date=F("attendance__attendance_date")
+            ).delete()
+    
+    @staticmethod
+    def refresh_on_save(sender, instance, created=False, raw=False, **kwargs):
+        """Signal handler - refresh the summary row of a saved attendance record"""
+        if raw:
+            return
+        DailySummaryService.refresh_records([instance], moved=not created)
+    
+    @staticmethod
+    def rebuild(date_from, date_to, company=None, batch_size=2000):
+        """
+        Recompute the summary for a date range from the live attendance records, archived
+        records included when the range reaches before the archive boundary.
+        Returns: number of summary rows written
+        """
+        summaries = DailyAttendanceSummary.objects.filter(date__range=(date_from, date_to))
+        models = [Attendance]
+        if archive_boundary.covers(date_from):
+            # Archive first, a record added to the hot table for an archived day wins
+            models.insert(0, AttendanceArchive)
+        if company is not None:
+            summaries = summaries.filter(company=company)
+        
+        written = 0
+        with transaction.atomic():
+            summaries.delete()
+            for model in models:
+                attendances = model.objects.alive().filter(
+                    attendance_date__range=(date_from, date_to)
+                ).exclude(employee__isnull=True).select_related("attendance_type").order_by("attendance_date", "employee")
+                if company is not None:
+                    attendances = attendances.filter(company=company)
+                batch = []
+                for attendance in attendances.iterator(chunk_size=batch_size):
+                    batch.append(DailySummaryService.build(attendance))
+                    if len(batch) >= batch_size:
+                        written += len(DailySummaryService.upsert(batch, batch_size))
+                        batch = []
+                if batch:
+                    written += len(DailySummaryService.upsert(batch, batch_size))
+        return written
+
+
+class AttendanceArchiveService:
+    """
+    Service class for the Attendance archive tier. Closed months are moved from the hot table to
+    AttendanceArchive with one INSERT ... SELECT and one DELETE per month, so the hot table (and
+    its indexes) only holds recent history. On PostgreSQL every archived month gets its own
+    partition of the archive table.
+    """
+    
+    @staticmethod
+    def month_start(day):
+        return day.replace(day=1)
+    
+    @staticmethod
+    def next_month(period):
+        return date(period.year + period.month // 12, period.month % 12 + 1, 1)
+    
+    @staticmethod
+    def default_cutoff():
+        """First day of the oldest month kept hot (ATTENDANCE_HOT_MONTHS full months plus the current one)"""
+        period = AttendanceArchiveService.month_start(timezone.localdate())
+        for _ in range(getattr(settings, 'ATTENDANCE_HOT_MONTHS', 3)):
+            period = (period - timedelta(days=1)).replace(day=1)
+        return period
+    
+    @staticmethod
+    def pending_periods(cutoff):
+        """Months with records in the hot table before cutoff"""
+        return list(Attendance.objects.filter(attendance_date__lt=cutoff).dates('attendance_date', 'month'))
+    
+    @staticmethod
+    def ensure_partition(period):
+        """Create the archive partition of a month (PostgreSQL only)"""
+        if connection.vendor != 'postgresql':
+            return
+        table = AttendanceArchive._meta.db_table
+        partition = f"{table}_y{period.year}m{period.month:02d}"
+        with connection.cursor() as cursor:
+            # DDL takes no parameters, the bounds are ISO dates
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(partition)} "
+                f"PARTITION OF {connection.ops.quote_name(table)} "
+                f"FOR VALUES FROM ('{period.isoformat()}') TO ('{AttendanceArchiveService.next_month(period).isoformat()}')"
+            )
+    
+    @staticmethod
+    def archive_month(period):
+        """
+        Move one month of attendance (soft-deleted records included) to the archive.
+        Summary rows stay, they only lose the link to the moved record.
+        Returns: number of records moved
+        """
+        start, end = period, AttendanceArchiveService.next_month(period)
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(field.column) for field in AttendanceArchive._meta.concrete_fields)
+        date_column = quote(Attendance._meta.get_field('attendance_date').column)
+        
+        with transaction.atomic():
+            AttendanceArchiveService.ensure_partition(period)
+            DailyAttendanceSummary.objects.filter(
+                attendance__attendance_date__gte=start,
+                attendance__attendance_date__lt=end
+            ).update(attendance=None)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {quote(AttendanceArchive._meta.db_table)} ({columns}) "
+                    f"SELECT {columns} FROM {quote(Attendance._meta.db_table)} "
+                    f"WHERE {date_column} >= %s AND {date_column} < %s",
+                    [start, end]
+                )
+                cursor.execute(
+                    f"DELETE FROM {quote(Attendance._meta.db_table)} WHERE {date_column} >= %s AND {date_column} < %s",
+                    [start, end]
+                )
+                moved = cursor.rowcount
+            
+            # Re-running a month (records added to the hot table after it was archived) adds up
+            if not ArchivedPeriod.objects.filter(period=period).update(rows=F("rows") + moved, archived_at=timezone.now()):
+                ArchivedPeriod.objects.create(period=period, rows=moved)
+        return moved
+    
+    @staticmethod
+    def check_cutoff(cutoff):
+        """Raises ValueError unless cutoff is the first day of a month, not after the current month"""
+        if cutoff.day != 1:
+            raise ValueError("The archive cutoff must be the first day of a month")
+        if cutoff > AttendanceArchiveService.month_start(timezone.localdate()):
+            raise ValueError("Only closed months can be archived")
+    
+    @staticmethod
+    def archive_before(cutoff):
+        """
+        Archive every month before cutoff.
+        Returns: list of (period, records moved)
+        """
+        AttendanceArchiveService.check_cutoff(cutoff)
+        return [(period, AttendanceArchiveService.archive_month(period)) for period in AttendanceArchiveService.pending_periods(cutoff)]
+    
+    @staticmethod
+    def _page_args(filters, boundary):
+        if boundary is None or (filters.get("date_from") and filters["date_from"] >= boundary):
+            return {}
+        return {
+            "archive": AttendanceService.filter_attendance(filters, AttendanceArchive),
+            # Check-in times run at most a day past the business date, archived ones are all before this
+            "archive_before": timezone.make_aware(datetime.combine(boundary + timedelta(days=1), time.min)),
+        }
+    
+    @staticmethod
+    def page_args(filters):
+        """Extra paginate() arguments merging the archive into the attendance list, {} when the range doesn't reach it"""
+        return AttendanceArchiveService._page_args(filters, archive_boundary.get())
+    
+    @staticmethod
+    async def apage_args(filters):
+        return AttendanceArchiveService._page_args(filters, await archive_boundary.aget())
+
+
+class LeaveLedgerService:
+    """
+    Service class for the append-only leave ledger. Every balance change is written as a
+    LeaveLedgerEntry and applied to the LeaveBalance row with a single UPDATE using F()
+    expressions, so concurrent changes add up instead of overwriting each other and balance
+    reads stay a single row lookup.
+    """
+    
+    @staticmethod
+    def deltas(entry_type, days):
+        """(total_days, used_days) change of an entry"""
+        if entry_type == LeaveLedgerEntry.GRANT:
+            return days, 0
+        if entry_type == LeaveLedgerEntry.CANCEL:
+            return 0, -days
+        return 0, days
+    
+    @staticmethod
+    def _apply(employee_id, attendance_type_id, year, total_delta, used_delta):
+        """
+        Add the deltas to the balance row, creating it first if needed.
+        Raises ValueError when total_days or used_days would drop below zero (nothing is written).
+        """
+        balance = LeaveBalance.objects.filter(employee=employee_id, attendance_type_id=attendance_type_id, year=year)
+        changes = {
+            "total_days": Coalesce(F("total_days"), Value(0)) + total_delta,
+            "used_days": Coalesce(F("used_days"), Value(0)) + used_delta,
+            "remaining_days": Coalesce(F("total_days"), Value(0)) + total_delta - Coalesce(F("used_days"), Value(0)) - used_delta,
+            "updated_at": timezone.now(),
+        }
+        # Checked in the UPDATE itself, so concurrent changes can't take a total below zero either
+        guarded = balance
+        if total_delta < 0:
+            guarded = guarded.filter(total_days__gte=-total_delta)
+        if used_delta < 0:
+            guarded = guarded.filter(used_days__gte=-used_delta)
+        if guarded.update(**changes):
+            return
+        if not balance.exists():
+            try:
+                with transaction.atomic():
+                    LeaveBalance.objects.create(
+                        employee=employee_id, attendance_type_id=attendance_type_id, year=year,
+                        total_days=0, used_days=0, remaining_days=0
+                    )
+            except IntegrityError:
+                pass  # Created concurrently
+            if guarded.update(**changes):
+                return
+        raise ValueError(
+            f"Leave balance of employee {employee_id} for {year} can't go below zero "
+            f"(total days change {total_delta}, used days change {used_delta})"
+        )
+    
+    @staticmethod
+    def record(employee_id, attendance_type_id, year, entry_type, days, leave_request=None, company=None, remarks="", created_by=None):
+        """
+        Write a ledger entry and apply it to the balance.
+        Raises IntegrityError when the leave request already has an entry of this type.
+        """
+        with transaction.atomic():
+            entry = LeaveLedgerEntry.objects.create(
+                employee=employee_id,
+                company=company,
+                attendance_type_id=attendance_type_id,
+                year=year,
+                entry_type=entry_type,
+                days=days,
+                leave_request=leave_request,
+                remarks=remarks,
+                created_by=created_by
+            )
+            LeaveLedgerService._apply(employee_id, attendance_type_id, year, *LeaveLedgerService.deltas(entry_type, days))
+        return entry
+    
+    @staticmethod
+    def record_many(entries):
+        """
+        Write unsaved ledger entries with one bulk insert and apply them with one UPDATE per
+        (employee, attendance type, year). Returns: the saved entries
+        """
+        deltas = {}
+        for entry in entries:
+            key = (entry.employee, entry.attendance_type_id, entry.year)
+            total_delta, used_delta = LeaveLedgerService.deltas(entry.entry_type, entry.days)
+            total, used = deltas.get(key, (0, 0))
+            deltas[key] = (total + total_delta, used + used_delta)
+        
+        with transaction.atomic():
+            entries = LeaveLedgerEntry.objects.bulk_create(entries)
+            for (employee_id, attendance_type_id, year), (total_delta, used_delta) in deltas.items():
+                LeaveLedgerService._apply(employee_id, attendance_type_id, year, total_delta, used_delta)
+        return entries
+    
+    @staticmethod
+    def set_balance(employee_id, attendance_type_id, year, total_days=None, used_days=None, remarks="", created_by=None):
+        """
+        Bring a balance to the given totals by recording the differences (GRANT for total_days,
+        ADJUST for used_days). used_days above total_days leaves a negative remaining_days.
+        Returns: the LeaveBalance row
+        """
+        for name, value in (("total_days", total_days), ("used_days", used_days)):
+            if value is not None and value < 0:
+                raise ValueError(f"{name} cannot be negative")
+        with transaction.atomic():
+            balance, created = LeaveBalance.objects.select_for_update().get_or_create(
+                employee=employee_id, attendance_type_id=attendance_type_id, year=year,
+                defaults={"total_days": 0, "used_days": 0, "remaining_days": 0}
+            )
+            changes = [
+                (LeaveLedgerEntry.GRANT, total_days, balance.total_days),
+                (LeaveLedgerEntry.ADJUST, used_days, balance.used_days),
+            ]
+            for entry_type, target, current in changes:
+                if target is not None and target != (current or 0):
+                    LeaveLedgerService.record(
+                        employee_id, attendance_type_id, year, entry_type, target - (current or 0),
+                        remarks=remarks, created_by=created_by
+                    )
+            balance.refresh_from_db()
+        return balance
+    
+    @staticmethod
+    def rebuild(employee_id=None, year=None):
+        """
+        Recompute LeaveBalance totals from the ledger (all balances, or one employee/year).
+        Returns: number of balance rows written
+        """
+        entries = LeaveLedgerEntry.objects.all()
+        balances = LeaveBalance.objects.all()
+        if employee_id is not None:
+            entries = entries.filter(employee=employee_id)
+            balances = balances.filter(employee=employee_id)
+        if year is not None:
+            entries = entries.filter(year=year)
+            balances = balances.filter(year=year)
+        
+        totals = entries.order_by().values("employee", "attendance_type", "year").annotate(
+            granted=Coalesce(Sum("days", filter=Q(entry_type=LeaveLedgerEntry.GRANT)), 0),
+            used=Coalesce(Sum("days", filter=Q(entry_type__in=[LeaveLedgerEntry.CONSUME, LeaveLedgerEntry.ADJUST])), 0),
+            returned=Coalesce(Sum("days", filter=Q(entry_type=LeaveLedgerEntry.CANCEL)), 0),
+        )
+        with transaction.atomic():
+            existing = {
+                (balance.employee, balance.attendance_type_id, balance.year): balance
+                for balance in balances.select_for_update()
+            }
+            to_update, to_create = [], []
+            for row in totals:
+                key = (row["employee"], row["attendance_type"], row["year"])
+                balance = existing.pop(key, None)
+                if balance is None:
+                    balance = LeaveBalance(employee=key[0], attendance_type_id=key[1], year=key[2])
+                    to_create.append(balance)
+                else:
+                    to_update.append(balance)
+                balance.total_days = row["granted"]
+                balance.used_days = row["used"] - row["returned"]
+                balance.remaining_days = balance.total_days - balance.used_days
+            # Balances without ledger entries have nothing granted or used
+            for balance in existing.values():
+                balance.total_days = balance.used_days = balance.remaining_days = 0
+                to_update.append(balance)
+            LeaveBalance.objects.bulk_update(to_update, ["total_days", "used_days", "remaining_days"], batch_size=1000)
+            LeaveBalance.objects.bulk_create(to_create, batch_size=1000)
+        return len(to_update) + len(to_create)
+
+
+class LeaveSettingService:
+    """
+    Service class for financial-year leave settings. A company-wide rollout comes in as an
+    allocation matrix - a list of attendance types (ids or codes) and one row per employee with
+    the allotted days per type - and is written with chunked upserts.
+    """
+    UNIQUE_FIELDS = ["employee", "company", "attendance_type", "financial_year_start"]
+    UPDATE_FIELDS = ["financial_year_end", "allotted_days", "deleted", "updated_at"]
+    
+    @staticmethod
+    def parse_csv(lines):
+        """Allocation matrix from CSV lines, header: employee,<attendance type>,<attendance type>,..."""
+        reader = csv.reader(lines)
+        header = next(reader, None)
+        if not header or header[0].strip().lower() != "employee":
+            raise ValueError("The first CSV column must be employee")
+        return {
+            "attendance_types": [column.strip() for column in header[1:]],
+            "rows": [row for row in reader if any(cell.strip() for cell in row)]
+        }
+    
+    @staticmethod
+    def resolve_attendance_types(references):
+        """Attendance type ids for a list of ids or codes, one query. Raises ValueError on unknown ones"""
+        references = [str(reference).strip() for reference in references]
+        ids = {int(reference) for reference in references if reference.isdigit()}
+        codes = {reference for reference in references if not reference.isdigit()}
+        
+        known = {}
+        for type_id, code in AttendanceType.objects.filter(Q(id__in=ids) | Q(code__in=codes), deleted=False).values_list("id", "code"):
+            known[str(type_id)] = type_id
+            if code:
+                known[code] = type_id
+        
+        unknown = [reference for reference in references if reference not in known]
+        if unknown:
+            raise ValueError(f"Unknown attendance types: {', '.join(unknown)}")
+        type_ids = [known[reference] for reference in references]
+        if len(set(type_ids)) != len(type_ids):
+            raise ValueError("An attendance type appears more than once")
+        return type_ids
+    
+    @staticmethod
+    def build(matrix, company, financial_year_start, financial_year_end):
+        """
+        Unsaved LeaveSetting rows for an allocation matrix. Empty cells are skipped, so a
+        matrix can update some types without touching the others.
+        Raises ValueError naming the first bad row.
+        """
+        type_ids = LeaveSettingService.resolve_attendance_types(matrix.get("attendance_types") or [])
+        if not type_ids:
+            raise ValueError("No attendance types given")
+        
+        now = timezone.now()
+        settings_rows = []
+        employees = set()
+        for number, row in enumerate(matrix.get("rows") or [], start=1):
+            if len(row) != len(type_ids) + 1:
+                raise ValueError(f"Row {number}: expected employee and {len(type_ids)} allotted day values")
+            try:
+                employee = int(row[0])
+                allotted = [None if str(cell).strip() == "" else int(cell) for cell in row[1:]]
+            except (TypeError, ValueError):
+                raise ValueError(f"Row {number}: employee and allotted days must be whole numbers")
+            if any(days is not None and days < 0 for days in allotted):
+                raise ValueError(f"Row {number}: allotted days cannot be negative")
+            if employee in employees:
+                raise ValueError(f"Row {number}: employee {employee} appears more than once")
+            employees.add(employee)
+            
+            for attendance_type_id, days in zip(type_ids, allotted):
+                if days is None:
+                    continue
+                settings_rows.append(LeaveSetting(
+                    employee=employee,
+                    company=company,
+                    attendance_type_id=attendance_type_id,
+                    financial_year_start=financial_year_start,
+                    financial_year_end=financial_year_end,
+                    allotted_days=days,
+                    deleted=False,
+                    updated_at=now
+                ))
+        return settings_rows
+    
+    @staticmethod
+    def bulk_upsert(settings_rows, batch_size=2000):
+        """Insert or overwrite settings on (employee, company, attendance type, financial year start) in chunks"""
+        with transaction.atomic():
+            for start in range(0, len(settings_rows), batch_size):
+                LeaveSetting.objects.bulk_create(
+                    settings_rows[start:start + batch_size],
+                    update_conflicts=True,
+                    unique_fields=LeaveSettingService.UNIQUE_FIELDS,
+                    update_fields=LeaveSettingService.UPDATE_FIELDS
+                )
+        return len(settings_rows)
+    
+    @staticmethod
+    def rollout(matrix, company, financial_year_start, financial_year_end, batch_size=2000):
+        """
+        Validate a whole allocation matrix, then upsert it.
+        Returns: number of settings written
+        """
+        if financial_year_start > financial_year_end:
+            raise ValueError("financial_year_end cannot be before financial_year_start")
+        settings_rows = LeaveSettingService.build(matrix, company, financial_year_start, financial_year_end)
+        return LeaveSettingService.bulk_upsert(settings_rows, batch_size)
 
 
 class LeaveService:
     """Service class for leave business logic"""
     
+    @staticmethod
+    def is_lop(attendance_type):
+        """LOP (Loss of Pay) leave has no balance - an unpaid leave type, as in the payroll feed"""
+        return bool(attendance_type) and (getattr(attendance_type, 'is_lop', False) or not attendance_type.is_paid_leave)
+    
     @staticmethod
     def create_leave_request(data):
         """Create a new leave request"""
@@ -350,9 +1485,8 @@ class LeaveService:
             raise Exception("Selected attendance type is not a valid leave type.")
         
         # Get pending status
-        try:
-            pending_status = Status.objects.get(code='pending', is_active=True, deleted=False)
-        except Status.DoesNotExist:
+        pending_status = reference_data.get_by_code('status', 'pending')
+        if not pending_status:
             raise Exception("Pending status not found")
         
         # Check leave balance
@@ -360,7 +1494,8 @@ class LeaveService:
             data['employee'], 
             data['attendance_type'], 
             data['start_date'], 
-            data['end_date']
+            data['end_date'],
+            company=data.get('company')
         )
         if not balance_check["has_sufficient_balance"]:
             raise Exception(f"Insufficient leave balance. {balance_check['message']}")
@@ -368,6 +1503,7 @@ class LeaveService:
         # Create leave request
         leave_request = LeaveRequest.objects.create(
             employee=data['employee'],
+            company=data.get('company'),
             attendance_type=attendance_type,
             start_date=data['start_date'],
             end_date=data['end_date'],
@@ -386,7 +1522,7 @@ class LeaveService:
     def approve_leave_request(leave_request_id, approver_id, approval_remarks=""):
         """Approve a leave request"""
         try:
-            leave_request = LeaveRequest.objects.get(id=leave_request_id, deleted=False)
+            leave_request = LeaveRequest.objects.alive().get(id=leave_request_id)
         except LeaveRequest.DoesNotExist:
             raise Exception("Leave request not found")
         
@@ -394,20 +1530,28 @@ class LeaveService:
             raise Exception(f"Leave request is already {leave_request.status.label}")
         
         # Get approved status
-        try:
-            approved_status = Status.objects.get(code='approved', is_active=True, deleted=False)
-        except Status.DoesNotExist:
+        approved_status = reference_data.get_by_code('status', 'approved')
+        if not approved_status:
             raise Exception("Approved status not found")
         
-        # Update leave request
-        leave_request.status = approved_status
-        leave_request.action_by = approver_id
-        leave_request.action_at = timezone.now()
-        leave_request.approval_remarks = approval_remarks
-        leave_request.save()
-        
-        # Update leave balance
-        LeaveService.update_leave_balance(leave_request.employee, leave_request.attendance_type.id, leave_request.total_days)
+        # Update leave request, only if it is still pending (a concurrent approval loses here)
+        action_at = timezone.now()
+        with transaction.atomic():
+            if not LeaveService._change_status(leave_request, approved_status, action_by=approver_id, action_at=action_at, approval_remarks=approval_remarks):
+                raise Exception("Leave request was already processed")
+            
+            # Consume the days from the balance
+            LeaveLedgerService.record(
+                leave_request.employee,
+                leave_request.attendance_type_id,
+                action_at.year,
+                LeaveLedgerEntry.CONSUME,
+                leave_request.total_days or 0,
+                leave_request=leave_request,
+                company=leave_request.company,
+                remarks=approval_remarks,
+                created_by=approver_id
+            )
         
         return {
             "message": "Leave request approved successfully",
@@ -416,11 +1560,99 @@ class LeaveService:
             "approved_at": str(leave_request.action_at)
         }
     
+    @staticmethod
+    def bulk_action(leave_request_ids, action, approver_id, approval_remarks=""):
+        """
+        Approve or reject many leave requests at once. The requests and the balances they draw
+        from are locked and checked together, statuses are written with one bulk_update and
+        approved days consumed with one balance update per (employee, attendance type, year).
+        Returns: dict with a per-id result list and counts
+        """
+        new_status = reference_data.get_by_code('status', 'approved' if action == 'approve' else 'rejected')
+        pending_status = reference_data.get_by_code('status', 'pending')
+        if not new_status or not pending_status:
+            raise Exception("Leave statuses are not set up")
+        
+        leave_request_ids = list(dict.fromkeys(leave_request_ids))
+        action_at = timezone.now()
+        results = {}
+        with transaction.atomic():
+            leave_requests = {
+                leave_request.id: leave_request
+                for leave_request in LeaveRequest.objects.alive().select_for_update().filter(id__in=leave_request_ids)
+            }
+            # Balances the approvals draw from, locked with the requests
+            remaining = {}
+            if action == 'approve' and leave_requests:
+                balances = LeaveBalance.objects.select_for_update().filter(
+                    employee__in={leave_request.employee for leave_request in leave_requests.values()},
+                    attendance_type__in={leave_request.attendance_type_id for leave_request in leave_requests.values()},
+                    year=action_at.year
+                ).order_by().values_list('employee', 'attendance_type', 'remaining_days')
+                remaining = {(employee, attendance_type): days or 0 for employee, attendance_type, days in balances}
+            
+            to_update = []
+            for leave_request_id in leave_request_ids:
+                leave_request = leave_requests.get(leave_request_id)
+                if leave_request is None:
+                    results[leave_request_id] = {"id": leave_request_id, "success": False, "message": "Leave request not found"}
+                    continue
+                if leave_request.status_id != pending_status.id:
+                    current_status = reference_data.get_by_id('status', leave_request.status_id)
+                    label = current_status.label if current_status else "processed"
+                    results[leave_request_id] = {"id": leave_request_id, "success": False, "message": f"Leave request is already {label}"}
+                    continue
+                # LOP leave has no balance to check, as in check_leave_balance
+                attendance_type = reference_data.get_by_id('attendance_type', leave_request.attendance_type_id)
+                if action == 'approve' and not LeaveService.is_lop(attendance_type):
+                    key = (leave_request.employee, leave_request.attendance_type_id)
+                    days = leave_request.total_days or 0
+                    if remaining.get(key, 0) < days:
+                        results[leave_request_id] = {
+                            "id": leave_request_id, "success": False,
+                            "message": f"Insufficient leave balance, required: {days} days, available: {remaining.get(key, 0)} days"
+                        }
+                        continue
+                    remaining[key] -= days
+                leave_request.status = new_status
+                leave_request.action_by = approver_id
+                leave_request.action_at = action_at
+                leave_request.approval_remarks = approval_remarks
+                leave_request.updated_at = action_at
+                to_update.append(leave_request)
+                results[leave_request_id] = {"id": leave_request_id, "success": True, "status": new_status.label}
+            
+            LeaveRequest.objects.bulk_update(
+                to_update, ["status", "action_by", "action_at", "approval_remarks", "updated_at"], batch_size=500
+            )
+            if action == 'approve':
+                LeaveLedgerService.record_many([
+                    LeaveLedgerEntry(
+                        employee=leave_request.employee,
+                        company=leave_request.company,
+                        attendance_type_id=leave_request.attendance_type_id,
+                        year=action_at.year,
+                        entry_type=LeaveLedgerEntry.CONSUME,
+                        days=leave_request.total_days or 0,
+                        leave_request=leave_request,
+                        remarks=approval_remarks,
+                        created_by=approver_id
+                    )
+                    for leave_request in to_update
+                    if leave_request.employee is not None and leave_request.attendance_type_id
+                ])
+        
+        return {
+            "results": list(results.values()),
+            "processed": len(to_update),
+            "failed": len(results) - len(to_update)
+        }
+    
     @staticmethod
     def reject_leave_request(leave_request_id, approver_id, approval_remarks=""):
         """Reject a leave request"""
         try:
-            leave_request = LeaveRequest.objects.get(id=leave_request_id, deleted=False)
+            leave_request = LeaveRequest.objects.alive().get(id=leave_request_id)
         except LeaveRequest.DoesNotExist:
             raise Exception("Leave request not found")
         
@@ -428,17 +1660,14 @@ class LeaveService:
             raise Exception(f"Leave request is already {leave_request.status.label}")
         
         # Get rejected status
-        try:
-            rejected_status = Status.objects.get(code='rejected', is_active=True, deleted=False)
-        except Status.DoesNotExist:
+        rejected_status = reference_data.get_by_code('status', 'rejected')
+        if not rejected_status:
             raise Exception("Rejected status not found")
         
-        # Update leave request
-        leave_request.status = rejected_status
-        leave_request.action_by = approver_id
-        leave_request.action_at = timezone.now()
-        leave_request.approval_remarks = approval_remarks
-        leave_request.save()
+        # Update leave request, only if it is still pending
+        action_at = timezone.now()
+        if not LeaveService._change_status(leave_request, rejected_status, action_by=approver_id, action_at=action_at, approval_remarks=approval_remarks):
+            raise Exception("Leave request was already processed")
         
         return {
             "message": "Leave request rejected successfully",
@@ -451,7 +1680,7 @@ class LeaveService:
     def cancel_leave_request(leave_request_id):
         """Cancel a leave request"""
         try:
-            leave_request = LeaveRequest.objects.get(id=leave_request_id, deleted=False)
+            leave_request = LeaveRequest.objects.alive().get(id=leave_request_id)
         except LeaveRequest.DoesNotExist:
             raise Exception("Leave request not found")
         
@@ -460,42 +1689,65 @@ class LeaveService:
             raise Exception("Leave request is already cancelled")
         
         # Get cancelled status
-        try:
-            cancelled_status = Status.objects.get(code='cancelled', is_active=True, deleted=False)
-        except Status.DoesNotExist:
+        cancelled_status = reference_data.get_by_code('status', 'cancelled')
+        if not cancelled_status:
             raise Exception("Cancelled status not found")
         
-        # If the leave was approved, we need to restore the leave balance
-        if leave_request.status.code == 'approved':
-            # Restore the leave balance by subtracting the used days
-            LeaveService.update_leave_balance(
-                leave_request.employee, 
-                leave_request.attendance_type.id, 
-                -leave_request.total_days  # Negative to restore balance
-            )
-        
-        # Update leave request
-        leave_request.status = cancelled_status
-        leave_request.save()
+        previous_status = leave_request.status
+        with transaction.atomic():
+            if not LeaveService._change_status(leave_request, cancelled_status):
+                raise Exception("Leave request was already processed")
+            
+            # If the leave was approved, give the consumed days back
+            consumed = None
+            if previous_status.code == 'approved':
+                consumed = leave_request.ledger_entries.filter(entry_type=LeaveLedgerEntry.CONSUME).first()
+            if consumed:
+                LeaveLedgerService.record(
+                    consumed.employee,
+                    consumed.attendance_type_id,
+                    consumed.year,
+                    LeaveLedgerEntry.CANCEL,
+                    consumed.days,
+                    leave_request=leave_request,
+                    company=consumed.company
+                )
         
         return {
             "message": "Leave request cancelled successfully",
             "leave_request_id": leave_request.id,
-            "previous_status": leave_request.status.label,
-            "balance_restored": leave_request.status.code == 'approved'
+            "previous_status": previous_status.label,
+            "balance_restored": consumed is not None
         }
     
     @staticmethod
-    def check_leave_balance(employee_id, attendance_type_id, start_date, end_date):
+    def _change_status(leave_request, new_status, **fields):
+        """
+        Move a leave request from the status it was read with to new_status (compare-and-set).
+        Returns: False when someone else changed the status first
+        """
+        updated = LeaveRequest.objects.alive().filter(
+            id=leave_request.id,
+            status=leave_request.status_id
+        ).update(status=new_status, updated_at=timezone.now(), **fields)
+        if updated:
+            leave_request.status = new_status
+            for field, value in fields.items():
+                setattr(leave_request, field, value)
+        return bool(updated)
+    
+    @staticmethod
+    def check_leave_balance(employee_id, attendance_type_id, start_date, end_date, company=None):
         """Check if employee has sufficient leave balance"""
         try:
             attendance_type = AttendanceType.objects.get(id=attendance_type_id, deleted=False)
         except AttendanceType.DoesNotExist:
             return {"has_sufficient_balance": False, "message": "Attendance type not found"}
         
-        # Calculate required days
-        delta = end_date - start_date
-        required_days = delta.days + 1
+        # Calculate required days, weekly offs and holidays are not charged
+        required_days = working_days.count(company, start_date, end_date)
+        if required_days == 0:
+            return {"has_sufficient_balance": False, "message": "No working days in the selected range"}
         
         # Get current year
         current_year = timezone.now().year
@@ -503,13 +1755,13 @@ class LeaveService:
         # Get or create leave balance
         leave_balance, created = LeaveBalance.objects.get_or_create(
             employee=employee_id,
-            leave_type=attendance_type,
+            attendance_type=attendance_type,
             year=current_year,
             defaults={'total_days': 0, 'used_days': 0, 'remaining_days': 0}
         )
         
         # If this is a LOP (Loss of Pay) type, always allow
-        if hasattr(attendance_type, 'is_lop') and attendance_type.is_lop:
+        if LeaveService.is_lop(attendance_type):
             return {
                 "has_sufficient_balance": True,
                 "message": f"LOP leave - {required_days} days requested"
@@ -534,30 +1786,20 @@ class LeaveService:
         }
     
     @staticmethod
-    def update_leave_balance(employee_id, attendance_type_id, used_days, year=None):
-        """Update leave balance after approval"""
+    def update_leave_balance(employee_id, attendance_type_id, used_days, year=None, remarks="", created_by=None):
+        """Manual adjustment of used days, written to the leave ledger"""
         if year is None:
             year = timezone.now().year
         
-        try:
-            leave_balance = LeaveBalance.objects.get(
-                employee=employee_id,
-                leave_type_id=attendance_type_id,
-                year=year,
-                deleted=False
-            )
-            leave_balance.used_days += used_days
-            leave_balance.save()
-        except LeaveBalance.DoesNotExist:
-            # Create new balance record if doesn't exist
-            attendance_type = AttendanceType.objects.get(id=attendance_type_id)
-            LeaveBalance.objects.create(
-                employee=employee_id,
-                leave_type=attendance_type,
-                year=year,
-                total_days=0,
-                used_days=used_days
-            )
+        return LeaveLedgerService.record(
+            employee_id,
+            attendance_type_id,
+            year,
+            LeaveLedgerEntry.ADJUST,
+            used_days,
+            remarks=remarks,
+            created_by=created_by
+        )
     
     @staticmethod
     def get_employee_leave_balance(employee_id, year=None):
@@ -565,11 +1807,10 @@ class LeaveService:
         if year is None:
             year = timezone.now().year
         
-        balances = LeaveBalance.objects.filter(
+        balances = LeaveBalance.objects.alive().filter(
             employee=employee_id,
-            year=year,
-            deleted=False
-        ).select_related('leave_type')
+            year=year
+        ).select_related('attendance_type')
         
         return balances
     
@@ -677,19 +1918,3 @@ class LeaveService:
 # def auto_mark_absent_legacy():
 #     """Auto-mark absent (legacy function)"""
 #     auto_mark_absent()
-
-
-# def get_lop_days(employee_id, start_date, end_date):
-#     """Get LOP days for employee in date range"""
-#     lop_type = AttendanceType.objects.get(code='A')  # Or LOP type code
-#     return Attendance.objects.filter(
-#         employee=employee_id,
-#         attendance_type=lop_type,
-#         date_check_in__date__range=(start_date, end_date),
-#         deleted=False
-#     ).count()
-
-
-# def calculate_lop_deduction(gross_salary, month_days, lop_days):
-#     """Calculate LOP deduction from salary"""
-#     return (gross_salary / month_days) * lop_days
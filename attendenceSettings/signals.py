@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from attendence.middleware import install_query_recorder
+from shiftSetting.models import Shift, SubShift
+from .cache import reference_data, shift_index, attendance_status, working_days, archive_boundary
+from .models import Action, Source, AttendanceType, Status, Attendance, Holiday, WeeklyOff, ArchivedPeriod
+from .service import DailySummaryService
+
+
+# Reference data cache invalidation
+for model in (Action, Source, AttendanceType, Status):
+    post_save.connect(reference_data.invalidate_on_commit, sender=model, dispatch_uid=f"reference_data_save_{model.__name__}")
+    post_delete.connect(reference_data.invalidate_on_commit, sender=model, dispatch_uid=f"reference_data_delete_{model.__name__}")
+
+
+# Shift interval index invalidation
+for model in (Shift, SubShift):
+    post_save.connect(shift_index.invalidate_on_commit, sender=model, dispatch_uid=f"shift_index_save_{model.__name__}")
+    post_delete.connect(shift_index.invalidate_on_commit, sender=model, dispatch_uid=f"shift_index_delete_{model.__name__}")
+
+
+# Working-day calendar invalidation
+for model in (Holiday, WeeklyOff):
+    post_save.connect(working_days.invalidate_on_commit, sender=model, dispatch_uid=f"working_days_save_{model.__name__}")
+    post_delete.connect(working_days.invalidate_on_commit, sender=model, dispatch_uid=f"working_days_delete_{model.__name__}")
+
+
+# Archive boundary invalidation
+post_save.connect(archive_boundary.invalidate_on_commit, sender=ArchivedPeriod, dispatch_uid="archive_boundary_save")
+post_delete.connect(archive_boundary.invalidate_on_commit, sender=ArchivedPeriod, dispatch_uid="archive_boundary_delete")
+
+
+# Today status cache invalidation, punches write the new status through themselves
+post_save.connect(attendance_status.invalidate_on_commit, sender=Attendance, dispatch_uid="attendance_status_save")
+post_delete.connect(attendance_status.invalidate_on_commit, sender=Attendance, dispatch_uid="attendance_status_delete")
+
+
+# Daily summary refresh for saves (creates, updates, soft deletes). Punch paths that write with
+# update()/bulk_create() refresh the summary themselves, hard deletes cascade.
+post_save.connect(DailySummaryService.refresh_on_save, sender=Attendance, dispatch_uid="daily_summary_save")
+
+
+# Per-request query metrics (attendence.middleware), every connection needs the execute wrapper
+# from the first one on, including the ones opened before the middleware is loaded
+if getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+    connection_created.connect(install_query_recorder, dispatch_uid="request_metrics_query_recorder")
@@ -1,3 +1,328 @@
+import json
+from datetime import date, datetime, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .cache import archive_boundary, reference_data, shift_index, working_days
+from .models import (
+    Action, ArchivedPeriod, Attendance, AttendanceArchive, AttendanceType, LeaveBalance, LeaveLedgerEntry, LeaveRequest, Status
+)
+from .reports import MusterRollService
+from .service import AttendanceService, LeaveLedgerService, LeaveService
 
-# Create your tests here.
+
+class ListViewQueryCountTest(TestCase):
+    """List views must not fire a query per row when serializing related fields"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.attendance_types = [
+            AttendanceType.objects.create(code=f"T{index}", title=f"Type {index}") for index in range(3)
+        ]
+        self.statuses = [
+            Status.objects.create(code=f"status_{index}", label=f"Status {index}") for index in range(3)
+        ]
+
+    def create_rows(self, start, count):
+        check_in = timezone.make_aware(datetime(2025, 1, 1, 9, 0))
+        for index in range(start, start + count):
+            attendance_type = self.attendance_types[index % 3]
+            Attendance.objects.create(
+                employee=index, attendance_type=attendance_type, date_check_in=check_in + timedelta(days=index)
+            )
+            LeaveRequest.objects.create(
+                employee=index, attendance_type=attendance_type, status=self.statuses[index % 3],
+                start_date=date(2025, 2, 1), end_date=date(2025, 2, 2)
+            )
+            LeaveBalance.objects.create(employee=index, attendance_type=attendance_type, year=2025, total_days=10)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url).json()
+        self.assertEqual(response["status"], "200", response)
+        return len(queries), len(response["data"])
+
+    def test_query_count_does_not_grow_with_rows(self):
+        # LeaveAllocation has no migration yet, so leave-allocation/ can't be covered here
+        urls = [
+            "/attendence/list-attendance/",
+            "/attendence/list-leave-requests/",
+            "/attendence/leave-balance/",
+        ]
+        self.create_rows(0, 1)
+        # Warm the process-local caches (e.g. the archive boundary) before taking the baseline
+        for url in urls:
+            self.count_queries(url)
+        baseline = {url: self.count_queries(url) for url in urls}
+
+        self.create_rows(1, 20)
+        for url in urls:
+            with self.subTest(url=url):
+                queries, rows = self.count_queries(url)
+                self.assertEqual(rows, 21)
+                self.assertEqual(queries, baseline[url][0])
+
+
+class RequestMetricsTest(TestCase):
+    """The metrics middleware must see the queries of sync and async views, under WSGI and ASGI"""
+
+    urls = ["/attendence/list-attendance/", "/attendence/list-attendance-async/"]
+
+    def setUp(self):
+        attendance_type = AttendanceType.objects.create(code="P", title="Present")
+        Attendance.objects.create(employee=1, attendance_type=attendance_type, date_check_in=timezone.now())
+
+    def assertQueriesReported(self, response, logs, url):
+        self.assertNotIn('"0 queries"', response["Server-Timing"], url)
+        self.assertGreater(json.loads(logs.records[0].getMessage())["queries"], 0, url)
+
+    def test_wsgi_query_count(self):
+        for url in self.urls:
+            with self.assertLogs("attendence.requests", "INFO") as logs:
+                response = self.client.get(url)
+            self.assertQueriesReported(response, logs, url)
+
+    async def test_asgi_query_count(self):
+        for url in self.urls:
+            with self.assertLogs("attendence.requests", "INFO") as logs:
+                response = await self.async_client.get(url)
+            self.assertQueriesReported(response, logs, url)
+
+    def test_streaming_export_logged_after_body(self):
+        # Reaching before the archive boundary merges the archived and the hot rows, both read while streaming
+        ArchivedPeriod.objects.create(period=date(2000, 1, 1))
+        archive_boundary.invalidate()
+        response = self.client.get("/attendence/export-attendance/", {"date_from": "2000-01-01"})
+        with self.assertLogs("attendence.requests", "INFO") as logs:
+            body = b"".join(response.streaming_content)
+        metrics = json.loads(logs.records[0].getMessage())
+        self.assertGreater(metrics["queries"], 1)
+        self.assertEqual(metrics["response_bytes"], len(body))
+        self.assertNotIn("Server-Timing", response)
+
+
+class AttendancePunchConcurrencyTest(TestCase):
+    """Check-in relies on the unique (employee, attendance_date) constraint, check-out on a compare-and-set"""
+
+    def setUp(self):
+        AttendanceType.objects.create(code="P", title="Present")
+        AttendanceType.objects.create(code="L", title="Late")
+        Action.objects.create(id=1, name="Check In", code="check_in")
+        Action.objects.create(id=2, name="Check Out", code="check_out")
+        # Invalidation runs on commit, which never happens inside a TestCase
+        reference_data.invalidate()
+        shift_index.invalidate()
+        self.check_in = timezone.make_aware(datetime(2025, 1, 6, 9, 0))
+
+    def punch(self, action_type, hour=9):
+        return AttendanceService.process_attendance_punch(5, action_type, custom_timestamp=self.check_in.replace(hour=hour))
+
+    def test_second_check_in_is_already_checked_in(self):
+        self.assertNotIn("error", self.punch(1))
+        response = self.punch(1, hour=10)
+        self.assertEqual(response["error"], "Employee is already checked in today")
+
+        # A racer that passed the checks still loses on the constraint and gets the existing record
+        existing = Attendance.objects.get()
+        racer = Attendance(employee=5, date_check_in=self.check_in, attendance_date=existing.attendance_date)
+        attendance, created = AttendanceService._insert_check_in(racer)
+        self.assertFalse(created)
+        self.assertEqual(attendance.pk, existing.pk)
+        self.assertEqual(Attendance.objects.count(), 1)
+
+    def test_second_check_out_loses_compare_and_set(self):
+        self.punch(1)
+        first, second = Attendance.objects.get(), Attendance.objects.get()
+        first.date_check_out = self.check_in.replace(hour=17)
+        second.date_check_out = self.check_in.replace(hour=18)
+        self.assertTrue(AttendanceService._save_check_out(first))
+        self.assertFalse(AttendanceService._save_check_out(second))
+        self.assertEqual(Attendance.objects.get().date_check_out, first.date_check_out)
+        self.assertEqual(self.punch(2, hour=19)["error"], "No check-in record found for today")
+
+    def test_soft_deleted_record_does_not_block_check_in(self):
+        self.punch(1)
+        Attendance.objects.soft_delete()
+        self.assertNotIn("error", self.punch(1, hour=10))
+        self.assertEqual(Attendance.objects.count(), 2)
+        self.assertEqual(Attendance.objects.alive().get().date_check_in, self.check_in.replace(hour=10))
+
+
+class MusterRollBuildTest(TestCase):
+
+    def test_day_in_archive_and_hot_table_counts_once(self):
+        present = AttendanceType.objects.create(code="P", title="Present")
+        reference_data.invalidate()
+        # Archive rows are loaded first, the hot-table row of the same day comes last and wins
+        attendance_rows = [(1, 6, present.id, False, 30), (1, 7, present.id, False, 10), (1, 6, present.id, True, 45)]
+        muster = MusterRollService.build(2025, 1, attendance_rows, [])
+        self.assertEqual(muster["totals"]["overtime_minutes"].tolist(), [55])
+        self.assertEqual(muster["totals"]["present"].tolist(), [2])
+        self.assertEqual(muster["totals"]["late"].tolist(), [1])
+
+
+class LeaveLedgerTest(TestCase):
+    """LeaveBalance rows are running totals of the ledger, kept with F() updates"""
+
+    def setUp(self):
+        self.sick = AttendanceType.objects.create(code="SL", title="Sick Leave", is_leave=True)
+        self.casual = AttendanceType.objects.create(code="CL", title="Casual Leave", is_leave=True)
+        for code in ("pending", "approved", "rejected", "cancelled"):
+            Status.objects.create(code=code, label=code.title())
+        reference_data.invalidate()
+        working_days.invalidate()
+        self.year = timezone.now().year
+
+    def leave_request(self, employee, attendance_type, start_day, end_day):
+        return LeaveRequest.objects.create(
+            employee=employee, attendance_type=attendance_type, status=reference_data.get_by_code("status", "pending"),
+            start_date=date(self.year, 3, start_day), end_date=date(self.year, 3, end_day)
+        )
+
+    def balance(self, employee=1, attendance_type=None):
+        balance = LeaveBalance.objects.get(employee=employee, attendance_type=attendance_type or self.sick, year=self.year)
+        return balance.total_days, balance.used_days, balance.remaining_days
+
+    def ledger_totals(self, employee=1):
+        entries = LeaveLedgerEntry.objects.filter(employee=employee, attendance_type=self.sick, year=self.year)
+        granted = sum(entry.days for entry in entries if entry.entry_type == LeaveLedgerEntry.GRANT)
+        used = sum(
+            -entry.days if entry.entry_type == LeaveLedgerEntry.CANCEL else entry.days
+            for entry in entries if entry.entry_type != LeaveLedgerEntry.GRANT
+        )
+        return granted, used, granted - used
+
+    def test_approve_then_cancel_keeps_balance_and_ledger_consistent(self):
+        LeaveLedgerService.set_balance(1, self.sick.id, self.year, total_days=10)
+        leave_request = self.leave_request(1, self.sick, 3, 5)  # Monday to Wednesday
+
+        LeaveService.approve_leave_request(leave_request.id, 99)
+        self.assertEqual(self.balance(), (10, 3, 7))
+        self.assertEqual(self.balance(), self.ledger_totals())
+
+        LeaveService.cancel_leave_request(leave_request.id)
+        self.assertEqual(self.balance(), (10, 0, 10))
+        self.assertEqual(self.balance(), self.ledger_totals())
+        self.assertEqual(
+            list(leave_request.ledger_entries.values_list("entry_type", "days")),
+            [(LeaveLedgerEntry.CONSUME, 3), (LeaveLedgerEntry.CANCEL, 3)]
+        )
+
+    def test_change_below_zero_raises_and_writes_nothing(self):
+        LeaveLedgerService.set_balance(1, self.sick.id, self.year, total_days=5, used_days=2)
+        entries = LeaveLedgerEntry.objects.count()
+        for entry_type, days in ((LeaveLedgerEntry.GRANT, -6), (LeaveLedgerEntry.ADJUST, -3)):
+            with self.subTest(entry_type=entry_type):
+                with self.assertRaises(ValueError):
+                    LeaveLedgerService.record(1, self.sick.id, self.year, entry_type, days)
+                self.assertEqual(LeaveLedgerEntry.objects.count(), entries)
+                self.assertEqual(self.balance(), (5, 2, 3))
+
+    def test_rebuild_reproduces_balances(self):
+        LeaveLedgerService.set_balance(1, self.sick.id, self.year, total_days=10, used_days=1)
+        LeaveLedgerService.set_balance(2, self.casual.id, self.year, total_days=4)
+        LeaveLedgerService.record(1, self.sick.id, self.year, LeaveLedgerEntry.GRANT, -2)
+        approved = self.leave_request(1, self.sick, 3, 4)
+        LeaveService.approve_leave_request(approved.id, 99)
+        cancelled = self.leave_request(2, self.casual, 10, 12)
+        LeaveService.approve_leave_request(cancelled.id, 99)
+        LeaveService.cancel_leave_request(cancelled.id)
+
+        fields = ("employee", "attendance_type", "year", "total_days", "used_days", "remaining_days")
+        maintained = list(LeaveBalance.objects.order_by("id").values_list(*fields))
+        LeaveBalance.objects.update(total_days=0, used_days=0, remaining_days=0)
+        LeaveLedgerService.rebuild()
+        self.assertEqual(list(LeaveBalance.objects.order_by("id").values_list(*fields)), maintained)
+        self.assertEqual(maintained[0][3:], (8, 3, 5))
+
+    def test_bulk_approve_results_and_balances(self):
+        unpaid = AttendanceType.objects.create(code="LOP", title="Loss of Pay", is_leave=True, is_paid_leave=False)
+        reference_data.invalidate()
+        LeaveLedgerService.set_balance(1, self.sick.id, self.year, total_days=2)
+        LeaveLedgerService.set_balance(2, self.sick.id, self.year, total_days=5)
+        first, second, over_balance = (self.leave_request(1, self.sick, day, day) for day in (3, 4, 5))
+        two_days = self.leave_request(2, self.sick, 10, 11)
+        already_approved = self.leave_request(2, self.sick, 12, 12)
+        LeaveService.approve_leave_request(already_approved.id, 99)
+        loss_of_pay = self.leave_request(3, unpaid, 17, 18)
+
+        ids = [first.id, second.id, first.id, over_balance.id, two_days.id, already_approved.id, loss_of_pay.id, 999999]
+        outcome = LeaveService.bulk_action(ids, "approve", 99)
+        self.assertEqual(
+            [(result["id"], result["success"], result.get("message")) for result in outcome["results"]],
+            [
+                (first.id, True, None),
+                (second.id, True, None),
+                (over_balance.id, False, "Insufficient leave balance, required: 1 days, available: 0 days"),
+                (two_days.id, True, None),
+                (already_approved.id, False, "Leave request is already Approved"),
+                (loss_of_pay.id, True, None),
+                (999999, False, "Leave request not found"),
+            ]
+        )
+        self.assertEqual((outcome["processed"], outcome["failed"]), (4, 3))
+        self.assertEqual(self.balance(1), (2, 2, 0))
+        self.assertEqual(self.balance(2), (5, 3, 2))
+        self.assertEqual(self.balance(3, unpaid), (0, 2, -2))
+        self.assertEqual(LeaveRequest.objects.get(id=over_balance.id).status.code, "pending")
+
+
+class AttendanceArchiveRoundTripTest(TestCase):
+    """Archived months move to the archive tier once and are still read back by the list, export and muster"""
+
+    def setUp(self):
+        present = AttendanceType.objects.create(code="P", title="Present")
+        reference_data.invalidate()
+        shift_index.invalidate()
+        archive_boundary.invalidate()
+        self.ids = [
+            Attendance.objects.create(
+                employee=employee, company=1, attendance_type=present,
+                date_check_in=timezone.make_aware(datetime(2025, month, day, 9, employee))
+            ).id
+            for month in (1, 2, 3) for day in (3, 17) for employee in (1, 2)
+        ]
+
+    def archive(self, before):
+        out = StringIO()
+        call_command("archive_attendance", "--before", before, stdout=out)
+        # The boundary cache is invalidated on commit, which never happens inside a TestCase
+        archive_boundary.invalidate()
+        return out.getvalue()
+
+    def test_archive_then_read_back(self):
+        output = self.archive("2025-03-01")
+        self.assertIn("2025-01: 4 records archived", output)
+        self.assertIn("2025-02: 4 records archived", output)
+        hot_ids = set(Attendance.objects.values_list("id", flat=True))
+        archived_ids = set(AttendanceArchive.objects.values_list("id", flat=True))
+        self.assertEqual(len(hot_ids), 4)
+        self.assertEqual(len(archived_ids), 8)
+        self.assertFalse(hot_ids & archived_ids)
+        self.assertEqual(hot_ids | archived_ids, set(self.ids))
+        self.assertEqual(
+            list(ArchivedPeriod.objects.order_by("period").values_list("period", "rows")),
+            [(date(2025, 1, 1), 4), (date(2025, 2, 1), 4)]
+        )
+        self.assertEqual(archive_boundary.get(), date(2025, 3, 1))
+
+        # Re-running moves nothing twice
+        self.assertIn("Archived 0 months", self.archive("2025-03-01"))
+        self.assertEqual(AttendanceArchive.objects.count(), 8)
+        self.assertEqual(sum(ArchivedPeriod.objects.values_list("rows", flat=True)), 8)
+
+        response = self.client.get("/attendence/list-attendance/", {"page_size": 50}).json()
+        self.assertEqual([row["id"] for row in response["data"]], sorted(self.ids, reverse=True))
+        response = self.client.get("/attendence/list-attendance/", {"date_from": "2025-02-01", "date_to": "2025-02-28"}).json()
+        self.assertEqual(len(response["data"]), 4)
+
+        response = self.client.get("/attendence/export-attendance/")
+        exported = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(sorted(row["id"] for row in exported), sorted(self.ids))
+
+        response = self.client.get("/attendence/muster-roll/", {"year": 2025, "month": 2, "employee": [1, 2]}).json()
+        self.assertEqual([employee["totals"]["present"] for employee in response["data"]["employees"]], [2, 2])
@@ -13,6 +13,7 @@ urlpatterns = [
     
     #leave approval
     path('approve-leave-request/<int:pk>/', LeaveApprovalView.as_view()),     
+    path('bulk-approve-leave-requests/', LeaveBulkApprovalView.as_view()),
     path('cancel-leave-request/<int:pk>/', LeaveCancellationView.as_view()),     
     
     #leave allocation
@@ -29,9 +30,11 @@ urlpatterns = [
     path('put-leave-balance/<int:pk>/', LeaveBalanceUpdateView.as_view(), name='put-leave-balance'),
     path('delete-leave-balance/<int:pk>/', LeaveBalanceDeleteView.as_view(), name='delete-leave-balance'),
     path('adjust-leave-balance/', LeaveBalanceAdjustmentView.as_view(), name='adjust-leave-balance'),
+    path('leave-ledger/', LeaveLedgerListView.as_view(), name='leave-ledger'),
 
     #leave settings
     path('create-leave-settings/', LeaveSettingCreateView.as_view(), name='create-leave-settings'),
+    path('bulk-upsert-leave-settings/', LeaveSettingBulkUpsertView.as_view(), name='bulk-upsert-leave-settings'),
 
     #leave details
     path('leave-details/', LeaveDetailListView.as_view(), name='leave-details'),
@@ -41,6 +44,15 @@ urlpatterns = [
     path('delete-leave-detail/<int:pk>/', LeaveDetailDeleteView.as_view(), name='delete-leave-detail'),
     path('leave-detail-attendance-types/', LeaveDetailAttendanceTypesView.as_view(), name='leave-detail-attendance-types'),
     
+    #holiday calendar
+    path('list-holidays/', HolidayListView.as_view(), name='list-holidays'),
+    path('create-holiday/', HolidayCreateView.as_view(), name='create-holiday'),
+    path('delete-holiday/<int:pk>/', HolidayDeleteView.as_view(), name='delete-holiday'),
+    path('list-weekly-offs/', WeeklyOffListView.as_view(), name='list-weekly-offs'),
+    path('create-weekly-off/', WeeklyOffCreateView.as_view(), name='create-weekly-off'),
+    path('delete-weekly-off/<int:pk>/', WeeklyOffDeleteView.as_view(), name='delete-weekly-off'),
+    path('working-days/', WorkingDaysView.as_view(), name='working-days'),
+    
     #status management
     path('list-status/', StatusListView.as_view(), name='list-status'),
     path('create-status/', StatusCreateView.as_view(), name='create-status'),
@@ -59,6 +71,9 @@ urlpatterns = [
   
     #attendance settings
     path('list-attendance/', AttendanceListView.as_view()),                   
+    path('export-attendance/', AttendanceExportView.as_view()),
+    path('muster-roll/', MusterRollView.as_view()),
+    path('payroll-feed/', PayrollFeedView.as_view()),
     path('create-attendance/', AttendanceCreateView.as_view()),              
     path('get-attendance/<int:pk>/', AttendanceRetrieveView.as_view()),      
     path('put-attendance/<int:pk>/', AttendanceUpdateView.as_view()),        
@@ -67,6 +82,13 @@ urlpatterns = [
   
     # Unified attendance punch - More scalable
     path('attendance-punch/', AttendancePunchView.as_view()),                
+    path('attendance-punch/bulk/', AttendanceBulkPunchView.as_view()),       
+    path('attendance-punch/ticket/<uuid:ticket>/', AttendancePunchTicketView.as_view()),
+
+    #async (ASGI) endpoints
+    path('attendance-punch-async/', AsyncAttendancePunchView.as_view()),
+    path('list-attendance-async/', AsyncAttendanceListView.as_view()),
+    path('list-leave-requests-async/', AsyncLeaveRequestListView.as_view()),
     
     #status management
     path('list-status/', StatusListView.as_view(), name='list-status'),
@@ -1,7 +1,10 @@
+import csv
 from datetime import datetime, timedelta, time
 from django.utils import timezone
 from django.db import transaction
 from .models import *
+from .cache import shift_index, reference_data, working_days
+from rest_framework.utils.encoders import JSONEncoder
 
 
 # Time calculation utilities
@@ -70,6 +73,40 @@ def calculate_late_minutes(attendance, check_in_time, grace_period_minutes=15):
         return 0
 
 
+def is_night_shift(sub_shift):
+    """Check if a sub-shift wraps midnight (end time earlier than start time)"""
+    return bool(
+        sub_shift and sub_shift.time_start and sub_shift.time_end
+        and sub_shift.time_end < sub_shift.time_start
+    )
+
+
+def get_business_date(timestamp, sub_shift=None):
+    """
+    Get the business date of a punch
+    The part of a night shift after midnight belongs to the day the shift started
+    """
+    local_time = timezone.localtime(timestamp) if timezone.is_aware(timestamp) else timestamp
+    business_date = local_time.date()
+    if is_night_shift(sub_shift) and local_time.time() <= sub_shift.time_end:
+        business_date -= timedelta(days=1)
+    return business_date
+
+
+def is_open_for_check_out(attendance, check_out_time, today):
+    """
+    Check if an open attendance record can be checked out at check_out_time
+    Records from the previous business date only qualify for night shifts,
+    until the next occurrence of the shift starts
+    """
+    if attendance.attendance_date == today:
+        return True
+    if attendance.attendance_date == today - timedelta(days=1) and is_night_shift(attendance.sub_shift):
+        local_time = timezone.localtime(check_out_time) if timezone.is_aware(check_out_time) else check_out_time
+        return local_time.time() < attendance.sub_shift.time_start
+    return False
+
+
 def validate_check_in_time(sub_shift, check_in_time, allow_early_check_in=True, early_buffer_minutes=30):
     """
     Validate if check-in time is within acceptable range for the sub-shift
@@ -279,10 +316,9 @@ def get_or_create_attendance(employee_id, date, default_type):
     try:
         # First try to get existing attendance for today
         try:
-            attendance = Attendance.objects.get(
+            attendance = Attendance.objects.alive().get(
                 employee=employee_id,
-                date_check_in__date=date,
-                deleted=False
+                attendance_date=date
             )
             return attendance, False
         except Attendance.DoesNotExist:
@@ -305,8 +341,8 @@ def get_or_create_attendance(employee_id, date, default_type):
         return attendance, True
 
 
-def get_employee_ids():
-    """Get all employee IDs"""
+def get_employee_ids(company_id=None):
+    """Get all employee IDs (of a company)"""
     # This would typically query an Employee model
     # For now, return a list of test employee IDs
     return [1, 2, 3, 4, 5]
@@ -318,26 +354,9 @@ def get_active_shift_for_employee(employee_id, company_id=1):
     Returns: (shift, sub_shift) tuple or (None, None) if not found
     """
     try:
-        from shiftSetting.models import Shift, SubShift
-        
-        # First try to get the default/active shift for the company
-        # For now, we'll get the first active shift available
-        shift = Shift.objects.filter(
-            company=company_id,
-            deleted=False
-        ).first()
-        
-        if not shift:
-            return None, None
-        
-        # Get the active sub-shift for this shift
-        sub_shift = SubShift.objects.filter(
-            shift=shift,
-            active=True,
-            deleted=False
-        ).first()
-        
-        return shift, sub_shift
+        # For now, the default shift is the first active shift of the company
+        # together with its first active sub-shift
+        return shift_index.default_for(company_id)
         
     except Exception as e:
         # If any error occurs, return None values
@@ -350,76 +369,103 @@ def get_shift_by_time(employee_id, check_in_time, company_id=1):
     This can be used to assign different shifts based on time of day
     """
     try:
-        from shiftSetting.models import Shift, SubShift
-        from datetime import time
-        
-        # Get all available shifts for the company
-        shifts = Shift.objects.filter(
-            company=company_id,
-            deleted=False
-        )
-        
-        for shift in shifts:
-            # Get sub-shifts for this shift
-            sub_shifts = SubShift.objects.filter(
-                shift=shift,
-                active=True,
-                deleted=False
-            )
-            
-            for sub_shift in sub_shifts:
-                if sub_shift.time_start and sub_shift.time_end:
-                    # Check if check-in time falls within this sub-shift
-                    if sub_shift.time_start <= check_in_time.time() <= sub_shift.time_end:
-                        return shift, sub_shift
-        
-        # If no specific shift found, return the first available
-        return get_active_shift_for_employee(employee_id, company_id)
+        # Served from the per-company interval index; falls back to the
+        # default shift when no sub-shift window contains the check-in time
+        return shift_index.lookup(company_id, check_in_time)
         
     except Exception as e:
         # If any error occurs, return None values
         return None, None
 
 
-def auto_mark_absent(date=None):
-    """Auto mark absent for employees who haven't checked in"""
+async def aget_shift_by_time(employee_id, check_in_time, company_id=1):
+    """Async variant of get_shift_by_time for the ASGI views"""
+    try:
+        return await shift_index.alookup(company_id, check_in_time)
+        
+    except Exception as e:
+        return None, None
+
+
+def auto_mark_absent(date=None, company_id=1, employee_ids=None, batch_size=500):
+    """
+    Auto mark absent for employees who haven't checked in.
+    Set-based: the employees with a record for the business date and the approved leaves covering
+    it are read once, the rest of the roster is inserted with bulk_create in chunks. Employees on
+    approved leave get the leave's attendance type instead of "A". Weekly offs and holidays of the
+    company are skipped.
+    Returns: number of employees marked
+    """
     if date is None:
         date = timezone.localdate()
-    
+
+    if not working_days.is_working_day(company_id, date):
+        return 0
+
     # Get all employee IDs
-    employee_ids = get_employee_ids()
+    if employee_ids is None:
+        employee_ids = get_employee_ids(company_id)
     
     # Get absent attendance type
-    try:
-        absent_type = AttendanceType.objects.get(code='A', deleted=False)
-    except AttendanceType.DoesNotExist:
-        return
+    absent_type = reference_data.get_by_code('attendance_type', 'A')
+    if not absent_type:
+        return 0
     
-    # Mark absent for employees who haven't checked in
-    for employee_id in employee_ids:
-        attendance_exists = Attendance.objects.filter(
-            employee=employee_id,
-            date_check_in__date=date,
-            deleted=False
-        ).exists()
-        
-        if not attendance_exists:
-            Attendance.objects.create(
-                employee=employee_id,
-                attendance_type=absent_type,
-                action_type='absent',
-                date_check_in=timezone.make_aware(datetime.combine(date, datetime.min.time())),
-                company=1
+    # Employees that already have a live record for the day
+    recorded = set(
+        Attendance.objects.alive().filter(attendance_date=date).values_list('employee', flat=True)
+    )
+    missing = [employee_id for employee_id in dict.fromkeys(employee_ids) if employee_id not in recorded]
+    if not missing:
+        return 0
+    
+    # Approved leaves covering the day
+    leave_types = {}
+    approved_status = reference_data.get_by_code('status', 'approved')
+    if approved_status:
+        approved_leaves = LeaveRequest.objects.alive().filter(
+            status=approved_status,
+            start_date__lte=date,
+            end_date__gte=date,
+            attendance_type__isnull=False
+        ).order_by('id').values_list('employee', 'attendance_type')
+        for employee_id, attendance_type_id in approved_leaves:
+            leave_types.setdefault(employee_id, attendance_type_id)
+    
+    from .service import DailySummaryService
+    day_start = timezone.make_aware(datetime.combine(date, datetime.min.time()))
+    created = 0
+    for start in range(0, len(missing), batch_size):
+        chunk = missing[start:start + batch_size]
+        with transaction.atomic():
+            # ignore_conflicts: an employee who punched in the meantime keeps that record
+            Attendance.objects.bulk_create([
+                Attendance(
+                    employee=employee_id,
+                    company=company_id,
+                    attendance_type_id=leave_types.get(employee_id, absent_type.id),
+                    date_check_in=day_start,
+                    attendance_date=date
+                )
+                for employee_id in chunk
+            ], ignore_conflicts=True)
+            
+            # bulk_create skips save() and signals, refresh the daily summary from what is stored now
+            records = list(
+                Attendance.objects.alive().filter(attendance_date=date, employee__in=chunk).select_related('attendance_type')
             )
+            DailySummaryService.refresh_records(records)
+        # Punches always carry an action, records marked here don't
+        created += sum(1 for record in records if record.action_id is None)
+    return created
 
 
 def get_attendance_summary(employee_id, date):
     """Get attendance summary for employee on specific date"""
     try:
-        attendance = Attendance.objects.get(
+        attendance = Attendance.objects.alive().get(
             employee=employee_id,
-            date_check_in__date=date,
-            deleted=False
+            attendance_date=date
         )
         
         summary = {
@@ -460,10 +506,9 @@ def get_employee_attendance_status(employee_id):
         today = timezone.localdate()
         
         # Get today's attendance record
-        attendance = Attendance.objects.filter(
+        attendance = Attendance.objects.alive().filter(
             employee=employee_id,
-            date_check_in__date=today,
-            deleted=False
+            attendance_date=today
         ).first()
         
         if not attendance:
@@ -502,10 +547,9 @@ def validate_attendance_punch(employee_id, action_type):
         
         if action_type == "check_in":
             # Check if already checked in today
-            existing_attendance = Attendance.objects.filter(
+            existing_attendance = Attendance.objects.alive().filter(
                 employee=employee_id,
-                date_check_in__date=today,
-                deleted=False
+                attendance_date=today
             ).first()
             
             if existing_attendance:
@@ -514,15 +558,14 @@ def validate_attendance_punch(employee_id, action_type):
             return True, "Valid check-in request"
         
         elif action_type == "check_out":
-            # Check if checked in today
-            attendance = Attendance.objects.filter(
+            # Check if checked in today (or on a night shift that started yesterday)
+            attendance = Attendance.objects.alive().filter(
                 employee=employee_id,
-                date_check_in__date=today,
-                date_check_out__isnull=True,
-                deleted=False
-            ).first()
+                attendance_date__range=(today - timedelta(days=1), today),
+                date_check_out__isnull=True
+            ).select_related('sub_shift').order_by('-attendance_date', '-date_check_in').first()
             
-            if not attendance:
+            if not attendance or not is_open_for_check_out(attendance, timezone.localtime(), today):
                 return False, "No check-in record found for today"
             
             if attendance.date_check_out:
@@ -537,6 +580,50 @@ def validate_attendance_punch(employee_id, action_type):
         return False, f"Error validating attendance punch: {str(e)}"
 
 
+# Streaming export helpers
+class _EchoBuffer:
+    """File-like object for csv.writer that hands back the line instead of storing it"""
+    def write(self, value):
+        return value
+
+
+def _batched(lines, batch_size=500):
+    """Join lines into bigger chunks so the response isn't written one row at a time"""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def stream_ndjson(rows):
+    """Yield rows (dicts) as newline-delimited JSON"""
+    encoder = JSONEncoder(separators=(",", ":"))
+    return _batched(encoder.encode(row) + "\n" for row in rows)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        # dates and datetimes
+        return value.isoformat()
+    return value
+
+
+def stream_csv(rows, fields):
+    """Yield a header and then rows (dicts) as CSV lines"""
+    writer = csv.writer(_EchoBuffer())
+    def lines():
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([_csv_value(row[field]) for field in fields])
+    return _batched(lines())
+
+
 # Legacy functions for backward compatibility
 def get_open_punch(attendance):
     """Legacy function - now returns None as we don't use punches"""
@@ -546,11 +633,10 @@ def get_open_punch(attendance):
 def check_duplicate_punch(attendance, action_code):
     """Legacy function - check if action already exists for today"""
     today = timezone.localdate()
-    return Attendance.objects.filter(
+    return Attendance.objects.alive().filter(
         employee=attendance.employee,
         action_type=action_code,
-        date_check_in__date=today,
-        deleted=False
+        attendance_date=today
     ).exists()
 
 
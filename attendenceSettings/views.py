@@ -1,20 +1,35 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.utils.encoders import JSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from asgiref.sync import sync_to_async
+import io
+import json
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
-from datetime import datetime, time
+from datetime import date, datetime, time
 from .models import *
 from .serializers import *
-from .service import AttendanceService, LeaveService
+from .service import AttendanceService, AttendanceArchiveService, LeaveService, LeaveLedgerService, LeaveSettingService, PunchQueueService
+from .pagination import AttendanceKeysetPagination, InvalidCursor
+from .reports import MusterRollService, PayrollService, ReportDependencyError
+from .cache import working_days
+from .db_router import read_only
 from .utils import *
 
 # LEAVE REQUEST MANAGEMENT VIEWS
 class LeaveRequestListView(APIView):
     """List all leave requests"""
+    @read_only
     def get(self, request):
         try:
-            leave_requests = LeaveRequest.objects.filter(deleted=False)
+            leave_requests = LeaveRequest.objects.alive().select_related('attendance_type', 'status')
             serializer = LeaveRequestSerializer(leave_requests, many=True)
             return Response({"data": serializer.data, "status": "200"})
         except Exception as e:
@@ -37,7 +52,7 @@ class LeaveRequestRetrieveView(APIView):
     """Get a specific leave request by ID"""
     def get(self, request, pk):
         try:
-            obj = LeaveRequest.objects.get(pk=pk, deleted=False)
+            obj = LeaveRequest.objects.alive().get(pk=pk)
             serializer = LeaveRequestSerializer(obj)
             return Response({"data": serializer.data, "status": "200"})
         except LeaveRequest.DoesNotExist:
@@ -48,7 +63,7 @@ class LeaveRequestUpdateView(APIView):
     def put(self, request, pk):
         try:
             with transaction.atomic():
-                obj = LeaveRequest.objects.get(pk=pk, deleted=False)
+                obj = LeaveRequest.objects.alive().get(pk=pk)
                 serializer = LeaveRequestSerializer(obj, data=request.data)
                 if serializer.is_valid():
                     serializer.save()
@@ -62,7 +77,7 @@ class LeaveRequestDeleteView(APIView):
     def delete(self, request, pk):
         try:
             with transaction.atomic():
-                obj = LeaveRequest.objects.get(pk=pk, deleted=False)
+                obj = LeaveRequest.objects.alive().get(pk=pk)
                 obj.deleted = True
                 obj.save()
                 return Response({"data": "Leave request deleted successfully", "status": "200"})
@@ -89,6 +104,20 @@ class LeaveApprovalView(APIView):
         except Exception as e:
             return Response({"error": str(e), "status": "500"})
 
+class LeaveBulkApprovalView(APIView):
+    """Approve or reject a list of leave requests, with a result per id"""
+    def post(self, request):
+        try:
+            serializer = LeaveBulkActionSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response({"error": serializer.errors, "status": "400"})
+            
+            data = serializer.validated_data
+            result = LeaveService.bulk_action(data['ids'], data['action'], data.get('approved_by'), data['remarks'])
+            return Response({"data": result, "status": "200"})
+        except Exception as e:
+            return Response({"error": str(e), "status": "500"})
+
 class LeaveCancellationView(APIView):
     """Cancel a leave request"""
     def post(self, request, pk):
@@ -103,9 +132,10 @@ class LeaveCancellationView(APIView):
 
 class LeaveAllocationListView(APIView):
     """List all leave allocations"""
+    @read_only
     def get(self, request):
         try:
-            leave_allocations = LeaveAllocation.objects.filter(deleted=False)
+            leave_allocations = LeaveAllocation.objects.alive().select_related('attendance_type')
             serializer = LeaveAllocationSerializer(leave_allocations, many=True)
             return Response({"data": serializer.data, "status": "200"})
         except Exception as e:
@@ -128,7 +158,7 @@ class LeaveAllocationRetrieveView(APIView):
     """Get a specific leave allocation by ID"""
     def get(self, request, pk):
         try:
-            obj = LeaveAllocation.objects.get(pk=pk, deleted=False)
+            obj = LeaveAllocation.objects.alive().get(pk=pk)
             serializer = LeaveAllocationSerializer(obj)
             return Response({"data": serializer.data, "status": "200"})
         except LeaveAllocation.DoesNotExist:
@@ -139,7 +169,7 @@ class LeaveAllocationUpdateView(APIView):
     def put(self, request, pk):
         try:
             with transaction.atomic():
-                obj = LeaveAllocation.objects.get(pk=pk, deleted=False)
+                obj = LeaveAllocation.objects.alive().get(pk=pk)
                 serializer = LeaveAllocationSerializer(obj, data=request.data)
                 if serializer.is_valid():
                     serializer.save()
@@ -153,7 +183,7 @@ class LeaveAllocationDeleteView(APIView):
     def delete(self, request, pk):
         try:
             with transaction.atomic():
-                obj = LeaveAllocation.objects.get(pk=pk, deleted=False)
+                obj = LeaveAllocation.objects.alive().get(pk=pk)
                 obj.deleted = True
                 obj.save()
                 return Response({"data": "Leave allocation deleted successfully", "status": "200"})
@@ -165,23 +195,28 @@ class LeaveAllocationDeleteView(APIView):
 
 class LeaveBalanceListView(APIView):
     """List all leave balances"""
+    @read_only
     def get(self, request):
         try:
-            leave_balances = LeaveBalance.objects.filter(deleted=False)
+            leave_balances = LeaveBalance.objects.alive().select_related('attendance_type')
             serializer = LeaveBalanceSerializer(leave_balances, many=True)
             return Response({"data": serializer.data, "status": "200"})
         except Exception as e:
             return Response({"error": str(e), "status": "500"})
 
 class LeaveBalanceCreateView(APIView):
-    """Create a new leave balance"""
+    """Create a new leave balance (the opening totals are written to the leave ledger)"""
     def post(self, request):
         try:
             with transaction.atomic():
                 serializer = LeaveBalanceSerializer(data=request.data)
                 if serializer.is_valid():
-                    serializer.save()
-                    return Response({"data": serializer.data, "status": "200"})
+                    data = serializer.validated_data
+                    balance = LeaveLedgerService.set_balance(
+                        data.get('employee'), data['attendance_type'].id if data.get('attendance_type') else None, data.get('year'),
+                        data.get('total_days') or 0, data.get('used_days') or 0, remarks="Opening balance"
+                    )
+                    return Response({"data": LeaveBalanceSerializer(balance).data, "status": "200"})
                 return Response({"error": serializer.errors, "status": "500"})
         except Exception as e:
             return Response({"error": str(e), "status": "500"})
@@ -190,7 +225,7 @@ class LeaveBalanceRetrieveView(APIView):
     """Get a specific leave balance by ID"""
     def get(self, request, pk):
         try:
-            obj = LeaveBalance.objects.get(pk=pk, deleted=False)
+            obj = LeaveBalance.objects.alive().get(pk=pk)
             serializer = LeaveBalanceSerializer(obj)
             return Response({"data": serializer.data, "status": "200"})
         except LeaveBalance.DoesNotExist:
@@ -201,11 +236,18 @@ class LeaveBalanceUpdateView(APIView):
     def put(self, request, pk):
         try:
             with transaction.atomic():
-                obj = LeaveBalance.objects.get(pk=pk, deleted=False)
+                obj = LeaveBalance.objects.alive().get(pk=pk)
                 serializer = LeaveBalanceSerializer(obj, data=request.data)
                 if serializer.is_valid():
-                    serializer.save()
-                    return Response({"data": serializer.data, "status": "200"})
+                    data = serializer.validated_data
+                    if (data.get('employee'), data.get('attendance_type'), data.get('year')) != (obj.employee, obj.attendance_type, obj.year):
+                        return Response({"error": "Employee, attendance type and year of a leave balance can't be changed", "status": "500"})
+                    # Totals change through the leave ledger
+                    balance = LeaveLedgerService.set_balance(
+                        obj.employee, obj.attendance_type_id, obj.year,
+                        data.get('total_days'), data.get('used_days'), remarks="Balance updated"
+                    )
+                    return Response({"data": LeaveBalanceSerializer(balance).data, "status": "200"})
                 return Response({"error": serializer.errors, "status": "500"})
         except LeaveBalance.DoesNotExist:
             return Response({"error": "Leave balance not found", "status": "500"})
@@ -215,7 +257,7 @@ class LeaveBalanceDeleteView(APIView):
     def delete(self, request, pk):
         try:
             with transaction.atomic():
-                obj = LeaveBalance.objects.get(pk=pk, deleted=False)
+                obj = LeaveBalance.objects.alive().get(pk=pk)
                 obj.deleted = True
                 obj.save()
                 return Response({"data": "Leave balance deleted successfully", "status": "200"})
@@ -228,24 +270,42 @@ class LeaveBalanceAdjustmentView(APIView):
         try:
             with transaction.atomic():
                 employee_id = request.data.get('employee')
-                leave_type_id = request.data.get('leave_type')
-                adjustment_days = request.data.get('adjustment_days', 0)
+                attendance_type_id = request.data.get('attendance_type', request.data.get('leave_type'))
+                adjustment_days = int(request.data.get('adjustment_days', 0))
                 year = request.data.get('year', timezone.now().year)
                 
-                LeaveService.update_leave_balance(employee_id, leave_type_id, adjustment_days, year)
+                LeaveService.update_leave_balance(
+                    employee_id, attendance_type_id, adjustment_days, year,
+                    remarks=request.data.get('remarks', ''), created_by=request.data.get('adjusted_by')
+                )
                 result = {"message": f"Leave balance adjusted by {adjustment_days} days"}
                 return Response({"data": result, "status": "200"})
         except Exception as e:
             return Response({"error": str(e), "status": "500"})
 
 
+class LeaveLedgerListView(APIView):
+    """List leave ledger entries (?employee=, ?attendance_type=, ?year=)"""
+    @read_only
+    def get(self, request):
+        try:
+            entries = LeaveLedgerEntry.objects.select_related('attendance_type')
+            for field in ('employee', 'attendance_type', 'year'):
+                value = request.query_params.get(field)
+                if value:
+                    entries = entries.filter(**{field: value})
+            serializer = LeaveLedgerEntrySerializer(entries, many=True)
+            return Response({"data": serializer.data, "status": "200"})
+        except Exception as e:
+            return Response({"error": str(e), "status": "500"})
+
 # LEAVE DETAIL MANAGEMENT VIEWS
 
 class LeaveDetailListView(APIView):
     """List all leave details"""
     def get(self, request):
         try:
-            leave_details = LeaveDetail.objects.filter(deleted=False)
+            leave_details = LeaveDetail.objects.alive().select_related('attendance_type', 'company')
             serializer = LeaveDetailSerializer(leave_details, many=True)
             return Response({"data": serializer.data, "status": "200"})
         except Exception as e:
@@ -268,7 +328,7 @@ class LeaveDetailRetrieveView(APIView):
     """Get a specific leave detail by ID"""
     def get(self, request, pk):
         try:
-            obj = LeaveDetail.objects.get(pk=pk, deleted=False)
+            obj = LeaveDetail.objects.alive().get(pk=pk)
             serializer = LeaveDetailSerializer(obj)
             return Response({"data": serializer.data, "status": "200"})
         except LeaveDetail.DoesNotExist:
@@ -279,7 +339,7 @@ class LeaveDetailUpdateView(APIView):
     def put(self, request, pk):
         try:
             with transaction.atomic():
-                obj = LeaveDetail.objects.get(pk=pk, deleted=False)
+                obj = LeaveDetail.objects.alive().get(pk=pk)
                 serializer = LeaveDetailSerializer(obj, data=request.data)
                 if serializer.is_valid():
                     serializer.save()
@@ -293,7 +353,7 @@ class LeaveDetailDeleteView(APIView):
     def delete(self, request, pk):
         try:
             with transaction.atomic():
-                obj = LeaveDetail.objects.get(pk=pk, deleted=False)
+                obj = LeaveDetail.objects.alive().get(pk=pk)
                 obj.deleted = True
                 obj.save()
                 return Response({"data": "Leave detail deleted successfully", "status": "200"})
@@ -329,45 +389,154 @@ class LeaveSettingCreateView(APIView):
 
             if not all([employee, company, start_date, end_date, allocations]):
                 return Response({"error": "Missing required fields", "status": 400})
-
-            with transaction.atomic():
-                created_settings = []
-
-                for entry in allocations:
-                    attendance_type_id = entry.get("attendance_type_id")
-                    allotted_days = entry.get("allotted_days", 0)
-
-                    if not attendance_type_id:
-                        return Response({"error": "attendance_type_id is required", "status": 400})
-
-                    try:
-                        attendance_type = AttendanceType.objects.get(id=attendance_type_id, deleted=False)
-                    except AttendanceType.DoesNotExist:
-                        return Response({"error": f"AttendanceType ID {attendance_type_id} not found", "status": 404})
-
-                    leave_setting, _ = LeaveSetting.objects.update_or_create(
-                        employee=employee,
-                        company=company,
-                        attendance_type=attendance_type,
-                        financial_year_start=start_date,
-                        defaults={
-                            "financial_year_end": end_date,
-                            "allotted_days": allotted_days,
-                            "deleted": False
-                        }
-                    )
-                    created_settings.append(leave_setting)
-
-                serializer = LeaveSettingSerializer(created_settings, many=True)
-                return Response({"data": serializer.data, "status": "200"})
+            if any(not entry.get("attendance_type_id") for entry in allocations):
+                return Response({"error": "attendance_type_id is required", "status": 400})
+
+            matrix = {
+                "attendance_types": [entry["attendance_type_id"] for entry in allocations],
+                "rows": [[employee] + [entry.get("allotted_days", 0) for entry in allocations]],
+            }
+            try:
+                LeaveSettingService.rollout(matrix, company, date.fromisoformat(str(start_date)), date.fromisoformat(str(end_date)))
+            except ValueError as e:
+                return Response({"error": str(e), "status": 400})
+
+            created_settings = LeaveSetting.objects.filter(
+                employee=employee, company=company, financial_year_start=start_date, deleted=False
+            ).select_related("attendance_type")
+            serializer = LeaveSettingSerializer(created_settings, many=True)
+            return Response({"data": serializer.data, "status": "200"})
 
         except Exception as e:
             return Response({"error": str(e), "status": 500})
+
+class LeaveSettingBulkUpsertView(APIView):
+    """
+    Company-wide leave settings rollout for a financial year - JSON allocation matrix or CSV upload
+    (header: employee,<attendance type id or code>,...). Validated as a whole, then upserted in chunks.
+    """
+    def post(self, request):
+        try:
+            serializer = LeaveSettingRolloutSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response({"error": serializer.errors, "status": "400"})
+            
+            data = serializer.validated_data
+            try:
+                if data.get('file'):
+                    matrix = LeaveSettingService.parse_csv(io.TextIOWrapper(data['file'].file, encoding='utf-8-sig'))
+                else:
+                    matrix = {"attendance_types": data['attendance_types'], "rows": data['rows']}
+                written = LeaveSettingService.rollout(
+                    matrix, data['company'], data['financial_year_start'], data['financial_year_end'],
+                    getattr(settings, 'LEAVE_SETTING_UPSERT_BATCH_SIZE', 2000)
+                )
+            except (ValueError, UnicodeDecodeError) as e:
+                return Response({"error": str(e), "status": "400"})
+            return Response({"data": {"written": written}, "status": "200"})
+        except Exception as e:
+            return Response({"error": str(e), "status": "500"})
         
 
 
 # STATUS MANAGEMENT VIEWS
 
+class HolidayListView(APIView):
+    """List holidays (?company= adds that company's holidays to the shared ones, ?year= filters by year)"""
+    @read_only
+    def get(self, request):
+        try:
+            holidays = Holiday.objects.filter(deleted=False)
+            company = request.query_params.get('company')
+            if company:
+                holidays = holidays.filter(Q(company=company) | Q(company__isnull=True))
+            year = request.query_params.get('year')
+            if year:
+                holidays = holidays.filter(date__year=year)
+            serializer = HolidaySerializer(holidays, many=True)
+            return Response({"data": serializer.data, "status": "200"})
+        except Exception as e:
+            return Response({"error": str(e), "status": "500"})
+
+class HolidayCreateView(APIView):
+    """Create a holiday"""
+    def post(self, request):
+        try:
+            with transaction.atomic():
+                serializer = HolidaySerializer(data=request.data)
+                if serializer.is_valid():
+                    serializer.save()
+                    return Response({"data": serializer.data, "status": "200"})
+                return Response({"error": serializer.errors, "status": "500"})
+        except Exception as e:
+            return Response({"error": str(e), "status": "500"})
+
+class HolidayDeleteView(APIView):
+    """Soft delete a holiday"""
+    def delete(self, request, pk):
+        try:
+            with transaction.atomic():
+                obj = Holiday.objects.get(pk=pk, deleted=False)
+                obj.deleted = True
+                obj.save()
+                return Response({"data": "Holiday deleted successfully", "status": "200"})
+        except Holiday.DoesNotExist:
+            return Response({"error": "Holiday not found", "status": "500"})
+
+class WeeklyOffListView(APIView):
+    """List weekly offs (?company=, ?shift=)"""
+    @read_only
+    def get(self, request):
+        try:
+            weekly_offs = WeeklyOff.objects.filter(deleted=False).order_by('company', 'shift', 'weekday')
+            for field in ('company', 'shift'):
+                value = request.query_params.get(field)
+                if value:
+                    weekly_offs = weekly_offs.filter(**{field: value})
+            serializer = WeeklyOffSerializer(weekly_offs, many=True)
+            return Response({"data": serializer.data, "status": "200"})
+        except Exception as e:
+            return Response({"error": str(e), "status": "500"})
+
+class WeeklyOffCreateView(APIView):
+    """Create a weekly off"""
+    def post(self, request):
+        try:
+            with transaction.atomic():
+                serializer = WeeklyOffSerializer(data=request.data)
+                if serializer.is_valid():
+                    serializer.save()
+                    return Response({"data": serializer.data, "status": "200"})
+                return Response({"error": serializer.errors, "status": "500"})
+        except Exception as e:
+            return Response({"error": str(e), "status": "500"})
+
+class WeeklyOffDeleteView(APIView):
+    """Soft delete a weekly off"""
+    def delete(self, request, pk):
+        try:
+            with transaction.atomic():
+                obj = WeeklyOff.objects.get(pk=pk, deleted=False)
+                obj.deleted = True
+                obj.save()
+                return Response({"data": "Weekly off deleted successfully", "status": "200"})
+        except WeeklyOff.DoesNotExist:
+            return Response({"error": "Weekly off not found", "status": "500"})
+
+class WorkingDaysView(APIView):
+    """Count working days in a date range (weekly offs and holidays excluded)"""
+    def get(self, request):
+        try:
+            query = WorkingDaysQuerySerializer(data=request.query_params)
+            if not query.is_valid():
+                return Response({"error": query.errors, "status": "400"})
+            
+            params = query.validated_data
+            days = working_days.count(params.get("company"), params["date_from"], params["date_to"], params.get("shift"))
+            return Response({"data": {"working_days": days}, "status": "200"})
+        except Exception as e:
+            return Response({"error": str(e), "status": "500"})
+
 class StatusListView(APIView):
     """List all status types"""
     def get(self, request):
@@ -492,12 +661,104 @@ class AttendanceTypeDeleteView(APIView):
 # ATTENDANCE MANAGEMENT VIEWS
 
 class AttendanceListView(APIView):
-    """List all attendance records"""
+    """
+    List attendance records newest first, one page at a time.
+    Pass next_cursor back as ?cursor= to get the following page.
+    """
+    @read_only
     def get(self, request):
         try:
-            attendance_records = Attendance.objects.filter(deleted=False)
-            serializer = AttendanceSerializer(attendance_records, many=True)
-            return Response({"data": serializer.data, "status": "200"})
+            query = AttendanceListQuerySerializer(data=request.query_params)
+            if not query.is_valid():
+                return Response({"error": query.errors, "status": "400"})
+            
+            attendance_records = AttendanceService.filter_attendance(query.validated_data)
+            rows, next_cursor = AttendanceKeysetPagination().paginate(
+                attendance_records,
+                cursor=query.validated_data.get("cursor"),
+                page_size=query.validated_data.get("page_size", getattr(settings, 'ATTENDANCE_LIST_PAGE_SIZE', 100)),
+                **AttendanceArchiveService.page_args(query.validated_data)
+            )
+            serializer = AttendanceSerializer(rows, many=True)
+            return Response({"data": serializer.data, "next_cursor": next_cursor, "status": "200"})
+        except InvalidCursor as e:
+            return Response({"error": str(e), "status": "400"})
+        except Exception as e:
+            return Response({"error": str(e), "status": "500"})
+
+class AttendanceExportView(APIView):
+    """
+    Stream attendance history as NDJSON (default) or CSV (?output=csv).
+    Rows are read in chunks and written as they come, so the export size doesn't matter.
+    """
+    @read_only
+    def get(self, request):
+        try:
+            query = AttendanceExportQuerySerializer(data=request.query_params)
+            if not query.is_valid():
+                return Response({"error": query.errors, "status": "400"})
+            
+            filters = query.validated_data
+            rows = AttendanceService.export_attendance(filters)
+            if filters["output"] == "csv":
+                response = StreamingHttpResponse(
+                    stream_csv(rows, list(AttendanceService.EXPORT_FIELDS)), content_type="text/csv"
+                )
+            else:
+                response = StreamingHttpResponse(stream_ndjson(rows), content_type="application/x-ndjson")
+            
+            period = "-".join(str(filters[key]) for key in ("date_from", "date_to") if filters.get(key))
+            filename = f"attendance{'-' + period if period else ''}.{filters['output']}"
+            response["Content-Disposition"] = f'attachment; filename="{filename}"'
+            return response
+        except Exception as e:
+            return Response({"error": str(e), "status": "500"})
+
+class MusterRollView(APIView):
+    """Monthly muster roll - employees x days with an attendance code per cell and totals (JSON or ?output=csv)"""
+    @read_only
+    def get(self, request):
+        try:
+            query = MusterRollQuerySerializer(data=request.query_params)
+            if not query.is_valid():
+                return Response({"error": query.errors, "status": "400"})
+            
+            params = query.validated_data
+            muster = MusterRollService.get_muster(params["year"], params["month"], params.get("company"), params.get("employee"))
+            if params["output"] == "csv":
+                response = StreamingHttpResponse(
+                    stream_csv(MusterRollService.to_rows(muster), MusterRollService.fields(muster)), content_type="text/csv"
+                )
+                response["Content-Disposition"] = f'attachment; filename="muster-{params["year"]}-{params["month"]:02d}.csv"'
+                return response
+            return Response({"data": MusterRollService.to_json(params["year"], params["month"], muster), "status": "200"})
+        except ReportDependencyError as e:
+            # The report stack (NumPy) isn't installed on this server
+            return Response({"error": str(e), "status": "503"})
+        except Exception as e:
+            return Response({"error": str(e), "status": "500"})
+
+class PayrollFeedView(APIView):
+    """Payroll input for a company and pay period - LOP, paid leave, late and OT per employee (JSON or "output": "csv")"""
+    @read_only
+    def post(self, request):
+        try:
+            serializer = PayrollFeedSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response({"error": serializer.errors, "status": "400"})
+            
+            params = serializer.validated_data
+            feed = PayrollService.get_feed(
+                params["date_from"], params["date_to"], params["company"], params.get("employee"), params.get("salaries")
+            )
+            if params["output"] == "csv":
+                response = StreamingHttpResponse(stream_csv(feed, PayrollService.FIELDS), content_type="text/csv")
+                response["Content-Disposition"] = f'attachment; filename="payroll-{params["company"]}-{params["date_from"]}-{params["date_to"]}.csv"'
+                return response
+            return Response({"data": feed, "status": "200"})
+        except ReportDependencyError as e:
+            # The report stack (NumPy) isn't installed on this server
+            return Response({"error": str(e), "status": "503"})
         except Exception as e:
             return Response({"error": str(e), "status": "500"})
 
@@ -518,7 +779,7 @@ class AttendanceRetrieveView(APIView):
     """Get a specific attendance record by ID"""
     def get(self, request, pk):
         try:
-            obj = Attendance.objects.get(pk=pk, deleted=False)
+            obj = Attendance.objects.alive().get(pk=pk)
             serializer = AttendanceSerializer(obj)
             return Response({"data": serializer.data, "status": "200"})
         except Attendance.DoesNotExist:
@@ -529,7 +790,7 @@ class AttendanceUpdateView(APIView):
     def put(self, request, pk):
         try:
             with transaction.atomic():
-                obj = Attendance.objects.get(pk=pk, deleted=False)
+                obj = Attendance.objects.alive().get(pk=pk)
                 serializer = AttendanceSerializer(obj, data=request.data)
                 if serializer.is_valid():
                     serializer.save()
@@ -543,7 +804,7 @@ class AttendanceDeleteView(APIView):
     def delete(self, request, pk):
         try:
             with transaction.atomic():
-                obj = Attendance.objects.get(pk=pk, deleted=False)
+                obj = Attendance.objects.alive().get(pk=pk)
                 obj.deleted = True
                 obj.save()
                 return Response({"data": "Attendance record deleted successfully", "status": "200"})
@@ -558,32 +819,48 @@ class AttendancePunchView(APIView):
     def post(self, request):
         """Process attendance punch (check-in or check-out)"""
         try:
-            with transaction.atomic():
-                serializer = AttendancePunchSerializer(data=request.data)
-                if not serializer.is_valid():
-                    return Response({"error": serializer.errors, "status": "500"})
-                
-                # Extract data
-                employee_id = serializer.validated_data["employee"]
-                action_type_id = serializer.validated_data["action_type"]
-                source_id = serializer.validated_data.get("source_id")  # Optional
-                remarks = serializer.validated_data.get("remarks", "")  # Optional
-                custom_timestamp = serializer.validated_data.get("custom_timestamp")  # Optional
-                
+            serializer = AttendancePunchSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response({"error": serializer.errors, "status": "500"})
+            
+            # Extract data
+            employee_id = serializer.validated_data["employee"]
+            action_type_id = serializer.validated_data["action_type"]
+            source_id = serializer.validated_data.get("source_id")  # Optional
+            remarks = serializer.validated_data.get("remarks", "")  # Optional
+            custom_timestamp = serializer.validated_data.get("custom_timestamp")  # Optional
+            idempotency_key = request.headers.get("Idempotency-Key") or serializer.validated_data.get("idempotency_key")  # Optional
+            
+            # Replay the original response for a retried request
+            if idempotency_key:
+                stored_response = AttendanceService.get_idempotent_response(employee_id, idempotency_key)
+                if stored_response is not None:
+                    return Response({"data": stored_response, "status": "200"}, headers={"Idempotent-Replayed": "true"})
+            
+            # Accept-then-process mode: queue the punch and acknowledge it with a ticket
+            queued = PunchQueueService.is_enabled()
+            punch_service = PunchQueueService.enqueue if queued else AttendanceService.process_attendance_punch
+            
+            punch = {
+                "action_type_id": action_type_id,
+                "source_id": source_id,
+                "remarks": remarks,
+                "custom_timestamp": custom_timestamp
+            }
+            if idempotency_key:
+                result, replayed = AttendanceService.process_idempotent_punch(punch_service, employee_id, idempotency_key, **punch)
+                if replayed:
+                    # A concurrent request with the same key won - return its response
+                    return Response({"data": result, "status": "200"}, headers={"Idempotent-Replayed": "true"})
+            else:
                 # Use the simplified service method
-                result = AttendanceService.process_attendance_punch(
-                    employee_id=employee_id,
-                    action_type_id=action_type_id,
-                    source_id=source_id,
-                    remarks=remarks,
-                    custom_timestamp=custom_timestamp
-                )
-                
-                # Check if result is an error
-                if "error" in result:
-                    return Response({"error": result["error"], "status": "400"})
-                
-                return Response({"data": result, "status": "200"})
+                result = punch_service(employee_id=employee_id, **punch)
+            
+            # Check if result is an error
+            if "error" in result:
+                return Response({"error": result["error"], "status": "400"})
+            
+            return Response({"data": result, "status": "202" if queued else "200"})
                 
         except Exception as e:
            
@@ -597,6 +874,7 @@ class AttendancePunchView(APIView):
                 return Response({"error": "employee parameter is required", "status": "400"})
             
             # Use the service method to get employee status
+            # (not read_only - a cache miss fills the status cache, so it must read the primary)
             result = AttendanceService.get_employee_attendance_status(employee_id)
             
             # Check if result is an error
@@ -608,3 +886,181 @@ class AttendancePunchView(APIView):
         except Exception as e:
             return Response({"error": str(e), "status": "500"})
 
+
+
+class AttendanceBulkPunchView(APIView):
+    """Bulk attendance punch upload for biometric devices that buffer punches"""
+    
+    def post(self, request):
+        """Process a batch of punches and return a result per row"""
+        try:
+            serializer = AttendanceBulkPunchSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response({"error": serializer.errors, "status": "500"})
+            
+            # Validate every row on its own so one bad row doesn't reject the batch
+            punches = []
+            row_indexes = []
+            results = {}
+            for index, row in enumerate(serializer.validated_data["punches"]):
+                row_serializer = AttendancePunchSerializer(data=row)
+                if row_serializer.is_valid():
+                    punches.append(row_serializer.validated_data)
+                    row_indexes.append(index)
+                else:
+                    results[index] = {"index": index, "error": row_serializer.errors, "status": "400"}
+            
+            for result in AttendanceService.process_bulk_punches(punches):
+                index = row_indexes[result["index"]]
+                results[index] = dict(result, index=index)
+            
+            ordered_results = [results[index] for index in sorted(results)]
+            failed = sum(1 for result in ordered_results if result["status"] != "200")
+            return Response({
+                "data": {
+                    "results": ordered_results,
+                    "processed": len(ordered_results) - failed,
+                    "failed": failed
+                },
+                "status": "200"
+            })
+                
+        except Exception as e:
+            return Response({"error": str(e), "status": "500"})
+
+
+class AttendancePunchTicketView(APIView):
+    """Status of a punch accepted in queued mode"""
+    
+    @read_only
+    def get(self, request, ticket):
+        """Get the processing status (and result once processed) of a queued punch"""
+        try:
+            result = PunchQueueService.get_ticket_status(ticket)
+            
+            # Check if result is an error
+            if "error" in result:
+                return Response({"error": result["error"], "status": "400"})
+            
+            return Response({"data": result, "status": "200"})
+                
+        except Exception as e:
+            return Response({"error": str(e), "status": "500"})
+
+
+# ASYNC (ASGI) VIEWS
+# Native async versions of the hot endpoints: under an ASGI server they run on the event loop
+# and use the async ORM, so one worker can hold many concurrent device connections.
+# They return the same payloads as their APIView counterparts.
+
+def async_response(payload, **kwargs):
+    return JsonResponse(payload, encoder=JSONEncoder, **kwargs)
+
+
+def parse_json_body(request):
+    """Request body as a dict (JSON, or form data as a fallback)"""
+    if request.content_type == "application/json":
+        return json.loads(request.body or b"{}")
+    return request.POST.dict()
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAttendancePunchView(View):
+    """Async attendance punch (check-in/check-out) and today status"""
+    
+    async def post(self, request):
+        """Process attendance punch (check-in or check-out)"""
+        try:
+            serializer = AttendancePunchSerializer(data=parse_json_body(request))
+            if not serializer.is_valid():
+                return async_response({"error": serializer.errors, "status": "500"})
+            
+            employee_id = serializer.validated_data["employee"]
+            punch = {
+                "action_type_id": serializer.validated_data["action_type"],
+                "source_id": serializer.validated_data.get("source_id"),
+                "remarks": serializer.validated_data.get("remarks", ""),
+                "custom_timestamp": serializer.validated_data.get("custom_timestamp")
+            }
+            idempotency_key = request.headers.get("Idempotency-Key") or serializer.validated_data.get("idempotency_key")
+            queued = PunchQueueService.is_enabled()
+            
+            if idempotency_key:
+                # The punch and its key are written in one transaction, which the async ORM can't do
+                stored_response = await sync_to_async(AttendanceService.get_idempotent_response)(employee_id, idempotency_key)
+                replayed = stored_response is not None
+                if not replayed:
+                    punch_service = PunchQueueService.enqueue if queued else AttendanceService.process_attendance_punch
+                    result, replayed = await sync_to_async(AttendanceService.process_idempotent_punch)(
+                        punch_service, employee_id, idempotency_key, **punch
+                    )
+                else:
+                    result = stored_response
+                if replayed:
+                    return async_response({"data": result, "status": "200"}, headers={"Idempotent-Replayed": "true"})
+            elif queued:
+                result = await PunchQueueService.aenqueue(employee_id=employee_id, **punch)
+            else:
+                result = await AttendanceService.aprocess_attendance_punch(employee_id=employee_id, **punch)
+            
+            if "error" in result:
+                return async_response({"error": result["error"], "status": "400"})
+            
+            return async_response({"data": result, "status": "202" if queued else "200"})
+                
+        except Exception as e:
+            return async_response({"error": str(e), "status": "500"})
+    
+    async def get(self, request):
+        """Get employee's current attendance status for today"""
+        try:
+            employee_id = request.GET.get("employee")
+            if not employee_id:
+                return async_response({"error": "employee parameter is required", "status": "400"})
+            
+            result = await AttendanceService.aget_employee_attendance_status(employee_id)
+            if "error" in result:
+                return async_response({"error": result["error"], "status": "500"})
+            
+            return async_response({"data": result, "status": "200"})
+                
+        except Exception as e:
+            return async_response({"error": str(e), "status": "500"})
+
+
+class AsyncAttendanceListView(View):
+    """Async list of attendance records, same filters and cursor as list-attendance"""
+    
+    @read_only
+    async def get(self, request):
+        try:
+            query = AttendanceListQuerySerializer(data=request.GET)
+            if not query.is_valid():
+                return async_response({"error": query.errors, "status": "400"})
+            
+            attendance_records = AttendanceService.filter_attendance(query.validated_data)
+            rows, next_cursor = await AttendanceKeysetPagination().apaginate(
+                attendance_records,
+                cursor=query.validated_data.get("cursor"),
+                page_size=query.validated_data.get("page_size", getattr(settings, 'ATTENDANCE_LIST_PAGE_SIZE', 100)),
+                **await AttendanceArchiveService.apage_args(query.validated_data)
+            )
+            serializer = AttendanceSerializer(rows, many=True)
+            return async_response({"data": serializer.data, "next_cursor": next_cursor, "status": "200"})
+        except InvalidCursor as e:
+            return async_response({"error": str(e), "status": "400"})
+        except Exception as e:
+            return async_response({"error": str(e), "status": "500"})
+
+
+class AsyncLeaveRequestListView(View):
+    """Async list of all leave requests"""
+    
+    @read_only
+    async def get(self, request):
+        try:
+            leave_requests = LeaveRequest.objects.alive().select_related('attendance_type', 'status')
+            serializer = LeaveRequestSerializer([leave_request async for leave_request in leave_requests], many=True)
+            return async_response({"data": serializer.data, "status": "200"})
+        except Exception as e:
+            return async_response({"error": str(e), "status": "500"})
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shiftSetting', '0002_alter_shift_shift_head_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['company'], name='shift_company_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subshift',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['shift'], name='subshift_shift_alive_idx'),
+        ),
+    ]
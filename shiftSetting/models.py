@@ -1,4 +1,5 @@
 from django.db import models
+from attendence.managers import SoftDeleteManager
 
 # Create your models here.
 
@@ -11,6 +12,13 @@ class Shift(models.Model):
     created_at = models.DateTimeField(auto_now_add=True,blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True,blank=True, null=True)
 
+    objects = SoftDeleteManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company'], condition=models.Q(deleted=False), name='shift_company_alive_idx'),
+        ]
+
     def __str__(self):
         return f"{self.shift_head} (ID: {self.id})"
   
@@ -25,5 +33,12 @@ class SubShift(models.Model):
     created_at = models.DateTimeField(auto_now_add=True,blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True,blank=True, null=True)
 
+    objects = SoftDeleteManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['shift'], condition=models.Q(deleted=False), name='subshift_shift_alive_idx'),
+        ]
+
     def __str__(self):
         return self.title
\ No newline at end of file
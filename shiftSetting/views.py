@@ -10,7 +10,7 @@ class ShiftListView(APIView):
     def post(self, request):
         data = request.data
         company = data.get("company")
-        shifts = Shift.objects.filter(deleted=False)
+        shifts = Shift.objects.alive()
         if company:
             shifts = shifts.filter(company=company)
         serializer = ShiftSerializer(shifts, many=True)
@@ -36,7 +36,7 @@ class ShiftRetrieveView(APIView):
             pk = request.data.get('id')
             if not pk:
                 return Response({"error": "id is required", "status": "500"})
-            obj = Shift.objects.get(pk=pk, deleted=False)
+            obj = Shift.objects.alive().get(pk=pk)
             serializer = ShiftSerializer(obj)
             return Response({"data": serializer.data, "status": "200"})
         except Shift.DoesNotExist:
@@ -49,7 +49,7 @@ class ShiftUpdateView(APIView):
     def put(self, request, pk):
         try:
             with transaction.atomic():
-                obj = Shift.objects.get(pk=pk, deleted=False)
+                obj = Shift.objects.alive().get(pk=pk)
                 serializer = ShiftSerializer(obj, data=request.data)
                 if serializer.is_valid():
                     serializer.save()
@@ -65,7 +65,7 @@ class ShiftDeleteView(APIView):
     def delete(self, request, pk):
         try:
             with transaction.atomic():
-                obj = Shift.objects.get(pk=pk, deleted=False)
+                obj = Shift.objects.alive().get(pk=pk)
                 obj.deleted = True
                 obj.save()
                 return Response({"data": "Soft deleted", "status": "200"})
@@ -81,7 +81,7 @@ class SubShiftListView(APIView):
     def post(self, request):
         data = request.data
         shift_id = data.get('shift_id')
-        sub_shifts = SubShift.objects.filter(deleted=False)
+        sub_shifts = SubShift.objects.alive()
         if shift_id:
             sub_shifts = sub_shifts.filter(shift_id=shift_id)
         serializer = SubShiftSerializer(sub_shifts, many=True)
@@ -107,7 +107,7 @@ class SubShiftRetrieveView(APIView):
             pk = request.data.get('id')
             if not pk:
                 return Response({"error": "id is required", "status": "500"})
-            obj = SubShift.objects.get(pk=pk, deleted=False)
+            obj = SubShift.objects.alive().get(pk=pk)
             serializer = SubShiftSerializer(obj)
             return Response({"data": serializer.data, "status": "200"})
         except SubShift.DoesNotExist:
@@ -120,7 +120,7 @@ class SubShiftUpdateView(APIView):
     def put(self, request, pk):
         try:
             with transaction.atomic():
-                obj = SubShift.objects.get(pk=pk, deleted=False)
+                obj = SubShift.objects.alive().get(pk=pk)
                 serializer = SubShiftSerializer(obj, data=request.data)
                 if serializer.is_valid():
                     serializer.save()
@@ -136,7 +136,7 @@ class SubShiftDeleteView(APIView):
     def delete(self, request, pk):
         try:
             with transaction.atomic():
-                obj = SubShift.objects.get(pk=pk, deleted=False)
+                obj = SubShift.objects.alive().get(pk=pk)
                 obj.deleted = True
                 obj.save()
                 return Response({"data": "Soft deleted", "status": "200"})